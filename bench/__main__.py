@@ -0,0 +1,91 @@
+"""Headless load generator for the chat server.
+
+Run from the repository root:
+    python -m bench --spawn --clients 1000 --senders 20 --rate 5 --duration 10
+"""
+import argparse
+import asyncio
+import random
+
+from bench.loadgen import BenchSettings, LoadGenerator
+from bench.localserver import LocalServer, process_tree_cpu, process_tree_rss
+
+
+parser = argparse.ArgumentParser(prog='python -m bench', description="Chat server benchmark")
+parser.add_argument("--host", type=str, default='127.0.0.1', help="Server ip address ('127.0.0.1' by default)")
+parser.add_argument("--port", type=int, default=None, help="Server port (8080, or random free port with --spawn)")
+parser.add_argument("--clients", type=int, default=100, help="Count of simulated clients (100 by default)")
+parser.add_argument("--senders", type=int, default=10, help="Count of clients which send messages (10 by default)")
+parser.add_argument("--rate", type=float, default=10, help="Messages per second of every sender (10 by default)")
+parser.add_argument("--duration", type=float, default=10, help="Seconds of sending (10 by default)")
+parser.add_argument("--size", type=int, default=64, help="Message size in bytes (64 by default)")
+parser.add_argument(
+    "--connectConcurrency", type=int, default=100, dest='connect_concurrency',
+    help="Max count of simultaneous handshakes (100 by default)"
+    )
+parser.add_argument(
+    "--connectTimeout", type=float, default=10, dest='connect_timeout',
+    help="Seconds after which handshake is considered failed (10 by default)"
+    )
+parser.add_argument(
+    "--compress", action='store_true',
+    help="Negotiate compression of large messages with server"
+    )
+parser.add_argument(
+    "--spawn", action='store_true',
+    help="Start local server for the benchmark and stop it afterwards"
+    )
+parser.add_argument(
+    "--serverPid", type=int, default=None, dest='server_pid',
+    help="Pid of already running server to measure its memory"
+    )
+parser.add_argument(
+    "--serverArgs", type=str, default='', dest='server_args',
+    help="Extra arguments of spawned server, e.g. \"-e asyncio -w 2\""
+    )
+
+
+def raise_open_files_limit() -> None:
+    """Allow as many sockets as the system permits"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main(parser: argparse.ArgumentParser) -> None:
+    args = parser.parse_args()
+    raise_open_files_limit()
+
+    port = args.port if args.port else (random.randint(20000, 60000) if args.spawn else 8080)
+    settings = BenchSettings(
+        args.host, port, args.clients, min(args.senders, args.clients),
+        args.rate, args.duration, args.size, args.connect_concurrency, args.connect_timeout, args.compress
+        )
+
+    server, server_pid = None, args.server_pid
+    if args.spawn:
+        # Rate limits are disabled, otherwise they would be measured instead of the server
+        server = LocalServer(
+            args.host, port, ['-mu', str(args.clients), '-rl', '0', '-gl', '0', *args.server_args.split()]
+            )
+        server.start()
+        server_pid = server.pid
+    server_cpu = process_tree_cpu(server_pid) if server_pid is not None else None
+    try:
+        result = asyncio.run(LoadGenerator(settings).run())
+        if server_pid is not None:
+            result = result._replace(server_rss=process_tree_rss(server_pid))
+            if server_cpu is not None:
+                result = result._replace(server_cpu=process_tree_cpu(server_pid) - server_cpu)
+    finally:
+        if server is not None:
+            server.stop()
+    print(result.report())
+
+
+if __name__ == '__main__':
+    main(parser)
@@ -0,0 +1,71 @@
+"""Chat window benchmark: pushes messages to ChatInterface and measures memory and frame time.
+Requires PyQt5 (client/requirements.txt), works without display.
+
+Run from the repository root:
+    python -m bench.chatview --messages 200000 --batch 100
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench.loadgen import percentile
+from bench.localserver import process_tree_rss
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'client'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+parser = argparse.ArgumentParser(prog='python -m bench.chatview', description="Chat window benchmark")
+parser.add_argument("--messages", type=int, default=200000, help="Count of pushed messages (200000 by default)")
+parser.add_argument("--batch", type=int, default=100, help="Messages added in one frame (100 by default)")
+parser.add_argument("--size", type=int, default=64, help="Message size in characters (64 by default)")
+parser.add_argument(
+    "--scrollback", type=int, default=None,
+    help="Max count of messages kept in chat window (SCROLLBACK_SIZE by default)"
+    )
+
+
+def main(parser: argparse.ArgumentParser) -> None:
+    args = parser.parse_args()
+
+    from PyQt5.QtWidgets import QApplication
+    from interfacecontrol import ChatInterface
+    from settings import SCROLLBACK_SIZE
+
+    app = QApplication(sys.argv)
+    window = ChatInterface(lambda: None, args.scrollback if args.scrollback else SCROLLBACK_SIZE)
+    window.show()
+    app.processEvents()
+    rss_before = process_tree_rss(os.getpid())
+
+    frame_times, pushed = [], 0
+    started = time.perf_counter()
+    while pushed < args.messages:
+        count = min(args.batch, args.messages - pushed)
+        batch = [f'bench{pushed + i}: '.ljust(args.size, 'x') for i in range(count)]
+        frame_started = time.perf_counter()
+        window.display_new_messages(batch)
+        window.chat_list.viewport().repaint()
+        app.processEvents()
+        frame_times.append(time.perf_counter() - frame_started)
+        pushed += count
+    elapsed = time.perf_counter() - started
+    rss_after = process_tree_rss(os.getpid())
+
+    frame_times.sort()
+    print(f'messages pushed       {pushed} ({pushed / elapsed:.0f} msg/s)')
+    print(f'rows kept             {window.chat_log.rowCount()}')
+    print(
+        f'frame time            p50 {percentile(frame_times, 0.5) * 1000:.2f} ms  '
+        f'p99 {percentile(frame_times, 0.99) * 1000:.2f} ms  max {frame_times[-1] * 1000:.2f} ms'
+        )
+    if rss_before is not None and rss_after is not None:
+        print(
+            f'client RSS            {rss_after / 1024 / 1024:.1f} MiB '
+            f'(+{(rss_after - rss_before) / 1024 / 1024:.1f} MiB)'
+            )
+
+
+if __name__ == '__main__':
+    main(parser)
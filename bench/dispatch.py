@@ -0,0 +1,82 @@
+"""Dispatch benchmark: creates messages like a client connection does and pushes them through
+Server._process_message, measures messages per second and memory of queued messages.
+Clients are connected through socket pairs, so no network and no client code is measured.
+
+Run from the repository root:
+    python -m bench.dispatch --messages 200000 --clients 20
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+
+from common.protocol import FrameType, encode_frame
+
+
+parser = argparse.ArgumentParser(prog='python -m bench.dispatch', description="Message dispatch benchmark")
+parser.add_argument("--messages", type=int, default=200000, help="Count of dispatched messages (200000 by default)")
+parser.add_argument("--clients", type=int, default=20, help="Count of room subscribers (20 by default)")
+parser.add_argument("--size", type=int, default=64, help="Message size in characters (64 by default)")
+parser.add_argument(
+    "--queued", type=int, default=100000,
+    help="Count of messages kept at once to measure their memory (100000 by default)"
+    )
+
+
+def _discard(connection: socket.socket) -> None:
+    """Read and drop everything server sends to one client"""
+    while connection.recv(256 * 1024):
+        pass
+
+
+def main(parser: argparse.ArgumentParser) -> None:
+    args = parser.parse_args()
+
+    from clientdata import Message
+    from server import Server
+
+    server = Server(
+        '127.0.0.1', 0, max_connected_users=args.clients, outbound_high_water_mark=args.messages * 2,
+        outbound_max_bytes=1 << 40, history_size=0, rate_limit=0, global_rate_limit=0, heartbeat_timeout=0
+        )
+    server._flusher.start()
+    for i in range(args.clients):
+        server_side, client_side = socket.socketpair()
+        client_side.sendall(encode_frame(FrameType.NICKNAME, f'bench{i:04}'))
+        server._handshake(server_side, time.monotonic() + 5)
+        threading.Thread(target=_discard, args=(client_side,), daemon=True).start()
+    sender = server._clients.snapshot()[0]
+    text = 'x' * args.size
+
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        Message(text, sender=sender).edited
+    created = time.perf_counter() - started
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    queued = [Message(text, sender=sender) for _ in range(args.queued)]
+    message_size = (tracemalloc.get_traced_memory()[0] - before) / args.queued
+    tracemalloc.stop()
+    del queued
+
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        server._process_message(Message(text, sender=sender))
+    elapsed = time.perf_counter() - started
+
+    print(f'messages dispatched   {args.messages} ({args.messages / elapsed:.0f} msg/s, {args.clients} subscribers)')
+    print(f'time per message      {elapsed / args.messages * 1e6:.2f} us')
+    print(f'message creation      {created / args.messages * 1e6:.2f} us (create and format)')
+    print(f'memory per message    {message_size:.0f} bytes')
+    server._stop_server()
+
+
+if __name__ == '__main__':
+    main(parser)
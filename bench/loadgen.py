@@ -0,0 +1,271 @@
+import asyncio
+import random
+import time
+from typing import NamedTuple
+
+from common.protocol import DEFLATE, HEADER, RECV_BUFFER_SIZE, Frame, FrameDecoder, FrameType, compress_frames, encode_frame
+
+
+BENCH_MARKER = '#bench'
+WORDS = (
+    'the', 'server', 'message', 'chat', 'room', 'client', 'hello', 'and', 'with', 'log', 'error', 'request',
+    'latency', 'queue', 'of', 'to', 'is', 'a', 'user', 'connection', 'time', 'ok', 'in', 'from', 'we', 'it'
+    )
+
+
+class BenchSettings(NamedTuple):
+    """Load generator settings.
+
+    Attributes:
+        host, port -- server address
+        clients -- count of simulated clients
+        senders -- count of clients which send messages, the rest only read
+        rate -- messages per second sent by every sender
+        duration -- seconds of sending
+        size -- minimal size of message text in bytes
+        connect_concurrency -- max count of handshakes in progress at the same time
+        connect_timeout -- seconds after which handshake is considered failed
+        compression -- ask server to compress large messages and compress sent ones
+    """
+    host: str
+    port: int
+    clients: int
+    senders: int
+    rate: float
+    duration: float
+    size: int
+    connect_concurrency: int
+    connect_timeout: float
+    compression: bool = False
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return value below which fraction of sorted values lie"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class BenchResult(NamedTuple):
+    """Collected measurements.
+
+    Attributes:
+        connected -- count of clients accepted by server
+        declined -- count of clients which were declined or failed to connect
+        connect_times -- sorted handshake durations in seconds
+        sent -- count of sent messages
+        received -- count of received benchmark messages (every client counts its own copy)
+        duration -- seconds from the first sent message to the last received one
+        latencies -- sorted end-to-end latencies in seconds
+        server_rss -- server resident memory in bytes after the run ('None' if unknown)
+        wire_bytes -- bytes received by all clients from sockets
+        frame_bytes -- size of frames received by all clients after decompression
+        client_cpu -- CPU seconds used by load generator while messages were sent and received
+        server_cpu -- CPU seconds used by server during the run ('None' if unknown)
+    """
+    connected: int
+    declined: int
+    connect_times: list[float]
+    sent: int
+    received: int
+    duration: float
+    latencies: list[float]
+    server_rss: int | None
+    wire_bytes: int = 0
+    frame_bytes: int = 0
+    client_cpu: float = 0.0
+    server_cpu: float | None = None
+
+    def report(self) -> str:
+        def ms(seconds: float) -> str:
+            return f'{seconds * 1000:.2f} ms'
+
+        lines = [
+            f'clients connected     {self.connected} (failed {self.declined})',
+            f'connect time          p50 {ms(percentile(self.connect_times, 0.5))}  '
+            f'p99 {ms(percentile(self.connect_times, 0.99))}  max {ms(max(self.connect_times, default=0.0))}',
+            f'messages sent         {self.sent} ({self.sent / self.duration:.0f} msg/s)' if self.duration else
+            f'messages sent         {self.sent}',
+            f'messages delivered    {self.received} ({self.received / self.duration:.0f} msg/s)' if self.duration else
+            f'messages delivered    {self.received}',
+            f'end-to-end latency    p50 {ms(percentile(self.latencies, 0.5))}  '
+            f'p95 {ms(percentile(self.latencies, 0.95))}  p99 {ms(percentile(self.latencies, 0.99))}',
+            ]
+        if self.frame_bytes:
+            lines.append(
+                f'received bytes        wire {self.wire_bytes / 1024 / 1024:.2f} MiB / '
+                f'frames {self.frame_bytes / 1024 / 1024:.2f} MiB (saved {1 - self.wire_bytes / self.frame_bytes:.1%})'
+                )
+        cpu = f'CPU time              load generator {self.client_cpu:.2f} s'
+        lines.append(cpu + (f', server {self.server_cpu:.2f} s' if self.server_cpu is not None else ''))
+        if self.server_rss is not None:
+            lines.append(f'server RSS            {self.server_rss / 1024 / 1024:.1f} MiB')
+        return '\n'.join(lines)
+
+
+class SimulatedClient:
+    """Class to imitate chat client without user interface.
+       Speaks the same handshake as client/chatclient.Client and measures latency of benchmark messages.
+
+    Arguments:
+        nickname -- client's name
+        latencies -- list shared by all clients where latencies of received messages are added
+        compression (default 'False') -- ask server to compress large messages
+    """
+    def __init__(self, nickname: str, latencies: list[float], compression: bool = False) -> None:
+        self.nickname = nickname
+        self.received = 0
+        self.wire_bytes = 0
+        self.frame_bytes = 0
+        self.compression = compression
+        self.last_received_at = 0.0
+        self._latencies = latencies
+        self._decoder = FrameDecoder()
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def _receive_frame(self) -> Frame | None:
+        while (frame:=self._decoder.next_frame()) is None:
+            data = await self._reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            self.wire_bytes += len(data)
+            self._decoder.feed(data)
+        self.frame_bytes += HEADER.size + len(frame.payload)
+        return frame
+
+    async def _handshake(self, host: str, port: int) -> Frame | None:
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        capabilities = encode_frame(FrameType.CAPABILITIES, DEFLATE) if self.compression else b''
+        self._writer.write(capabilities + encode_frame(FrameType.NICKNAME, self.nickname))
+        return await self._receive_frame()
+
+    async def connect(self, host: str, port: int, timeout: float) -> float | None:
+        """Connect and send nickname. 
+           Return handshake duration or 'None' if server declined client or did not answer in time
+        """
+        started = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(self._handshake(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.close()
+            return
+        if reply is None or reply.type is not FrameType.ACCEPT:
+            self.close()
+            return
+        self.compression = DEFLATE in reply.text.split(',')
+        return time.perf_counter() - started
+
+    async def send(self, text: str) -> None:
+        frame = encode_frame(FrameType.MESSAGE, text)
+        self._writer.write(compress_frames(frame) if self.compression else frame)
+        await self._writer.drain()
+
+    async def receive_loop(self) -> None:
+        """Count benchmark messages and measure their latency until connection is closed"""
+        while (frame:=await self._receive_frame()) is not None:
+            if frame.type is FrameType.PING:
+                self._writer.write(encode_frame(FrameType.PONG))
+                continue
+            if frame.type is not FrameType.ROOM_MESSAGE or BENCH_MARKER not in (text:=frame.text):
+                continue
+            now = time.monotonic_ns()
+            try:
+                sent_at = int(text.split(BENCH_MARKER, 1)[1].split(maxsplit=1)[0])
+            except (IndexError, ValueError):
+                continue
+            self._latencies.append((now - sent_at) / 1e9)
+            self.received += 1
+            self.last_received_at = time.perf_counter()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class LoadGenerator:
+    """Class to run load against the chat server.
+
+    Arguments:
+        settings -- BenchSettings instance
+    """
+    def __init__(self, settings: BenchSettings) -> None:
+        self._settings = settings
+        self._latencies: list[float] = []
+
+    async def _connect_all(self) -> tuple[list[SimulatedClient], list[float], int]:
+        semaphore = asyncio.Semaphore(self._settings.connect_concurrency)
+        run_id = random.randrange(36 ** 4)
+
+        async def connect(index: int) -> tuple[SimulatedClient, float | None]:
+            client = SimulatedClient(f'b{run_id:06x}{index:05x}', self._latencies, self._settings.compression)
+            async with semaphore:
+                return client, await client.connect(
+                    self._settings.host, self._settings.port, self._settings.connect_timeout
+                    )
+
+        results = await asyncio.gather(*(connect(index) for index in range(self._settings.clients)))
+        clients = [client for client, duration in results if duration is not None]
+        connect_times = sorted(duration for _, duration in results if duration is not None)
+        return clients, connect_times, len(results) - len(clients)
+
+    def _paddings(self, count: int = 64) -> list[str]:
+        """Generate texts which look like chat messages, so compression ratio is realistic"""
+        size = max(0, self._settings.size - len(BENCH_MARKER) - 21)
+        paddings = []
+        for _ in range(count):
+            words = []
+            while sum(len(word) + 1 for word in words) < size:
+                words.append(random.choice(WORDS))
+            paddings.append(' '.join(words)[:size])
+        return paddings
+
+    async def _sender(self, client: SimulatedClient, paddings: list[str]) -> int:
+        """Send messages at fixed rate for settings.duration seconds. Return count of sent messages"""
+        interval = 1 / self._settings.rate
+        # Spread senders, so they don't send at the same moment
+        await asyncio.sleep(random.random() * interval)
+        deadline = time.perf_counter() + self._settings.duration
+        sent, next_send = 0, time.perf_counter()
+        while (now:=time.perf_counter()) < deadline:
+            if now < next_send:
+                await asyncio.sleep(next_send - now)
+            await client.send(f'{BENCH_MARKER} {time.monotonic_ns()} {random.choice(paddings)}')
+            sent += 1
+            next_send += interval
+        return sent
+
+    async def run(self) -> BenchResult:
+        """Connect clients, send messages and collect measurements. Server memory is not measured here"""
+        clients, connect_times, declined = await self._connect_all()
+        receivers = [asyncio.create_task(client.receive_loop()) for client in clients]
+        # Drop history replay and own messages of previous runs
+        await asyncio.sleep(0.5)
+        self._latencies.clear()
+        for client in clients:
+            client.received = client.wire_bytes = client.frame_bytes = 0
+
+        paddings = self._paddings()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        sent = sum(await asyncio.gather(
+            *(self._sender(client, paddings) for client in clients[:self._settings.senders])
+            ))
+        # Wait for messages which are still on the way
+        expected = sent * len(clients)
+        deadline = time.perf_counter() + max(5.0, self._settings.duration)
+        while sum(client.received for client in clients) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        received = sum(client.received for client in clients)
+        client_cpu = time.process_time() - cpu_started
+        finished = max((client.last_received_at for client in clients), default=started)
+        for client in clients:
+            client.close()
+        for receiver in receivers:
+            receiver.cancel()
+        await asyncio.gather(*receivers, return_exceptions=True)
+        return BenchResult(
+            len(clients), declined, connect_times, sent, received,
+            max(finished - started, 0.0), sorted(self._latencies), None,
+            sum(client.wire_bytes for client in clients), sum(client.frame_bytes for client in clients), client_cpu
+            )
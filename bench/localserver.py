@@ -0,0 +1,105 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+SERVER_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server', 'main.py')
+
+
+class LocalServer:
+    """Class to run chat server in a subprocess for benchmarking.
+
+    Arguments:
+        host -- address to listen
+        port -- port to listen
+        server_args -- extra command line arguments of server/main.py
+
+    Attributes:
+        process -- subprocess.Popen instance of running server
+    """
+    def __init__(self, host: str, port: int, server_args: list[str]) -> None:
+        self._host = host
+        self._port = port
+        self._server_args = server_args
+        self.process: subprocess.Popen | None = None
+
+    def start(self, timeout: float = 10.0) -> None:
+        """Start server and wait until it accepts connections"""
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER_MAIN, '-i', self._host, '-p', str(self._port), *self._server_args],
+            cwd=os.path.dirname(SERVER_MAIN), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+            )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {self.process.returncode}')
+            try:
+                socket.create_connection((self._host, self._port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise TimeoutError('Server did not start')
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    @property
+    def pid(self) -> int | None:
+        return self.process.pid if self.process is not None else None
+
+
+def _process_tree(pid: int) -> list[int]:
+    """Return pid and pids of all its descendants"""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, pids = [], [pid]
+    while pids:
+        current = pids.pop()
+        tree.append(current)
+        pids.extend(children.get(current, ()))
+    return tree
+
+
+def process_tree_rss(pid: int) -> int | None:
+    """Return resident memory in bytes of process and all its children (Linux only, 'None' elsewhere)"""
+    if not os.path.isdir('/proc'):
+        return
+    total = 0
+    for current in _process_tree(pid):
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def process_tree_cpu(pid: int) -> float | None:
+    """Return CPU seconds (user + system) used by process and all its children (Linux only, 'None' elsewhere)"""
+    if not os.path.isdir('/proc'):
+        return
+    total = 0
+    for current in _process_tree(pid):
+        try:
+            with open(f'/proc/{current}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])
+    return total / os.sysconf('SC_CLK_TCK')
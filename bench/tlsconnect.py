@@ -0,0 +1,222 @@
+"""TLS connection setup benchmark: connects clients one after another from several threads, each client does
+TLS handshake, sends nickname and waits for accept. Measures connections per second with full handshakes
+and with sessions resumed from tickets of previous connections, the way chat client reconnects.
+
+Run from the repository root:
+    python -m bench.tlsconnect --spawn --connections 1000 --concurrency 8
+Or create certificates, start server with them and measure it:
+    python -m bench.tlsconnect --makeCerts certs
+    python server/main.py -p 8443 -mu 10000 -cf certs/server.pem -kf certs/server.key
+    python -m bench.tlsconnect --port 8443 --ca certs/ca.pem
+"""
+import argparse
+import ipaddress
+import itertools
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from bench.loadgen import percentile
+from bench.localserver import LocalServer, process_tree_cpu
+from common.protocol import FrameDecoder, FrameType, disable_nagle, encode_frame, receive_frame
+
+
+MODES = ('full', 'resumed')
+
+
+parser = argparse.ArgumentParser(prog='python -m bench.tlsconnect', description="TLS connection setup benchmark")
+parser.add_argument("--host", type=str, default='127.0.0.1', help="Server ip address ('127.0.0.1' by default)")
+parser.add_argument("--port", type=int, default=None, help="Server port (8080, or random free port with --spawn)")
+parser.add_argument("--ca", type=str, default=None, help="Certificate of authority which signed server certificate")
+parser.add_argument(
+    "--connections", type=int, default=1000, help="Count of connections in every mode (1000 by default)"
+    )
+parser.add_argument(
+    "--concurrency", type=int, default=8, help="Count of threads which connect at the same time (8 by default)"
+    )
+parser.add_argument(
+    "--spawn", action='store_true',
+    help="Create self-signed certificates, start local server with them and stop it afterwards"
+    )
+parser.add_argument(
+    "--serverArgs", type=str, default='', dest='server_args',
+    help="Extra arguments of spawned server, e.g. \"-e asyncio\""
+    )
+parser.add_argument(
+    "--makeCerts", type=str, default=None, dest='make_certs',
+    help="Only create self-signed CA and server certificate for --host in this directory"
+    )
+
+
+def make_certificates(directory: str, host: str) -> tuple[str, str, str]:
+    """Create certificate authority and server certificate for host signed by it with openssl command.
+       Return paths of CA certificate, server certificate and server private key
+    """
+    def openssl(*args: str) -> None:
+        subprocess.run(['openssl', *args], cwd=directory, check=True, capture_output=True)
+
+    try:
+        ipaddress.ip_address(host)
+        names = f'IP:{host},DNS:localhost'
+    except ValueError:
+        names = f'DNS:{host}'
+    with open(os.path.join(directory, 'server.ext'), 'w') as extensions:
+        extensions.write(f'subjectAltName={names}\nbasicConstraints=CA:FALSE\nextendedKeyUsage=serverAuth\n')
+    openssl(
+        'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '30',
+        '-keyout', 'ca.key', '-out', 'ca.pem', '-subj', '/CN=PythonChat bench CA'
+        )
+    openssl(
+        'req', '-newkey', 'rsa:2048', '-nodes', '-keyout', 'server.key', '-out', 'server.csr', '-subj', f'/CN={host}'
+        )
+    openssl(
+        'x509', '-req', '-in', 'server.csr', '-CA', 'ca.pem', '-CAkey', 'ca.key', '-CAcreateserial', '-days', '30',
+        '-out', 'server.pem', '-extfile', 'server.ext'
+        )
+    return tuple(os.path.join(directory, name) for name in ('ca.pem', 'server.pem', 'server.key'))
+
+
+class ConnectResult(NamedTuple):
+    """Measurements of one mode.
+
+    Attributes:
+        mode -- 'full' or 'resumed'
+        connected -- count of clients accepted by server
+        failed -- count of connections which failed or were declined
+        resumed -- count of connections which resumed previous TLS session
+        duration -- seconds from the first connection to the last one
+        connect_times -- sorted durations of connect, TLS handshake and nickname exchange in seconds
+        server_cpu -- CPU seconds used by server during the mode ('None' if unknown)
+    """
+    mode: str
+    connected: int
+    failed: int
+    resumed: int
+    duration: float
+    connect_times: list[float]
+    server_cpu: float | None = None
+
+    def report(self) -> str:
+        def ms(seconds: float) -> str:
+            return f'{seconds * 1000:.2f} ms'
+
+        lines = [
+            f'[{self.mode}]',
+            f'clients connected     {self.connected} (failed {self.failed}, resumed sessions {self.resumed})',
+            f'connection rate       {self.connected / self.duration:.0f} conn/s' if self.duration else
+            f'connection rate       -',
+            f'connect time          p50 {ms(percentile(self.connect_times, 0.5))}  '
+            f'p99 {ms(percentile(self.connect_times, 0.99))}  max {ms(max(self.connect_times, default=0.0))}',
+            ]
+        if self.server_cpu is not None and self.connected:
+            lines.append(f'server CPU            {self.server_cpu / self.connected * 1e6:.0f} us per connection')
+        return '\n'.join(lines)
+
+
+class ConnectBench:
+    """Class to open many short TLS connections to chat server.
+
+    Arguments:
+        host, port -- server address
+        context -- ssl.SSLContext of client which verifies server certificate
+        connections -- count of connections in every mode
+        concurrency -- count of connecting threads
+
+    Attributes:
+        nicknames -- counter which makes nickname of every connection unique
+    """
+    def __init__(self, host: str, port: int, context: ssl.SSLContext, connections: int, concurrency: int) -> None:
+        self._host = host
+        self._port = port
+        self._context = context
+        self._connections = connections
+        self._concurrency = concurrency
+        self._nicknames = itertools.count()
+
+    def _connect(self, session: ssl.SSLSession | None) -> tuple[float, ssl.SSLSession, bool] | None:
+        """Connect, send nickname and wait for accept. Return duration, TLS session and 'True' if it was resumed.
+           Return 'None' if connection failed or server declined client
+        """
+        started = time.perf_counter()
+        try:
+            with socket.create_connection((self._host, self._port), timeout=10) as raw:
+                disable_nagle(raw)
+                with self._context.wrap_socket(raw, server_hostname=self._host, session=session) as connection:
+                    connection.sendall(encode_frame(FrameType.NICKNAME, f'tls{next(self._nicknames)}'))
+                    reply = receive_frame(connection, FrameDecoder())
+                    if reply is None or reply.type is not FrameType.ACCEPT:
+                        return
+                    return time.perf_counter() - started, connection.session, connection.session_reused
+        except OSError:
+            return
+
+    def _worker(self, mode: str, remaining: itertools.count, results: list) -> None:
+        """Connect until all connections of mode are done. In resumed mode session of previous connection is used"""
+        session = None
+        while next(remaining) < self._connections:
+            if (result:=self._connect(session)) is None:
+                results.append(None)
+                continue
+            results.append(result)
+            if mode == 'resumed':
+                session = result[1]
+
+    def run(self, mode: str, server_pid: int | None = None) -> ConnectResult:
+        results, remaining = [], itertools.count()
+        server_cpu = process_tree_cpu(server_pid) if server_pid is not None else None
+        threads = [
+            threading.Thread(target=self._worker, args=(mode, remaining, results)) for _ in range(self._concurrency)
+            ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+        if server_cpu is not None:
+            server_cpu = process_tree_cpu(server_pid) - server_cpu
+        succeeded = [result for result in results if result is not None]
+        return ConnectResult(
+            mode, len(succeeded), len(results) - len(succeeded), sum(result[2] for result in succeeded),
+            duration, sorted(result[0] for result in succeeded), server_cpu
+            )
+
+
+def main(parser: argparse.ArgumentParser) -> None:
+    args = parser.parse_args()
+    if args.make_certs is not None:
+        os.makedirs(args.make_certs, exist_ok=True)
+        ca, certificate, key = make_certificates(args.make_certs, args.host)
+        print(f'CA certificate        {ca}\nserver certificate    {certificate}\nserver key            {key}')
+        return
+    if not args.spawn and args.ca is None:
+        sys.exit('--ca is required if server is not spawned')
+
+    port = args.port if args.port else (random.randint(20000, 60000) if args.spawn else 8080)
+    server, server_pid, ca = None, None, args.ca
+    with tempfile.TemporaryDirectory() as directory:
+        if args.spawn:
+            ca, certificate, key = make_certificates(directory, args.host)
+            # Every connection is a new client, so server must not decline them
+            server_args = ['-mu', str(args.connections * len(MODES) + 1), '-cf', certificate, '-kf', key]
+            server = LocalServer(args.host, port, server_args + args.server_args.split())
+            server.start()
+            server_pid = server.pid
+        bench = ConnectBench(args.host, port, ssl.create_default_context(cafile=ca), args.connections, args.concurrency)
+        try:
+            results = [bench.run(mode, server_pid) for mode in MODES]
+        finally:
+            if server is not None:
+                server.stop()
+    print('\n'.join(result.report() for result in results))
+
+
+if __name__ == '__main__':
+    main(parser)
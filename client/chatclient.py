@@ -1,12 +1,47 @@
+import random
+import select
 import socket
+import ssl
 import threading
+import time
 
+from common.protocol import (
+    DEFLATE, MAX_MESSAGE_SIZE, RECV_BUFFER_SIZE, WOULD_BLOCK, Frame, FrameDecoder, FrameType, ProtocolError,
+    compress_frames, encode_frame, encode_sequenced_frame, receive_frame, tls_pending
+    )
 from interfacecontrol import InterfaceControl
+from settings import (
+    COMPRESSION, CONNECT_TIMEOUT, RECONNECT_ATTEMPTS, RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, SERVER_SILENCE_TIMEOUT,
+    TLS, TLS_CA_FILE
+    )
+from threadutil import run_in_main_thread
+
+
+class ConnectionDeclined(Exception):
+    """Raised when server closed connection and sent a reason, e.g. client was kicked. Client does not reconnect"""
 
 
 class Client:
-    def __init__(self) -> None:
-        self._client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def __init__(
+        self, connect_timeout: float = CONNECT_TIMEOUT, compression: bool = COMPRESSION,
+        tls: bool = TLS, ca_file: str | None = TLS_CA_FILE
+    ) -> None:
+        self._client_socket: socket.socket | None = None
+        self._decoder = FrameDecoder()
+        self._connect_timeout = connect_timeout
+        self._allow_compression = compression
+        self._compression = False
+        self._connecting_socket: socket.socket | None = None
+        self._server_address: tuple[str, int] | None = None
+        self._nickname: str | None = None
+        self._last_sequence: int | None = None
+        # GUI thread sends messages, receiver thread receives and answers pings. Socket is non-blocking 
+        # and is used only under this lock, because TLS connection must not be used by two threads at once
+        self._io_lock = threading.Lock()
+        self._ping_sent = False
+        self._ssl_context = ssl.create_default_context(cafile=ca_file) if tls else None
+        # Session of the last TLS connection. Reconnect resumes it, so full handshake is skipped
+        self._tls_session: ssl.SSLSession | None = None
 
     def _start_login_window(self) -> None:
         self._userinterface = InterfaceControl()
@@ -14,56 +49,273 @@ class Client:
         self._userinterface.execute_application()
 
     def _start_chat_window(self) -> None:
-        message_receiver_thread = threading.Thread(target=self._connection_loop)
-        message_receiver_thread.start()
-
         self._userinterface.draw_chat_interface(on_send_message_button_pressed=self._send_message_to_server)
 
+        message_receiver_thread = threading.Thread(target=self._connection_loop, daemon=True)
+        message_receiver_thread.start()
+
     def _connect_to_server(self) -> None:
+        """Start login in background thread, so login window is not frozen while server is slow or unreachable.
+           If login is already in progress, cancel it
+        """
+        if self._connecting_socket is not None:
+            self._cancel_connection()
+            return
         address, nickname = self._userinterface.current_interface.get_user_input()
 
-        if not self._try_make_connection(address):
+        if (server_address:=self._parse_address(address)) is None:
+            self._userinterface.current_interface.set_invalid_ip_address_message('Invalid address format')
             return
-        if (accept:=self._send_nickname_to_server(nickname)) == 'True':
-            self._start_chat_window()
+        try:
+            self._connecting_socket = self._create_socket(server_address[0])
+        except ValueError:
+            # TLS rejects host name which it can not check certificate against, exception in slot would abort client
+            self._userinterface.current_interface.set_invalid_ip_address_message('Invalid address format')
             return
+        self._server_address, self._nickname = server_address, nickname
+        self._userinterface.current_interface.set_connecting(True)
+        login_thread = threading.Thread(
+            target=self._login_handler, args=(self._connecting_socket, server_address, nickname), daemon=True
+            )
+        login_thread.start()
 
-        self._userinterface.current_interface.set_invalid_nickname_message(accept)
-
-    def _try_make_connection(self, address: str) -> bool:
+    def _parse_address(self, address: str) -> tuple[str, int] | None:
+        """Split address to ip and port. Return 'None' if address format is invalid, port is out of range
+           or host can not be resolved at all (e.g. it is empty or has empty or too long label)
+        """
         try:
             ip, port = address.split(':')
-            self._client_socket.connect((ip, int(port)))
+            port = int(port)
+            # connect and TLS encode host this way, they raise UnicodeError (a ValueError) for invalid one
+            ip.encode('idna')
         except ValueError:
-            self._userinterface.current_interface.set_invalid_ip_address_message('Invalid address format')
-            return False
-        except (ConnectionRefusedError, TimeoutError):
-            self._userinterface.current_interface.set_invalid_ip_address_message('Invalid ip address')
-            return False
-        return True
+            return
+        if not ip or '\0' in ip or not 0 < port <= 65535:
+            return
+        return (ip, port)
+
+    def _create_socket(self, host: str, session: ssl.SSLSession | None = None) -> socket.socket:
+        """Create socket for connection to server. With TLS enabled, handshake is done on connect 
+           and server certificate is verified. Given session is resumed if server still accepts it
+        """
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self._ssl_context is None:
+            return connection
+        return self._ssl_context.wrap_socket(connection, server_hostname=host, session=session)
 
-    def _send_nickname_to_server(self, nickname: str) -> str:
-        self._client_socket.sendall(nickname.encode())
-        server_accept = self._client_socket.recv(1024).decode()
-        return server_accept
+    def _remember_session(self, connection: socket.socket) -> None:
+        """Keep TLS session of accepted connection. Session ticket comes after handshake, so it is known now"""
+        if isinstance(connection, ssl.SSLSocket):
+            self._tls_session = connection.session
+
+    def _cancel_connection(self) -> None:
+        """Interrupt login in progress. Login thread closes its socket itself"""
+        connection, self._connecting_socket = self._connecting_socket, None
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._userinterface.current_interface.set_connecting(False)
+
+    def _login_handler(self, connection: socket.socket, address: tuple[str, int], nickname: str) -> None:
+        """Connect to server and send nickname in background thread"""
+        decoder, reply, error = FrameDecoder(), None, None
+        try:
+            reply = self._handshake(connection, decoder, address, nickname)
+        except TimeoutError:
+            error = 'Server is not responding'
+        except ssl.SSLCertVerificationError:
+            error = 'Server certificate is not trusted'
+        except ssl.SSLError:
+            error = 'Secure connection failed'
+        except OSError:
+            error = 'Invalid ip address'
+        self._finish_login(connection, decoder, reply, error)
+
+    def _handshake(
+        self, connection: socket.socket, decoder: FrameDecoder, address: tuple[str, int], nickname: str,
+        resume_from: int | None = None
+    ) -> Frame:
+        """Connect to server and send nickname. Connection and handshake together take at most connect_timeout"""
+        deadline = time.monotonic() + self._connect_timeout
+        connection.settimeout(self._connect_timeout)
+        connection.connect(address)
+        connection.settimeout(max(deadline - time.monotonic(), 0.001))
+        return self._send_nickname_to_server(connection, decoder, nickname, resume_from)
+
+    @run_in_main_thread
+    def _finish_login(
+        self, connection: socket.socket, decoder: FrameDecoder, reply: Frame | None, error: str | None
+    ) -> None:
+        if connection is not self._connecting_socket:
+            # Login was cancelled
+            connection.close()
+            return
+        self._connecting_socket = None
+        self._userinterface.current_interface.set_connecting(False)
+
+        if error is not None:
+            connection.close()
+            self._userinterface.current_interface.set_invalid_ip_address_message(error)
+            return
+        if reply.type is FrameType.ACCEPT:
+            connection.setblocking(False)
+            self._client_socket, self._decoder = connection, decoder
+            self._remember_session(connection)
+            self._compression = DEFLATE in reply.text.split(',')
+            self._start_chat_window()
+            return
+
+        connection.close()
+        self._userinterface.current_interface.set_invalid_nickname_message(reply.text)
+
+    def _send_nickname_to_server(
+        self, connection: socket.socket, decoder: FrameDecoder, nickname: str, resume_from: int | None = None
+    ) -> Frame:
+        """Send nickname. If resume_from is given, ask server to send only messages after it instead of history"""
+        handshake = encode_frame(FrameType.NICKNAME, nickname)
+        if resume_from is not None:
+            handshake = encode_sequenced_frame(FrameType.RESUME, resume_from) + handshake
+        if self._allow_compression:
+            handshake = encode_frame(FrameType.CAPABILITIES, DEFLATE) + handshake
+        connection.sendall(handshake)
+        try:
+            server_reply = receive_frame(connection, decoder)
+        except ProtocolError:
+            server_reply = None
+        if server_reply is None:
+            return Frame(FrameType.DECLINE, b'Connection closed by server')
+        return server_reply
 
     def _send_message_to_server(self) -> None:
         message = self._userinterface.current_interface.get_message_from_input()
-        self._client_socket.sendall(message.encode())
+        if len(message.encode()) > MAX_MESSAGE_SIZE:
+            self._userinterface.current_interface.display_new_message('Not sent, message is too long')
+            return
+        frame = encode_frame(FrameType.MESSAGE, message)
+        try:
+            self._send_frame(compress_frames(frame) if self._compression else frame)
+        except OSError:
+            self._userinterface.current_interface.display_new_message(f'Not sent, connection lost: {message}')
+
+    def _send_frame(self, frame: bytes) -> None:
+        """Send whole frame from any thread. Lock is released while socket is not writable, so receiving goes on.
+           Raise TimeoutError if server does not read for SERVER_SILENCE_TIMEOUT
+        """
+        data, deadline = memoryview(frame), time.monotonic() + SERVER_SILENCE_TIMEOUT
+        while True:
+            with self._io_lock:
+                try:
+                    sent = self._client_socket.send(data)
+                except WOULD_BLOCK:
+                    sent = 0
+            if not (data:=data[sent:]):
+                return
+            if (remaining:=deadline - time.monotonic()) <= 0:
+                raise TimeoutError('Server does not receive messages')
+            select.select([], [self._client_socket], [], remaining)
+
+    def _wait_readable(self, timeout: float) -> bool:
+        """Wait until data can be received. Return 'False' if server was silent for timeout"""
+        with self._io_lock:
+            if tls_pending(self._client_socket):
+                return True
+        return bool(select.select([self._client_socket], [], [], timeout)[0])
 
     def _receive_message_from_server(self) -> None:
-        message = self._client_socket.recv(1024)
-        if message:
-            self._userinterface.current_interface.display_new_message(message.decode())
+        """Receive data from server. If server is silent, ping it once, 
+           and raise TimeoutError if it stays silent after that
+        """
+        if not self._wait_readable(SERVER_SILENCE_TIMEOUT):
+            if self._ping_sent:
+                raise TimeoutError('Server is not responding')
+            self._ping_sent = True
+            self._send_frame(encode_frame(FrameType.PING))
+            return
+        with self._io_lock:
+            try:
+                data = self._client_socket.recv(RECV_BUFFER_SIZE)
+            except WOULD_BLOCK:
+                # Only part of TLS record has arrived
+                return
+        if not data:
+            raise ConnectionResetError
+        self._ping_sent = False
+        self._decoder.feed(data)
+        self._display_received_messages()
+
+    def _display_received_messages(self) -> None:
+        """Show received messages. Raise ConnectionDeclined if server sent the last frame with a reason"""
+        messages, reason = [], None
+        for frame in self._decoder:
+            if frame.type is FrameType.ROOM_MESSAGE:
+                # History of joined room contains older messages, resume position must not go back
+                self._last_sequence = max(self._last_sequence or 0, frame.sequence)
+            if frame.type in (FrameType.MESSAGE, FrameType.ROOM_MESSAGE):
+                messages.append(frame.text)
+            elif frame.type is FrameType.PING:
+                self._send_frame(encode_frame(FrameType.PONG))
+            elif frame.type is FrameType.DECLINE:
+                reason = frame.text
+                break
+        if messages:
+            self._userinterface.current_interface.queue_new_messages(messages)
+        if reason is not None:
+            raise ConnectionDeclined(reason)
 
     def _connection_loop(self) -> str:
+        """Receive messages until connection is lost, then reconnect. Close chat window if reconnect failed.
+           If server closed connection with a reason (e.g. client was kicked), show it and do not reconnect
+        """
         while True:
             try:
-                self._receive_message_from_server()
-            except (OSError, ConnectionResetError):
-                self._client_socket.close()
+                # History could arrive together with accept frame
+                self._display_received_messages()
+                while True:
+                    self._receive_message_from_server()
+            except ConnectionDeclined as declined:
+                self._close_socket()
+                self._userinterface.current_interface.queue_new_messages([f'Disconnected by server: {declined}'])
+                return
+            except (OSError, ConnectionResetError, ProtocolError):
+                self._close_socket()
+            self._userinterface.current_interface.queue_new_messages(['Connection lost, reconnecting...'])
+            if not self._reconnect():
                 self._userinterface.close_current_window()
-                break
+                return
+            self._userinterface.current_interface.queue_new_messages(['Reconnected'])
+
+    def _reconnect(self) -> bool:
+        """Try to connect again and resume from the last received message, so missed messages come in one batch.
+           Delays grow exponentially and are randomized (full jitter), so clients dropped by server restart 
+           do not come back all at once. Return 'False' if all attempts failed
+        """
+        for attempt in range(RECONNECT_ATTEMPTS):
+            time.sleep(random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)))
+            try:
+                connection = self._create_socket(self._server_address[0], self._tls_session)
+            except OSError:
+                continue
+            decoder = FrameDecoder()
+            try:
+                reply = self._handshake(connection, decoder, self._server_address, self._nickname, self._last_sequence)
+            except OSError:
+                connection.close()
+                continue
+            if reply.type is FrameType.ACCEPT:
+                connection.setblocking(False)
+                self._client_socket, self._decoder, self._ping_sent = connection, decoder, False
+                self._remember_session(connection)
+                self._compression = DEFLATE in reply.text.split(',')
+                return True
+            # Server may still keep previous connection with this nickname, so declined attempt is retried too
+            connection.close()
+        return False
+
+    def _close_socket(self) -> None:
+        """Close connection, waiting for send in GUI thread to finish"""
+        with self._io_lock:
+            self._client_socket.close()
 
     def start(self) -> None:
         self._start_login_window()
@@ -0,0 +1,46 @@
+import collections
+from typing import Iterable
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+class ChatLogModel(QAbstractListModel):
+    """Model of chat messages for QListView. Keeps only text of last messages,
+       view asks for the rows it draws, so only visible messages are rendered.
+
+    Arguments:
+        scrollback_size -- max count of kept messages. The oldest messages are removed when it is reached
+
+    Attributes:
+        messages -- collections.deque of message texts
+    """
+    def __init__(self, scrollback_size: int) -> None:
+        super(ChatLogModel, self).__init__()
+        self._scrollback_size = scrollback_size
+        self._messages: collections.deque[str] = collections.deque()
+
+    def rowCount(self, parent: QModelIndex = None) -> int:
+        # View calls it for every row during layout, so it must stay cheap
+        return len(self._messages)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> str | None:
+        if role == Qt.DisplayRole and 0 <= index.row() < len(self._messages):
+            return self._messages[index.row()]
+        return None
+
+    def append_messages(self, messages: Iterable[str]) -> None:
+        """Add messages to the end of log (one rows insertion for all of them) and remove the oldest ones"""
+        messages = list(messages)[-self._scrollback_size:]
+        if not messages:
+            return
+        evicted = len(self._messages) + len(messages) - self._scrollback_size
+        if evicted > 0:
+            self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+            for _ in range(evicted):
+                self._messages.popleft()
+            self.endRemoveRows()
+
+        first_row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(messages) - 1)
+        self._messages.extend(messages)
+        self.endInsertRows()
@@ -52,7 +52,7 @@ class Ui_MainWindow(object):
 "    background-color: #5F9EA0;\n"
 "}\n"
 "\n"
-"QListWidget { \n"
+"QListView { \n"
 "    color: white;\n"
 "    background-color: #5F9EA0;\n"
 "    border: 2px solid #7FFFD4;\n"
@@ -94,15 +94,11 @@ class Ui_MainWindow(object):
         self.send_message_button.setIcon(icon1)
         self.send_message_button.setIconSize(QtCore.QSize(25, 25))
         self.send_message_button.setObjectName("send_message_button")
-        self.chat_list = QtWidgets.QListWidget(self.centralwidget)
+        self.chat_list = QtWidgets.QListView(self.centralwidget)
         self.chat_list.setGeometry(QtCore.QRect(5, 10, 391, 511))
+        self.chat_list.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.chat_list.setUniformItemSizes(True)
         self.chat_list.setObjectName("chat_list")
-        item = QtWidgets.QListWidgetItem()
-        item.setTextAlignment(QtCore.Qt.AlignCenter)
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        item.setFont(font)
-        self.chat_list.addItem(item)
         self.send_message_button.raise_()
         self.input_message.raise_()
         self.chat_list.raise_()
@@ -115,8 +111,3 @@ class Ui_MainWindow(object):
         _translate = QtCore.QCoreApplication.translate
         MainWindow.setWindowTitle(_translate("MainWindow", "Chat"))
         self.input_message.setPlaceholderText(_translate("MainWindow", "Type your message here"))
-        __sortingEnabled = self.chat_list.isSortingEnabled()
-        self.chat_list.setSortingEnabled(False)
-        item = self.chat_list.item(0)
-        item.setText(_translate("MainWindow", "Welcome to the chat"))
-        self.chat_list.setSortingEnabled(__sortingEnabled)
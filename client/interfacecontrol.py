@@ -1,11 +1,15 @@
 import sys
-from typing import Callable
+import threading
+from typing import Callable, Iterable
 
 from PyQt5 import QtGui
-from PyQt5.QtWidgets import QApplication, QMainWindow, QListWidgetItem
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication, QMainWindow
 
+from chatlog import ChatLogModel
 from designerinterface.designerchatinterface import Ui_MainWindow as Ui_ChatWindow
 from designerinterface.designerlogininterface import Ui_MainWindow as Ui_LoginWindow
+from settings import MESSAGES_FONT_SIZE, SCROLLBACK_SIZE, UI_UPDATE_INTERVAL
 from threadutil import run_in_main_thread
 
 
@@ -27,6 +31,13 @@ class LoginInterface(QMainWindow, Ui_LoginWindow):
 
     def set_invalid_ip_address_message(self, message: str) -> None:
         self.input_ip_address.setText(f'{message}')
+
+    def set_connecting(self, connecting: bool) -> None:
+        """Show that login is in progress. While connecting login button cancels connection"""
+        self.input_ip_address.setEnabled(not connecting)
+        self.input_nickname.setEnabled(not connecting)
+        self.label.setText('Connecting...' if connecting else 'Login to chat')
+        self.login_button.setText('Cancel' if connecting else 'Login')
     
     def get_user_input(self) -> tuple[str, str]:
         address = self.input_ip_address.text()
@@ -35,9 +46,9 @@ class LoginInterface(QMainWindow, Ui_LoginWindow):
 
 
 class ChatInterface(QMainWindow, Ui_ChatWindow):
-    MESSAGES_FONT_SIZE = 10
+    WELCOME_MESSAGE = 'Welcome to the chat'
 
-    def __init__(self, send_message_signal: Callable):
+    def __init__(self, send_message_signal: Callable, scrollback_size: int = SCROLLBACK_SIZE):
         super(ChatInterface, self).__init__()
         self.setupUi(self)
         #self.client_socket: socket.socket = None
@@ -45,7 +56,13 @@ class ChatInterface(QMainWindow, Ui_ChatWindow):
 
         #chat settings
         self.chatfont = QtGui.QFont()
-        self.chatfont.setPointSize(self.MESSAGES_FONT_SIZE)
+        self.chatfont.setPointSize(MESSAGES_FONT_SIZE)
+        self.chat_log = ChatLogModel(scrollback_size)
+        self.chat_list.setFont(self.chatfont)
+        self.chat_list.setModel(self.chat_log)
+        self.chat_log.append_messages([self.WELCOME_MESSAGE])
+        self._incoming_messages: list[str] = []
+        self._incoming_lock = threading.Lock()
 
     def clear_message_input(self) -> None:
         self.input_message.setText('')
@@ -56,14 +73,34 @@ class ChatInterface(QMainWindow, Ui_ChatWindow):
         return message
 
     def display_new_message(self, msg: str) -> None:
-        message = self._prepare_message(msg)
-        self.chat_list.addItem(message)
-
-    def _prepare_message(self, msg: str) -> QListWidgetItem:
-        message = QListWidgetItem()
-        message.setFont(self.chatfont)
-        message.setText(msg)
-        return message
+        self.display_new_messages([msg])
+
+    def queue_new_messages(self, messages: Iterable[str]) -> None:
+        """Thread-safe. Buffer messages received in another thread, 
+           they are displayed in one batch by main thread after UI_UPDATE_INTERVAL
+        """
+        with self._incoming_lock:
+            schedule_update = not self._incoming_messages
+            self._incoming_messages.extend(messages)
+        if schedule_update:
+            self._schedule_incoming_messages_display()
+
+    @run_in_main_thread
+    def _schedule_incoming_messages_display(self) -> None:
+        QTimer.singleShot(UI_UPDATE_INTERVAL, self._display_incoming_messages)
+
+    def _display_incoming_messages(self) -> None:
+        with self._incoming_lock:
+            messages, self._incoming_messages = self._incoming_messages, []
+        self.display_new_messages(messages)
+
+    def display_new_messages(self, messages: list[str]) -> None:
+        """Add messages to chat log and keep it scrolled to the bottom if user did not scroll up"""
+        scrollbar = self.chat_list.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        self.chat_log.append_messages(messages)
+        if at_bottom:
+            self.chat_list.scrollToBottom()
         
     def _set_send_message_button_signal(self, func: Callable) -> None:
         self.send_message_button.clicked.connect(func)
@@ -77,6 +114,7 @@ class InterfaceControl:
     def execute_application(self) -> None:
         sys.exit(self._app.exec())
 
+    @run_in_main_thread
     def close_current_window(self) -> None:
         self.current_interface.close()
 
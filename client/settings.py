@@ -0,0 +1,22 @@
+#Max count of messages kept in chat window, older messages are removed
+SCROLLBACK_SIZE = 10000
+#Font size of messages in chat window
+MESSAGES_FONT_SIZE = 10
+#Milliseconds between chat window updates, messages received meanwhile are added in one batch
+UI_UPDATE_INTERVAL = 30
+#Seconds to connect to server and receive reply to nickname
+CONNECT_TIMEOUT = 5
+#Count of reconnect attempts after connection was lost
+RECONNECT_ATTEMPTS = 10
+#Seconds, max delay before the first reconnect attempt. Max delay doubles with every attempt
+RECONNECT_BASE_DELAY = 0.5
+#Seconds, upper limit of delay between reconnect attempts
+RECONNECT_MAX_DELAY = 30
+#Ask server to compress large messages
+COMPRESSION = True
+#Connect to server over TLS
+TLS = False
+#Path to certificate of authority which signed server certificate, system certificates are used if 'None'
+TLS_CA_FILE = None
+#Seconds of server's silence after which client pings it. Connection is lost if server is silent as long again
+SERVER_SILENCE_TIMEOUT = 30
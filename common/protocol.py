@@ -0,0 +1,223 @@
+"""Wire protocol shared by server and client.
+
+Every message on the wire is a frame:
+    | payload length (uint32, big-endian) | frame type (uint8) | payload (utf-8) |
+
+Payload of ROOM_MESSAGE and RESUME frames starts with a sequence number:
+    | sequence (uint64, big-endian) | text (utf-8) |
+
+Payload of COMPRESSED frame is one or more complete frames compressed with zlib. 
+Peers send it only if compression was negotiated: client lists DEFLATE in CAPABILITIES frame 
+and server confirms it in ACCEPT payload.
+"""
+import socket
+import ssl
+import struct
+import zlib
+from enum import IntEnum
+from typing import Iterator, NamedTuple
+
+
+HEADER = struct.Struct('!IB')
+SEQUENCE = struct.Struct('!Q')
+MAX_PAYLOAD_SIZE = 64 * 1024
+#Max size of chat message text. Server adds room, nickname and sequence number to it, so they have to fit too
+MAX_MESSAGE_SIZE = MAX_PAYLOAD_SIZE - 1024
+RECV_BUFFER_SIZE = 4096
+DEFLATE = 'deflate'
+#Frames smaller than this are never compressed, it does not pay off for short chat messages
+COMPRESSION_THRESHOLD = 512
+COMPRESSION_LEVEL = 6
+MAX_DECOMPRESSED_SIZE = 16 * MAX_PAYLOAD_SIZE
+#Non-blocking TLS socket raises its own errors instead of BlockingIOError
+WOULD_BLOCK = (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError)
+
+
+class ProtocolError(Exception):
+    """Raised when peer sends data which can not be decoded as a frame"""
+
+
+class FrameType(IntEnum):
+    """Type of frame.
+
+    NICKNAME -- client -> server, first frame of the handshake
+    ACCEPT -- server -> client, nickname was accepted
+    DECLINE -- server -> client, connection refused or closed by server (e.g. client was kicked), 
+            payload is a reason. Client must not reconnect after it
+    MESSAGE -- chat message in both directions
+    RESUME -- client -> server, optional frame before NICKNAME. 
+            Payload is sequence number of the last received ROOM_MESSAGE, server replays only newer messages
+    ROOM_MESSAGE -- server -> client, chat message of a room with its sequence number
+    CAPABILITIES -- client -> server, optional frame before NICKNAME. Payload is comma separated list of 
+            supported features. ACCEPT payload is the list of features which server enabled
+    COMPRESSED -- both directions, compressed frames. FrameDecoder unpacks it transparently
+    PING -- both directions, peer must answer with PONG. Server pings clients which are silent for a long time
+    PONG -- both directions, answer to PING
+    """
+    NICKNAME = 1
+    ACCEPT = 2
+    DECLINE = 3
+    MESSAGE = 4
+    RESUME = 5
+    ROOM_MESSAGE = 6
+    CAPABILITIES = 7
+    COMPRESSED = 8
+    PING = 9
+    PONG = 10
+
+
+class Frame(NamedTuple):
+    """Decoded frame.
+
+    Attributes:
+        type -- FrameType of frame
+        payload -- raw frame payload
+    """
+    type: FrameType
+    payload: bytes
+
+    @property
+    def text(self) -> str:
+        if self.type in SEQUENCED_FRAMES:
+            return self.payload[SEQUENCE.size:].decode(errors='replace')
+        return self.payload.decode(errors='replace')
+
+    @property
+    def sequence(self) -> int | None:
+        """Sequence number of ROOM_MESSAGE or RESUME frame, 'None' for other frames"""
+        if self.type not in SEQUENCED_FRAMES:
+            return
+        if len(self.payload) < SEQUENCE.size:
+            raise ProtocolError(f'{self.type.name} frame without sequence number')
+        return SEQUENCE.unpack_from(self.payload)[0]
+
+
+SEQUENCED_FRAMES = (FrameType.RESUME, FrameType.ROOM_MESSAGE)
+
+
+def encode_frame(frame_type: FrameType, payload: str | bytes = b'') -> bytes:
+    """Serialize frame to bytes ready to be sent"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f'Payload is too large ({len(payload)} bytes)')
+    return HEADER.pack(len(payload), frame_type) + payload
+
+
+def encode_sequenced_frame(frame_type: FrameType, sequence: int, text: str = '') -> bytes:
+    """Serialize ROOM_MESSAGE or RESUME frame"""
+    return encode_frame(frame_type, SEQUENCE.pack(sequence) + text.encode())
+
+
+def compress_frames(frames: bytes, threshold: int = COMPRESSION_THRESHOLD) -> bytes:
+    """Pack encoded frames into one COMPRESSED frame. 
+       Return frames unchanged if they are smaller than threshold or compression does not make them smaller
+    """
+    if not threshold <= len(frames) <= MAX_DECOMPRESSED_SIZE:
+        return frames
+    compressed = zlib.compress(frames, COMPRESSION_LEVEL)
+    if len(compressed) + HEADER.size >= len(frames) or len(compressed) > MAX_PAYLOAD_SIZE:
+        return frames
+    return HEADER.pack(len(compressed), FrameType.COMPRESSED) + compressed
+
+
+def decompress_frames(payload: bytes) -> bytes:
+    """Unpack payload of COMPRESSED frame. 
+       Raise ProtocolError if it is not a sequence of complete uncompressed frames or it is too large
+    """
+    decompressor = zlib.decompressobj()
+    try:
+        frames = decompressor.decompress(payload, MAX_DECOMPRESSED_SIZE)
+    except zlib.error as error:
+        raise ProtocolError(f'Invalid compressed frame ({error})') from None
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise ProtocolError('Compressed frame is too large or truncated')
+
+    offset = 0
+    while offset < len(frames):
+        if len(frames) - offset < HEADER.size:
+            raise ProtocolError('Compressed frame contains truncated frame')
+        length, frame_type = HEADER.unpack_from(frames, offset)
+        if frame_type == FrameType.COMPRESSED:
+            raise ProtocolError('Compressed frame contains another compressed frame')
+        offset += HEADER.size + length
+    if offset != len(frames):
+        raise ProtocolError('Compressed frame contains truncated frame')
+    return frames
+
+
+class FrameDecoder:
+    """Class to decode frames from a stream of bytes.
+       Data may be fed in chunks of any size, one chunk may contain many frames or a part of one frame.
+       COMPRESSED frames are replaced in buffer with frames they contain.
+
+    Arguments:
+        allow_compressed (default 'True') -- unpack COMPRESSED frames, otherwise they raise ProtocolError. 
+                Server enables it only after client negotiated compression
+
+    Attributes:
+        buffer -- received but not yet decoded bytes
+        offset -- position of the first not decoded byte in buffer
+        allow_compressed -- the same as argument, may be changed while decoding
+    """
+    def __init__(self, allow_compressed: bool = True) -> None:
+        self._buffer = bytearray()
+        self._offset = 0
+        self.allow_compressed = allow_compressed
+
+    def feed(self, data: bytes) -> None:
+        """Add received bytes to the buffer"""
+        if self._offset:
+            del self._buffer[:self._offset]
+            self._offset = 0
+        self._buffer += data
+
+    def next_frame(self) -> Frame | None:
+        """Return next complete frame or 'None' if there is not enough data"""
+        while True:
+            if len(self._buffer) - self._offset < HEADER.size:
+                return
+            length, frame_type = HEADER.unpack_from(self._buffer, self._offset)
+            if length > MAX_PAYLOAD_SIZE:
+                raise ProtocolError(f'Payload is too large ({length} bytes)')
+            start = self._offset + HEADER.size
+            end = start + length
+            if len(self._buffer) < end:
+                return
+            try:
+                frame_type = FrameType(frame_type)
+            except ValueError:
+                raise ProtocolError(f'Unknown frame type {frame_type}') from None
+            if frame_type is FrameType.COMPRESSED:
+                if not self.allow_compressed:
+                    raise ProtocolError('Compression was not negotiated')
+                self._buffer[self._offset:end] = decompress_frames(bytes(self._buffer[start:end]))
+                continue
+            self._offset = end
+            return Frame(frame_type, bytes(self._buffer[start:end]))
+
+    def __iter__(self) -> Iterator[Frame]:
+        while (frame:=self.next_frame()) is not None:
+            yield frame
+
+
+def receive_frame(connection: socket.socket, decoder: FrameDecoder) -> Frame | None:
+    """Block until one frame is received. Return 'None' if connection was closed"""
+    while (frame:=decoder.next_frame()) is None:
+        data = connection.recv(RECV_BUFFER_SIZE)
+        if not data:
+            return
+        decoder.feed(data)
+    return frame
+
+
+def tls_pending(connection: socket.socket) -> bool:
+    """Return 'True' if decrypted data waits inside TLS connection, socket itself may be not readable then"""
+    return isinstance(connection, ssl.SSLSocket) and connection.pending() > 0
+
+
+def disable_nagle(connection: socket.socket) -> None:
+    """Send small frames at once. TLS session tickets are sent after handshake, 
+       Nagle's algorithm would hold the next frame (e.g. accept) until they are acked
+    """
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
@@ -1,96 +1,115 @@
-from typing import NamedTuple, Callable
+from typing import Callable
 
-from clientdata import ClientData, Message
-
-
-class AdminCommandResult(NamedTuple):
-    """Class that will be returned after command execution.
-
-    Attributes:
-        completed -- 'True' if request was successfully completed, otherwise 'False'
-        text -- covered message after execution
-    """
-    completed: bool
-    text: str
-
-    def __repr__(self):
-        return f"{self.completed} -- {self.text}"
+from clientdata import ClientData, valid_nickname
+from commands import AdminCommandResult, Argument, Permission, command
+from rooms import RoomRegistry
+from settings import DEFAULT_ROOM
 
 
 class ServerAdminTools:
-    """Class to process commands from server side.
+    """Class with commands to manage clients. 
+       Admins may kick clients, only server terminal may change admin status.
 
     Attributes:
-        clients -- link to list of connected to server users
-        commands -- dict of commands, each command (key) corresponds to an action (value) 
+        remove -- function which removes disconnected client from server, so its slot and nickname are free at once
     """
-    def __init__(self, clients: list[ClientData]) -> None:
-        self._clients = clients
-        self._commands = {
-            "/kick": self._kick, 
-            "/makeadmin": self.__makeadmin, 
-            "/removeadmin": self.__removeadmin
-            }
+    def __init__(self, remove: Callable[[ClientData], bool]) -> None:
+        self._remove = remove
 
     # ------------------- #
     #   Commands methods  #
     # ------------------- #
-    def __removeadmin(self, client: ClientData) -> AdminCommandResult: 
+    @command('/removeadmin', Argument('nickname', ClientData), permission=Permission.TERMINAL, help='Remove admin status')
+    def __removeadmin(self, sender: ClientData | None, client: ClientData) -> AdminCommandResult: 
         if client.admin:
             client.admin = False
             return AdminCommandResult(True, f'Admin status was removed from {client.nickname}')
         return AdminCommandResult(False, f'{client.nickname} is not admin')
 
-    
-    def __makeadmin(self, client: ClientData) -> AdminCommandResult:
+    @command('/makeadmin', Argument('nickname', ClientData), permission=Permission.TERMINAL, help='Give admin status')
+    def __makeadmin(self, sender: ClientData | None, client: ClientData) -> AdminCommandResult:
         if not client.admin:
             client.admin = True
             return AdminCommandResult(True, f'{client.nickname} become admin')
         return AdminCommandResult(False, f'{client.nickname} is admin already')
-    
-    def _kick(self, client: ClientData) -> AdminCommandResult:
-        if client.connection and not client.admin:
-            client.connection.close()
-            self._clients.remove(client)
+
+    @command('/kick', Argument('nickname', ClientData), permission=Permission.ADMIN, help='Disconnect client')
+    def __kick(self, sender: ClientData | None, client: ClientData) -> AdminCommandResult:
+        if self.kick(client, 'You were kicked by admin'):
             return AdminCommandResult(True, f'{client.nickname} was kicked')
         return AdminCommandResult(False, f'Client does not exists or it is admin')
 
-    # ---------------- #
-    #   Other methods  #
-    # ---------------- #
-    def _client_exists(self, nickname: str) -> ClientData | bool:
-        for client in self._clients:
-            if client.nickname == nickname:
-                return client
-        return False
-
-    def _command_executor(self, action: Callable[[str], AdminCommandResult], nickname: str) -> AdminCommandResult:
-        client = self._client_exists(nickname)
-        if client is False:
-            return AdminCommandResult(False, 'Invalid arguments')
-        return action(client)
-
-    def _validate_command(self, command: str) -> tuple[Callable, str] | None:
-        try:
-            command, nickname = command.split()[:2]
-        except IndexError:
-            return
-        
-        if command in self._commands:
-            return (self._commands.get(command), nickname)
-
-    def execute(self, message: Message) -> AdminCommandResult:
-        if (execution_data:=self._validate_command(message.text)) is None:
-            return AdminCommandResult(False, 'Invalid command')
-        return self._command_executor(*execution_data)
-
-
-class AdminTools(ServerAdminTools):
-    """Class to process commands from clients"""
-    def __init__(self, clients: list[ClientData]) -> None:
-        self._commands = {
-            "/kick": self._kick
-            }
-        self._clients = clients
-
-    
\ No newline at end of file
+    def kick(self, client: ClientData, reason: str) -> bool:
+        """Disconnect client with reason, so it does not reconnect. Return 'False' if client is admin"""
+        if not client.connection or client.admin:
+            return False
+        client.kick(reason)
+        self._remove(client)
+        return True
+
+
+class RoomTools:
+    """Class with room commands which every client may use.
+       Argument of every command is a room name, action is applied to client which sent the command.
+
+    Attributes:
+        rooms -- link to RoomRegistry of server rooms
+        join -- function which subscribes client to room and sends history of room to it. 
+                Returns 'False' if client is subscribed already
+    """
+    MAX_ROOM_NAME_LENGTH = 32
+
+    def __init__(self, rooms: RoomRegistry, join: Callable[[ClientData, str], bool]) -> None:
+        self._rooms = rooms
+        self._join = join
+
+    # ------------------- #
+    #   Commands methods  #
+    # ------------------- #
+    @command('/join', Argument('room'), client_only=True, help='Join room and write to it')
+    def __join(self, client: ClientData, room: str) -> AdminCommandResult:
+        if len(room) > self.MAX_ROOM_NAME_LENGTH:
+            return AdminCommandResult(False, 'Invalid room name')
+        client.room = room
+        if not self._join(client, room):
+            return AdminCommandResult(True, f'Now you are writing to {room}')
+        return AdminCommandResult(True, f'You joined {room}')
+
+    @command('/leave', Argument('room'), client_only=True, help='Leave room')
+    def __leave(self, client: ClientData, room: str) -> AdminCommandResult:
+        if room == DEFAULT_ROOM:
+            return AdminCommandResult(False, f'{DEFAULT_ROOM} can not be left')
+        if not self._rooms.leave(room, client):
+            return AdminCommandResult(False, f'You are not in {room}')
+        if client.room == room:
+            client.room = DEFAULT_ROOM
+        return AdminCommandResult(True, f'You left {room}')
+
+
+class DirectMessageTools:
+    """Class with direct messages which every client may send. 
+       Message is delivered only to the recipient, not broadcast to a room.
+
+    Attributes:
+        send -- function which is called with recipient's nickname and message text. 
+                Returns 'False' if recipient is offline and message was kept until its next login
+    """
+    def __init__(self, send: Callable[[str, str], bool]) -> None:
+        self._send = send
+
+    # ------------------- #
+    #   Commands methods  #
+    # ------------------- #
+    @command(
+        '/msg', Argument('nickname'), Argument('text', rest=True, filtered=True), client_only=True,
+        help='Send message only to one user, even if user is offline'
+        )
+    def __msg(self, client: ClientData, nickname: str, text: str) -> AdminCommandResult:
+        if nickname == client.nickname:
+            return AdminCommandResult(False, 'You can not send message to yourself')
+        if not valid_nickname(nickname):
+            # Nobody can log in with such nickname, message would be kept in mailbox forever
+            return AdminCommandResult(False, f'{nickname} is not a valid nickname')
+        if not self._send(nickname, f'[private] {client.nickname}: {text}'):
+            return AdminCommandResult(True, f'{nickname} is offline, message will be delivered after login')
+        return AdminCommandResult(True, f'[private] to {nickname}: {text}')
@@ -0,0 +1,278 @@
+import asyncio
+import queue
+import signal
+import socket
+import threading
+import time
+from typing import Callable
+
+from clientdata import ClientData
+from common.protocol import (
+    RECV_BUFFER_SIZE, Frame, FrameDecoder, FrameType, ProtocolError, disable_nagle, encode_frame
+    )
+from metrics import BYTES_IN, DROPPED_MESSAGES, HANDSHAKE_TIMEOUTS, SEND_ERRORS, TLS_HANDSHAKES
+from outbound import OutboundQueue
+from ratelimit import ClientRateLimit
+from settings import DEFAULT_ROOM
+from server import Server
+
+
+class StreamConnection:
+    """Class to wrap asyncio.StreamWriter with thread-safe socket-like interface,
+       so admin tools and dispatcher thread can use it like socket.socket.
+
+    Arguments:
+        writer -- asyncio.StreamWriter instance of client connection
+        loop -- event loop which owns the writer
+    """
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop) -> None:
+        self._writer = writer
+        self.loop = loop
+
+    def sendall(self, data: bytes) -> None:
+        self.loop.call_soon_threadsafe(self._writer.write, data)
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self._writer.close)
+
+
+class AsyncClientData(ClientData):
+    """Class to manage new clients inside of asyncio event loop.
+       Connection is handled by a task instead of a separate thread.
+
+    Arguments:
+        reader -- asyncio.StreamReader instance of client connection
+        writer -- asyncio.StreamWriter instance of client connection
+        connection -- StreamConnection instance of client connection
+        messages_queue -- queue.Queue (or FilterPipeline) shared by all clients, received messages are put to it
+        high_water_mark -- max count of messages waiting to be sent to client
+        max_bytes -- max size of messages waiting to be sent to client
+        disconnect_slow -- disconnect client if outbound limits were reached, otherwise drop new messages
+        on_disconnect -- function which is called with AsyncClientData instance after client disconnected
+        allow_compression (default 'True') -- enable compression if client supports it
+        rate_limit (default 'None') -- ClientRateLimit of client. Messages over the limit never reach dispatcher
+        on_flood (default 'None') -- function which is called with AsyncClientData instance 
+                if client keeps sending messages over the limit
+    """
+    __slots__ = ('connection_task', 'sender_task', '_reader', '_writer', '_outbound_ready')
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, connection: StreamConnection,
+        messages_queue: queue.Queue, high_water_mark: int, max_bytes: int, disconnect_slow: bool,
+        on_disconnect: Callable[[ClientData], None], allow_compression: bool = True,
+        rate_limit: ClientRateLimit | None = None, on_flood: Callable[[ClientData], None] | None = None
+    ) -> None:
+        self.connection = connection
+        self.admin = False
+        self.nickname: str | None = None
+        self.resume_from: int | None = None
+        self.compression = False
+        self._allow_compression = allow_compression
+        self.room = DEFAULT_ROOM
+        self.messages_queue = messages_queue
+        self._reader = reader
+        self._writer = writer
+        self._decoder = FrameDecoder(allow_compressed=False)
+        self._outbound = OutboundQueue(high_water_mark, max_bytes)
+        self._outbound_lock = threading.Lock()
+        self._outbound_ready = asyncio.Event()
+        self._disconnect_slow = disconnect_slow
+        self._on_disconnect = on_disconnect
+        self._rate_limit = rate_limit
+        self._on_flood = on_flood
+        self.last_activity = time.monotonic()
+        self._receiving_stopped = False
+        self._receiver_done = threading.Event()
+
+    async def _receive_frame(self) -> Frame | None:
+        """Wait until one frame is received. Return 'None' if connection was closed"""
+        while (frame:=self._decoder.next_frame()) is None:
+            data = await self._reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            BYTES_IN.inc(len(data))
+            self.last_activity = time.monotonic()
+            self._decoder.feed(data)
+        return frame
+
+    async def _connection_handler(self) -> str:
+        """Handle connection with client"""
+        while True:
+            try:
+                frame = await self._receive_frame()
+            except (OSError, ConnectionAbortedError, ConnectionResetError, ProtocolError):
+                break
+            if frame is None:
+                break
+            self._handle_frame(frame)
+        self._receiver_done.set()
+        if self._receiving_stopped:
+            return f'{self.nickname} stopped receiving'
+        self.disconnect()
+        self._on_disconnect(self)
+        return f'{self.nickname} disconnected'
+
+    async def _sender_handler(self) -> None:
+        """Send queued frames to client. Waits for client to read them before the next send"""
+        while True:
+            with self._outbound_lock:
+                if self._outbound.closed:
+                    return
+                data = self._outbound.peek() if self._outbound else None
+                if data is not None:
+                    self._outbound.consume(len(data))
+            if data is None:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+                continue
+            try:
+                self._writer.write(data)
+                await self._writer.drain()
+            except (OSError, ConnectionAbortedError, ConnectionResetError):
+                SEND_ERRORS.inc()
+                with self._outbound_lock:
+                    self._outbound.send_failed()
+                self.disconnect()
+                return
+
+    def _create_new_connection_thread(self) -> asyncio.Task:
+        """Create new tasks (not threads) to handle connection with client and to send messages to client"""
+        self.connection_task = asyncio.create_task(self._connection_handler())
+        self.sender_task = asyncio.create_task(self._sender_handler())
+        return self.connection_task
+
+    def accept(self, history: bytes = b'') -> None:
+        """Send accept frame and history (in one write) if client was successfully verified"""
+        self.connection.sendall(self._accept_frame() + self.compress(history))
+        self._create_new_connection_thread()
+
+    def send_frame(self, frame: bytes) -> bool:
+        """Queue already encoded frame without blocking and wake up sender task.
+           Return 'False' if client is too slow and frame was dropped
+        """
+        with self._outbound_lock:
+            queued = self._outbound.put(frame)
+            wake_up = queued and len(self._outbound) == 1
+        if wake_up:
+            self.connection.loop.call_soon_threadsafe(self._outbound_ready.set)
+        if not queued:
+            DROPPED_MESSAGES.inc()
+            if self._disconnect_slow:
+                self.disconnect()
+        return queued
+
+    def stop_receiving(self) -> None:
+        """Stop receiving from client, but keep sending to it. Reader gets end of stream after already sent data"""
+        self._receiving_stopped = True
+        if self._writer.get_extra_info('ssl_object') is not None:
+            # TLS transport closes itself when socket is half-closed, so only reading is stopped
+            self.connection.loop.call_soon_threadsafe(self._stop_reading)
+            return
+        try:
+            self._writer.get_extra_info('socket').shutdown(socket.SHUT_RD)
+        except (AttributeError, OSError):
+            self._receiver_done.set()
+
+    def _stop_reading(self) -> None:
+        """Stop reading from transport. Connection handler gets end of stream after data which was already read"""
+        if self._writer.is_closing():
+            self._receiver_done.set()
+            return
+        self._writer.transport.pause_reading()
+        self._reader.feed_eof()
+
+    def disconnect(self) -> None:
+        """Close connection with client and stop sending messages to it"""
+        with self._outbound_lock:
+            self._outbound.close()
+        self.connection.loop.call_soon_threadsafe(self._outbound_ready.set)
+        self.connection.close()
+
+    def kick(self, reason: str) -> None:
+        """Send reason in the last frame and disconnect client. Queued frames are dropped, 
+           frames which sender task already wrote are sent before the reason
+        """
+        with self._outbound_lock:
+            self._outbound.close()
+        self.connection.loop.call_soon_threadsafe(self._outbound_ready.set)
+        self.connection.sendall(encode_frame(FrameType.DECLINE, reason))
+        self.connection.close()
+
+    async def receive_nickname(self) -> str | None:
+        """Receive nickname (and optional resume and capabilities frames before it) from client. 
+           Return 'None' if client did not send nickname frame
+        """
+        try:
+            frame = await self._receive_frame()
+            while frame is not None and self._handle_handshake_frame(frame):
+                frame = await self._receive_frame()
+        except (OSError, ConnectionAbortedError, ConnectionResetError, ProtocolError):
+            return
+        if frame is not None and frame.type is FrameType.NICKNAME:
+            self.nickname = frame.text
+            return self.nickname
+
+
+class AsyncServer(Server):
+    """Class to create a server for text chat which handles all connections in one asyncio event loop.
+       Messages dispatching, admin commands and terminal are the same as in Server.
+
+    Arguments:
+        the same as for Server
+
+    Attributes:
+        loop -- event loop which serves all connections
+        stop_requested -- asyncio.Event which is set when server was asked to shut down
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop_requested: asyncio.Event | None = None
+
+    async def _create_new_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Create new AsyncClientData instance if server is not full"""
+        if (ssl_object:=writer.get_extra_info('ssl_object')) is not None:
+            disable_nagle(writer.get_extra_info('socket'))
+            TLS_HANDSHAKES.inc(label_value='resumed' if ssl_object.session_reused else 'full')
+        connection = StreamConnection(writer, asyncio.get_running_loop())
+        if self._max_clients_count_riched(connection):
+            return
+
+        client = AsyncClientData(
+            reader, writer, connection, self._pipeline,
+            self._outbound_high_water_mark, self._outbound_max_bytes, self._disconnect_slow_clients,
+            self._remove_client, self._compression, self._rate_limiter.client_limit(), self._kick_flooder
+            )
+        try:
+            await asyncio.wait_for(client.receive_nickname(), self._handshake_timeout)
+        except asyncio.TimeoutError:
+            HANDSHAKE_TIMEOUTS.inc()
+        self._verify_client(client)
+
+    async def _receive_connections(self) -> None:
+        """Serve new connections on the server socket until server is shutting down, then drain it.
+           Drain runs in separate thread, so the loop keeps sending queued messages meanwhile
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop_requested = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._loop.add_signal_handler(signum, self.shutdown)
+        server = await asyncio.start_server(
+            self._create_new_client, sock=self._server_socket, backlog=self._listen_backlog,
+            ssl=self._ssl_context, ssl_handshake_timeout=self._handshake_timeout if self._ssl_context else None
+            )
+        if not self._stopping.is_set():
+            await self._stop_requested.wait()
+        server.close()
+        await asyncio.to_thread(self._stop_server)
+
+    def shutdown(self) -> None:
+        """Ask server to stop accepting connections and drain. Safe to call from any thread"""
+        self._stopping.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_requested.set)
+
+    def run(self) -> None:
+        """Start server. SIGTERM and SIGINT shut it down gracefully"""
+        self._start_background_threads()
+        asyncio.run(self._receive_connections())
@@ -1,7 +1,30 @@
+import queue
+import select
 import socket
+import ssl
 import threading
+import time
+from typing import Callable
 
-from settings import COMMAND_PREFIX
+from common.protocol import (
+    COMPRESSION_THRESHOLD, DEFLATE, MAX_MESSAGE_SIZE, RECV_BUFFER_SIZE, WOULD_BLOCK, Frame, FrameDecoder, FrameType,
+    ProtocolError, compress_frames, encode_frame, tls_pending
+    )
+from metrics import (
+    BYTES_IN, COMPRESSION_SAVED_BYTES, COMPRESSION_SECONDS, DROPPED_MESSAGES, HANDSHAKE_TIMEOUTS, MESSAGES_IN,
+    RATE_LIMITED_MESSAGES, SEND_ERRORS
+    )
+from outbound import OutboundFlusher, OutboundQueue, OutboundStats
+from ratelimit import ClientRateLimit
+from settings import (
+    COMMAND_PREFIX, DEFAULT_ROOM, NICKNAME_MAX_LENGTH, NICKNAME_MIN_LENGTH, OUTBOUND_HIGH_WATER_MARK, OUTBOUND_MAX_BYTES
+    )
+
+
+
+def valid_nickname(nickname: str) -> bool:
+    """Check if client may log in with nickname"""
+    return NICKNAME_MIN_LENGTH <= len(nickname) <= NICKNAME_MAX_LENGTH
 
 
 class ClientData:
@@ -9,38 +32,163 @@ class ClientData:
        
     Arguments:
         connection -- socket.socket instance of client connection.
+        messages_queue -- queue.Queue (or FilterPipeline) shared by all clients, received messages are put to it
+        flusher -- OutboundFlusher shared by all clients. Sends queued messages when socket becomes writable
+        high_water_mark (default OUTBOUND_HIGH_WATER_MARK) -- max count of messages waiting to be sent to client
+        max_bytes (default OUTBOUND_MAX_BYTES) -- max size of messages waiting to be sent to client
+        disconnect_slow (default 'False') -- disconnect client if outbound limits were reached, otherwise drop new messages
+        on_disconnect (default 'None') -- function which is called with ClientData instance after client disconnected
+        allow_compression (default 'True') -- enable compression if client supports it
+        rate_limit (default 'None') -- ClientRateLimit of client. Messages over the limit never reach dispatcher
+        on_flood (default 'None') -- function which is called with ClientData instance 
+                if client keeps sending messages over the limit
+        handshake_deadline (default 'None') -- time.monotonic() value until which client has to send nickname.
+                Waits for nickname without limit if 'None'
     
     Attributes:
         connection -- handle client's connection
         admin (default 'False') -- represents clients status on server ('True' if client is administrator, otherwise 'False') 
         nickname -- client's name
-        messages_queue -- list of Message instances. Messages which were received from client
+        resume_from (default 'None') -- sequence number of the last message received by client before reconnect. 
+                'None' if client did not ask to resume
+        compression -- 'True' if compression was negotiated. Large frames are sent compressed then
+        last_activity -- time.monotonic() value when data was received from client last time
+        room (default DEFAULT_ROOM) -- room where client's messages are sent
+        messages_queue -- shared queue.Queue of Message instances. Messages which were received from client
+        outbound -- OutboundQueue of encoded frames which are waiting for client's socket to become writable
+        receiving_stopped -- 'True' if server stopped receiving from client before shutdown
+        receiver_done -- threading.Event which is set when connection handler stopped receiving
+        tls -- 'True' if connection is ssl.SSLSocket. It is received from under outbound_lock then,
+                because OpenSSL connection must not be used by two threads at once
+        poller -- select.poll object which waits until connection is readable, created on accept.
+                'None' where poll does not exist (Windows), select.select is used then
     """
-    def __init__(self, connection: socket.socket) -> None:
+    __slots__ = (
+        'connection', 'admin', 'nickname', 'resume_from', 'compression', 'room', 'messages_queue', 'last_activity',
+        'connection_thread', '_decoder', '_allow_compression', '_handshake_deadline', '_flusher', '_outbound',
+        '_outbound_lock', '_accepted', '_disconnect_slow', '_on_disconnect', '_rate_limit', '_on_flood',
+        '_receiving_stopped', '_receiver_done', '_tls', '_poller'
+        )
+
+    def __init__(
+        self, connection: socket.socket, messages_queue: queue.Queue, flusher: OutboundFlusher,
+        high_water_mark: int = OUTBOUND_HIGH_WATER_MARK, max_bytes: int = OUTBOUND_MAX_BYTES,
+        disconnect_slow: bool = False, on_disconnect: Callable[['ClientData'], None] | None = None,
+        allow_compression: bool = True, rate_limit: ClientRateLimit | None = None,
+        on_flood: Callable[['ClientData'], None] | None = None, handshake_deadline: float | None = None
+    ) -> None:
         self.connection = connection
         self.admin = False
+        self._decoder = FrameDecoder(allow_compressed=False)
+        self.resume_from: int | None = None
+        self.compression = False
+        self._allow_compression = allow_compression
+        self._handshake_deadline = handshake_deadline
         self.nickname = self._get_nickname()
-        self.messages_queue: list[Message] = []
+        self.room = DEFAULT_ROOM
+        self.messages_queue: queue.Queue[Message] = messages_queue
+        self._flusher = flusher
+        self._outbound = OutboundQueue(high_water_mark, max_bytes)
+        self._outbound_lock = threading.Lock()
+        self._accepted = False
+        self._disconnect_slow = disconnect_slow
+        self._on_disconnect = on_disconnect
+        self._rate_limit = rate_limit
+        self._on_flood = on_flood
+        self.last_activity = time.monotonic()
+        self._receiving_stopped = False
+        self._receiver_done = threading.Event()
+        self._tls = isinstance(connection, ssl.SSLSocket)
+        self._poller = None
 
     def _connection_handler(self) -> str:
         """Handle connection with client"""
         while self.connection:
             try:
-                self._get_message_from_client()
-            except (OSError, ConnectionAbortedError, ConnectionResetError):
-                return f'{self.nickname} disconnected'
-
-    def _get_message_from_client(self) -> None:
-        """Receive message from client"""
-        message = self.connection.recv(1024)
-        if not message:
-            return
-        self._add_message_to_queue(message.decode())
+                if not self._get_message_from_client():
+                    break
+            except (OSError, ConnectionAbortedError, ConnectionResetError, ProtocolError):
+                break
+        self._receiver_done.set()
+        if self._receiving_stopped:
+            # Server is shutting down and still sends queued messages, it disconnects client itself
+            return f'{self.nickname} stopped receiving'
+        self.disconnect()
+        if self._on_disconnect is not None:
+            self._on_disconnect(self)
+        return f'{self.nickname} disconnected'
+
+    def _get_message_from_client(self) -> bool:
+        """Receive data from client and queue every complete message frame from it.
+           Return 'False' if client closed connection
+        """
+        if not self._tls:
+            if not self._wait_readable():
+                return False
+            try:
+                data = self.connection.recv(RECV_BUFFER_SIZE)
+            except BlockingIOError:
+                return True
+        else:
+            if not tls_pending(self.connection) and not self._wait_readable():
+                return False
+            try:
+                with self._outbound_lock:
+                    data = self.connection.recv(RECV_BUFFER_SIZE)
+            except WOULD_BLOCK:
+                return True
+        if not data:
+            return False
+        BYTES_IN.inc(len(data))
+        self.last_activity = time.monotonic()
+        self._decoder.feed(data)
+        for frame in self._decoder:
+            self._handle_frame(frame)
+        return True
+
+    def _wait_readable(self) -> bool:
+        """Block until data (or end of stream) can be received. Return 'False' if connection was closed.
+           select.select fails for descriptors over FD_SETSIZE (1024), so poll is used where it exists
+        """
+        if (descriptor:=self.connection.fileno()) < 0:
+            return False
+        if self._poller is None:
+            select.select([descriptor], [], [])
+        else:
+            self._poller.poll()
+        return True
+
+    def _handle_frame(self, frame: Frame) -> None:
+        """Queue message frame, answer ping frame. Other frames (e.g. pong) only mean that client is alive.
+           Message longer than MAX_MESSAGE_SIZE is dropped, it would not fit in frame with sender's nickname
+        """
+        if frame.type is FrameType.MESSAGE:
+            if len(frame.payload) > MAX_MESSAGE_SIZE:
+                self.send_message('Your message is too long, it was not sent')
+                return
+            self._add_message_to_queue(frame.text)
+        elif frame.type is FrameType.PING:
+            self.send_frame(encode_frame(FrameType.PONG))
 
     def _add_message_to_queue(self, message: str) -> None:
-        """Create Message instance and add it to messages_queue list"""
+        """Create Message instance and put it to shared messages_queue if client did not reach rate limit"""
+        if (limit:=self._rate_limit) is not None:
+            was_limited = limit.limited
+            if not limit.allow():
+                self._drop_limited_message(notify=not was_limited)
+                return
         msg = Message(message, sender=self)
-        self.messages_queue.append(msg)
+        MESSAGES_IN.inc()
+        self.messages_queue.put(msg)
+
+    def _drop_limited_message(self, notify: bool) -> None:
+        """Drop message over rate limit. Warn client once per flood, call on_flood if client does not stop"""
+        RATE_LIMITED_MESSAGES.inc()
+        if self._rate_limit.flooding and self._on_flood is not None:
+            if not self._outbound.closed:
+                self._on_flood(self)
+        elif notify:
+            self.send_message('You are sending messages too fast, some of them were dropped')
 
     def _create_new_connection_thread(self) -> threading.Thread:
         """Create new thread to handle connection with client"""
@@ -48,46 +196,232 @@ class ClientData:
         self.connection_thread.start()
 
     def _get_nickname(self) -> str:
-        """Receive nickname from client"""
-        while True:
-            try:
-                nickname = self.connection.recv(64).decode()
-                if nickname:
-                    return nickname
-            except (OSError, ConnectionAbortedError, ConnectionResetError):
-                break
+        """Receive nickname (and optional resume and capabilities frames before it) from client. 
+           Return 'None' if client did not send nickname frame
+        """
+        try:
+            frame = self._receive_handshake_frame()
+            while frame is not None and self._handle_handshake_frame(frame):
+                frame = self._receive_handshake_frame()
+        except TimeoutError:
+            HANDSHAKE_TIMEOUTS.inc()
+            return
+        except (OSError, ConnectionAbortedError, ConnectionResetError, ProtocolError):
+            return
+        if frame is not None and frame.type is FrameType.NICKNAME:
+            return frame.text
+
+    def _receive_handshake_frame(self) -> Frame | None:
+        """Block until one frame is received. Return 'None' if connection was closed.
+           Raise TimeoutError if handshake deadline passed, even if client keeps sending frame byte by byte
+        """
+        while (frame:=self._decoder.next_frame()) is None:
+            if self._handshake_deadline is not None:
+                if (remaining:=self._handshake_deadline - time.monotonic()) <= 0:
+                    raise TimeoutError('Handshake timed out')
+                self.connection.settimeout(remaining)
+            data = self.connection.recv(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            self._decoder.feed(data)
+        return frame
+
+    def _handle_handshake_frame(self, frame: Frame) -> bool:
+        """Apply optional frame which client sends before nickname. Return 'False' if it is not such frame"""
+        if frame.type is FrameType.RESUME:
+            self.resume_from = frame.sequence
+            return True
+        if frame.type is FrameType.CAPABILITIES:
+            self.compression = self._allow_compression and DEFLATE in frame.text.split(',')
+            # Client may send compressed frames only if server confirms compression
+            self._decoder.allow_compressed = self.compression
+            return True
+        return False
+
+    def compress(self, frames: bytes) -> bytes:
+        """Compress encoded frames if compression was negotiated and they are large enough"""
+        if not self.compression or len(frames) < COMPRESSION_THRESHOLD:
+            return frames
+        started = time.perf_counter()
+        compressed = compress_frames(frames)
+        COMPRESSION_SECONDS.inc(time.perf_counter() - started)
+        COMPRESSION_SAVED_BYTES.inc(len(frames) - len(compressed))
+        return compressed
     
     def send_message(self, msg: str) -> None:
-        self.connection.sendall(msg.encode())
+        self.send_frame(self.compress(encode_frame(FrameType.MESSAGE, msg)))
+
+    def send_frame(self, frame: bytes) -> bool:
+        """Send already encoded frame without blocking.
+           If socket is not writable (or client is not accepted yet), frame is queued and sent later by flusher.
+           Return 'False' if client is too slow and frame was dropped
+        """
+        with self._outbound_lock:
+            if self._outbound or self._outbound.closed or not self._accepted:
+                queued = self._outbound.put(frame)
+            else:
+                queued = self._send_directly(frame)
+        if not queued:
+            DROPPED_MESSAGES.inc()
+            if self._disconnect_slow:
+                self.disconnect()
+        return queued
+
+    def _send_directly(self, frame: bytes) -> bool:
+        """Send as much of frame as socket accepts now, queue the rest.
+           Rest of partly sent frame is queued even over outbound limits, dropping it would break the stream
+        """
+        try:
+            sent = self.connection.send(frame)
+        except WOULD_BLOCK:
+            sent = 0
+        except OSError:
+            SEND_ERRORS.inc()
+            self._outbound.send_failed()
+            return False
+        if sent == len(frame):
+            return True
+        if not self._outbound.put(memoryview(frame)[sent:], force=bool(sent)):
+            return False
+        self._flusher.watch(self)
+        return True
+
+    def flush(self) -> bool:
+        """Send queued frames while socket is writable. 
+           Return 'True' if nothing is left to send (or connection is broken)
+        """
+        with self._outbound_lock:
+            while self._outbound:
+                try:
+                    sent = self.connection.send(self._outbound.peek())
+                except WOULD_BLOCK:
+                    return False
+                except OSError:
+                    SEND_ERRORS.inc()
+                    self._outbound.send_failed()
+                    self._outbound.close()
+                    return True
+                self._outbound.consume(sent)
+            return True
+
+    def stop_receiving(self) -> None:
+        """Stop receiving from client, but keep sending to it. 
+           Data which client already sent is still received, then connection handler stops
+        """
+        self._receiving_stopped = True
+        try:
+            # SSLSocket.shutdown drops TLS state of connection, so socket is shut down directly
+            socket.socket.shutdown(self.connection, socket.SHUT_RD)
+        except OSError:
+            self._receiver_done.set()
+
+    def wait_receiving_stopped(self, timeout: float) -> bool:
+        """Wait until all data which client sent before stop_receiving is received and queued"""
+        return self._receiver_done.wait(timeout)
+
+    def ping(self) -> None:
+        """Ask client to answer, so silent but alive client is not evicted"""
+        self.send_frame(encode_frame(FrameType.PING))
+
+    @property
+    def closed(self) -> bool:
+        """'True' if connection was closed and nothing can be sent to client anymore"""
+        return self._outbound.closed
+
+    @property
+    def outbound_stats(self) -> OutboundStats:
+        with self._outbound_lock:
+            return self._outbound.stats()
+
+    @property
+    def outbound_space(self) -> int:
+        """Size of frame which may be sent to client now without being dropped"""
+        with self._outbound_lock:
+            return self._outbound.free_bytes
+
+    def disconnect(self) -> None:
+        """Close connection with client and stop sending messages to it"""
+        with self._outbound_lock:
+            self._outbound.close()
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+    def kick(self, reason: str) -> None:
+        """Send reason in the last frame and disconnect client, so client knows it must not reconnect.
+           Queued frames are dropped, only the rest of frame which is being sent goes before the reason
+        """
+        with self._outbound_lock:
+            data = self._outbound.partial_frame() + encode_frame(FrameType.DECLINE, reason)
+            self._outbound.close()
+            try:
+                self.connection.send(data)
+            except OSError:
+                pass
+        self.disconnect()
 
     def decline(self, reason: str) -> None:
         """Close connection if client was not verified and send a reason to client"""
-        self.connection.sendall(f'{reason}'.encode())
+        self.connection.sendall(encode_frame(FrameType.DECLINE, reason))
         self.connection.close()
 
-    def accept(self) -> None:
-        """Send 'True' if client was successfully verified"""
-        self.connection.sendall(b'True')
+    def accept(self, history: bytes = b'') -> None:
+        """Send accept frame and history (in one write) if client was successfully verified.
+           After that socket works in non-blocking mode, so sending to client never blocks
+        """
+        self.connection.sendall(self._accept_frame() + self.compress(history))
+        self.connection.setblocking(False)
+        if hasattr(select, 'poll'):
+            self._poller = select.poll()
+            self._poller.register(self.connection, select.POLLIN)
+        with self._outbound_lock:
+            self._accepted = True
+            queued_before_accept = bool(self._outbound)
+        if queued_before_accept:
+            self._flusher.watch(self)
         self._create_new_connection_thread()
 
 
+    def _accept_frame(self) -> bytes:
+        """Encode accept frame with list of enabled capabilities"""
+        return encode_frame(FrameType.ACCEPT, DEFLATE if self.compression else '')
+
+
 class Message:
-    """Class to create client's message instance.
+    """Class to create client's message instance. Slotted and read-only after creation, 
+       because one instance is created for every received message.
 
     Attributes:
         msg -- client's message
         sender -- ClientData instance
+        room -- room where message is sent. Sender's room when message is dispatched (not received), 
+                so message follows /join or /leave which was sent before it. DEFAULT_ROOM if there is no sender
         is_command -- represents message type. 'True' if message is command, otherwise 'False'
+        received_at -- time.monotonic() value when message was received, used to measure dispatch latency
+        edited -- message with sender's nickname (and room) as it is sent to clients. Built on first access
     """
+    __slots__ = ('_msg', '_sender', '_room', '_is_command', 'received_at', '_edited')
+
     def __init__(self, msg: str, sender: ClientData = None) -> None:
         self._msg = msg
         self._sender = sender
-        self._is_command = True if self._msg.startswith(COMMAND_PREFIX) else False
+        self._room: str | None = None
+        self._is_command = msg.startswith(COMMAND_PREFIX)
+        self.received_at = time.monotonic()
+        self._edited: str | None = None
 
     @property
     def text(self) -> str:
         return self._msg
 
+    @property
+    def room(self) -> str:
+        if (room:=self._room) is None:
+            room = self._room = self._sender.room if self._sender else DEFAULT_ROOM
+        return room
+
     @property
     def is_command(self) -> bool:
         return self._is_command
@@ -98,7 +432,21 @@ class Message:
 
     @property
     def edited(self) -> str:
-        return f"{self._sender.nickname}: {self._msg}"
+        if (edited:=self._edited) is None:
+            if (room:=self.room) == DEFAULT_ROOM:
+                edited = f"{self._sender.nickname}: {self._msg}"
+            else:
+                edited = f"[{room}] {self._sender.nickname}: {self._msg}"
+            self._edited = edited
+        return edited
+
+    def with_text(self, msg: str) -> 'Message':
+        """Return copy of message with another text, e.g. changed by filters. Receiving time is kept"""
+        message = Message(msg, self._sender)
+        message._room = self._room
+        message._is_command = self._is_command
+        message.received_at = self.received_at
+        return message
 
     def __repr__(self) -> str:
         return self.edited
\ No newline at end of file
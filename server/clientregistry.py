@@ -0,0 +1,57 @@
+import threading
+from typing import Iterator
+
+from clientdata import ClientData
+
+
+class ClientRegistry:
+    """Class to keep connected clients with O(1) access by nickname.
+       All methods are thread-safe.
+
+    Attributes:
+        clients -- dict of connected clients, nickname (key) corresponds to ClientData instance (value).
+                Keeps clients in order of registration
+        snapshot -- cached tuple of clients for iteration, rebuilt only after registry was changed
+        lock -- threading.Lock which guards clients dict
+    """
+    def __init__(self) -> None:
+        self._clients: dict[str, ClientData] = {}
+        self._snapshot: tuple[ClientData, ...] | None = None
+        self._lock = threading.Lock()
+
+    def register(self, client: ClientData) -> bool:
+        """Add client to registry. Return 'False' if nickname is already taken"""
+        with self._lock:
+            if client.nickname in self._clients:
+                return False
+            self._clients[client.nickname] = client
+            self._snapshot = None
+            return True
+
+    def unregister(self, client: ClientData) -> bool:
+        """Remove client from registry. Return 'False' if client was not registered"""
+        with self._lock:
+            if self._clients.get(client.nickname) is not client:
+                return False
+            del self._clients[client.nickname]
+            self._snapshot = None
+            return True
+
+    def get(self, nickname: str) -> ClientData | None:
+        return self._clients.get(nickname)
+
+    def snapshot(self) -> tuple[ClientData, ...]:
+        """Return tuple of registered clients which is safe to iterate while registry changes"""
+        if (snapshot:=self._snapshot) is None:
+            with self._lock:
+                snapshot = self._snapshot = tuple(self._clients.values())
+        return snapshot
+
+    def __contains__(self, nickname: str) -> bool:
+        return nickname in self._clients
+
+    def __iter__(self) -> Iterator[ClientData]:
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self._clients)
@@ -0,0 +1,174 @@
+import enum
+import time
+from typing import Any, Callable, NamedTuple
+
+from clientdata import ClientData
+from clientregistry import ClientRegistry
+from metrics import COMMAND_SECONDS, COMMANDS
+from settings import COMMAND_PREFIX
+
+
+class AdminCommandResult(NamedTuple):
+    """Class that will be returned after command execution.
+
+    Attributes:
+        completed -- 'True' if request was successfully completed, otherwise 'False'
+        text -- covered message after execution
+    """
+    completed: bool
+    text: str
+
+    def __repr__(self):
+        return f"{self.completed} -- {self.text}"
+
+
+class Permission(enum.IntEnum):
+    """Who may execute command. Caller may execute commands of its own and of lower levels
+
+    USER -- any client
+    ADMIN -- clients with admin status and server terminal
+    TERMINAL -- server terminal only
+    """
+    USER = 0
+    ADMIN = 1
+    TERMINAL = 2
+
+
+class CommandError(Exception):
+    """Raised when command can not be executed, e.g. arguments are invalid. Text is sent to caller"""
+
+
+class Argument(NamedTuple):
+    """Class to describe one argument of command.
+
+    Attributes:
+        name -- name of argument shown in usage
+        type (default str) -- str, int, float or ClientData. ClientData argument is a nickname of connected client
+        rest (default 'False') -- argument takes the rest of the line, including spaces. Only last argument may
+        filtered (default 'False') -- argument is text for other clients (e.g. direct message), 
+                so it passes message filters like chat messages do. Only last argument which takes the rest may
+    """
+    name: str
+    type: type = str
+    rest: bool = False
+    filtered: bool = False
+
+
+class Command(NamedTuple):
+    """Class to describe registered command.
+
+    Attributes:
+        name -- command with prefix, e.g. '/kick'
+        handler -- function which is called with caller (ClientData or 'None' for terminal) and parsed arguments
+        arguments -- tuple of Argument instances
+        permission -- lowest Permission which may execute command
+        client_only -- 'True' if command makes sense only for clients, e.g. joining a room
+        help -- short description shown by /help
+    """
+    name: str
+    handler: Callable[..., AdminCommandResult]
+    arguments: tuple[Argument, ...]
+    permission: Permission
+    client_only: bool
+    help: str
+
+    @property
+    def usage(self) -> str:
+        return ' '.join([self.name, *(f'<{argument.name}>' for argument in self.arguments)])
+
+
+def command(
+    name: str, *arguments: Argument, permission: Permission = Permission.USER, client_only: bool = False,
+    help: str = ''
+) -> Callable:
+    """Decorator which marks method as command handler.
+       Marked methods are added to CommandRegistry when their instance is registered
+    """
+    def decorator(handler: Callable) -> Callable:
+        handler.command = Command(name, handler, arguments, permission, client_only, help)
+        return handler
+    return decorator
+
+
+class CommandRegistry:
+    """Class to keep all commands of server and execute them for clients and terminal.
+       Counts invocations and time of every command in metrics.
+
+    Arguments:
+        clients -- link to ClientRegistry of connected to server users. Used to parse ClientData arguments
+
+    Attributes:
+        commands -- dict of commands, name (key) corresponds to Command instance with bound handler (value)
+    """
+    def __init__(self, clients: ClientRegistry) -> None:
+        self._clients = clients
+        self._commands: dict[str, Command] = {}
+        self.register(self)
+
+    def register(self, owner: object) -> None:
+        """Add all methods of owner which were marked by command decorator. Replaces commands with the same name"""
+        for attribute in dir(type(owner)):
+            if (marked:=getattr(getattr(type(owner), attribute), 'command', None)) is None:
+                continue
+            self._commands[marked.name] = marked._replace(handler=getattr(owner, attribute))
+
+    def execute(self, text: str, sender: ClientData | None = None) -> AdminCommandResult:
+        """Parse and execute command of client (or of terminal if sender is 'None')"""
+        name = text.split(maxsplit=1)[0]
+        if (command:=self._commands.get(name)) is None or not self._allowed(command, sender):
+            return AdminCommandResult(False, f'Unknown command {name}, use {COMMAND_PREFIX}help')
+        started = time.perf_counter()
+        try:
+            result = command.handler(sender, *self._parse_arguments(command, text))
+        except CommandError as error:
+            result = AdminCommandResult(False, str(error))
+        COMMANDS.inc(label_value=name)
+        COMMAND_SECONDS.inc(time.perf_counter() - started, label_value=name)
+        return result
+
+    def split_filtered(self, text: str) -> tuple[str, str] | None:
+        """Split command to its beginning and its last argument, if this argument has to pass message filters.
+           Return 'None' if command has no such argument, is unknown or is invalid
+        """
+        name = text.split(maxsplit=1)[0]
+        if (command:=self._commands.get(name)) is None or not command.arguments or not command.arguments[-1].filtered:
+            return
+        tokens = text.split(maxsplit=len(command.arguments))
+        if len(tokens) != len(command.arguments) + 1:
+            return
+        return text[:len(text) - len(tokens[-1])], tokens[-1]
+
+    def _allowed(self, command: Command, sender: ClientData | None) -> bool:
+        """Check if sender may execute command"""
+        if sender is None:
+            return not command.client_only
+        return command.permission <= (Permission.ADMIN if sender.admin else Permission.USER)
+
+    def _parse_arguments(self, command: Command, text: str) -> list[Any]:
+        """Split text to arguments of command and convert them to their types. Raise CommandError if invalid"""
+        arguments = command.arguments
+        if arguments and arguments[-1].rest:
+            tokens = text.split(maxsplit=len(arguments))[1:]
+        else:
+            tokens = text.split()[1:]
+        if len(tokens) != len(arguments):
+            raise CommandError(f'Usage: {command.usage}')
+        return [self._parse_argument(argument, token) for argument, token in zip(arguments, tokens)]
+
+    def _parse_argument(self, argument: Argument, token: str) -> Any:
+        if argument.type is ClientData:
+            if (client:=self._clients.get(token)) is None:
+                raise CommandError(f'{token} is not connected')
+            return client
+        try:
+            return argument.type(token)
+        except ValueError:
+            raise CommandError(f'{argument.name} must be {argument.type.__name__}')
+
+    @command('/help', help='Show commands which you may use')
+    def _help(self, sender: ClientData | None) -> AdminCommandResult:
+        lines = [
+            f'{command.usage} -- {command.help}' if command.help else command.usage
+            for name, command in sorted(self._commands.items()) if self._allowed(command, sender)
+            ]
+        return AdminCommandResult(True, '\n'.join(lines))
@@ -0,0 +1,264 @@
+import collections
+import functools
+import multiprocessing
+import queue
+import re
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from clientdata import ClientData, Message
+from metrics import FILTER_DROPPED, FILTER_ERRORS, FILTER_MESSAGES, FILTER_SECONDS
+
+
+class MessageFilter:
+    """Base class of pipeline stage. Stage gets text of message and returns changed text or 'None' to drop message.
+       Stages get only text, so they may run in another process, that is why they must be picklable.
+
+    Attributes:
+        name -- name of stage in metrics and in notice which is sent to sender of dropped message
+    """
+    name = 'filter'
+
+    def __call__(self, text: str) -> str | None:
+        raise NotImplementedError
+
+
+class LengthFilter(MessageFilter):
+    """Drop messages which are longer than max_length characters"""
+    name = 'length'
+
+    def __init__(self, max_length: int) -> None:
+        self._max_length = max_length
+
+    def __call__(self, text: str) -> str | None:
+        return text if len(text) <= self._max_length else None
+
+
+class WordFilter(MessageFilter):
+    """Replace banned words with asterisks. Case is ignored, only whole words are replaced"""
+    name = 'words'
+
+    def __init__(self, words: Iterable[str]) -> None:
+        # Longer words go first, so a word is not cut by its banned prefix
+        words = sorted({word.lower() for word in words if word}, key=len, reverse=True)
+        self._pattern = re.compile(rf'\b(?:{"|".join(map(re.escape, words))})\b', re.IGNORECASE) if words else None
+
+    def __call__(self, text: str) -> str | None:
+        if self._pattern is None:
+            return text
+        return self._pattern.sub(lambda match: '*' * len(match.group()), text)
+
+
+class LinkFilter(MessageFilter):
+    """Detect links in messages and replace them with placeholder, or drop such messages at all
+
+    Arguments:
+        drop (default 'False') -- drop messages with links instead of replacing links
+    """
+    name = 'links'
+    LINK = re.compile(r'\b(?:[a-z][a-z0-9+.-]*://|www\.)\S+', re.IGNORECASE)
+
+    def __init__(self, drop: bool = False) -> None:
+        self._drop = drop
+
+    def __call__(self, text: str) -> str | None:
+        if self._drop:
+            return None if self.LINK.search(text) else text
+        return self.LINK.sub('<link removed>', text)
+
+
+def apply_filters(filters: tuple[MessageFilter, ...], text: str) -> tuple[str | None, list[float], bool]:
+    """Pass text through stages in order until one of them drops it.
+       Return filtered text ('None' if it was dropped), seconds spent in every stage which ran
+       and 'True' if the last of them failed. Failed stage drops message
+    """
+    timings = []
+    for stage in filters:
+        started = time.perf_counter()
+        try:
+            text = stage(text)
+        except Exception:
+            timings.append(time.perf_counter() - started)
+            return None, timings, True
+        timings.append(time.perf_counter() - started)
+        if text is None:
+            break
+    return text, timings, False
+
+
+_process_filters: tuple[MessageFilter, ...] = ()
+
+
+def _install_filters(filters: tuple[MessageFilter, ...]) -> None:
+    """Keep stages in pool process, so they are not sent with every message"""
+    global _process_filters
+    _process_filters = filters
+
+
+def _apply_process_filters(text: str) -> tuple[str | None, list[float], bool]:
+    return apply_filters(_process_filters, text)
+
+
+class FilterPipeline:
+    """Class to pass messages through ordered filters before dispatching. Filters run in thread or process pool,
+       never in dispatcher thread, so slow filter delays only messages which were not filtered yet.
+       Messages of one sender leave pipeline in order they came, messages of different senders are filtered
+       in parallel. Commands are not filtered, but keep their place among messages of sender. 
+       Only text argument of command which is sent to other clients (e.g. direct message) is filtered.
+       Has 'put' like queue.Queue, so clients use it as their messages queue.
+
+    Arguments:
+        filters -- ordered list of MessageFilter stages. Messages go directly to messages_queue if it is empty
+        messages_queue -- queue.Queue of dispatcher, filtered messages are put to it
+        workers -- count of threads or processes which run filters
+        processes (default 'False') -- run filters in process pool, so they do not hold GIL of server
+        split_command (default 'None') -- function which splits command to its beginning and its argument 
+                which has to be filtered. Returns 'None' if nothing in command is filtered
+
+    Attributes:
+        pool -- ThreadPoolExecutor or ProcessPoolExecutor, 'None' if there are no filters.
+                Pool which broke (e.g. its process was killed) is replaced with a new one
+        pool_lock -- threading.Lock which guards replacing of pool
+        closed -- 'True' if pipeline was closed, messages are dropped then instead of being filtered
+        pending -- dict of senders which messages are being filtered, sender (key) corresponds to
+                collections.deque of its next messages which wait for the previous one (value)
+        lock -- threading.Condition which guards pending and is notified when pipeline gets empty
+    """
+    def __init__(
+        self, filters: list[MessageFilter], messages_queue: queue.Queue, workers: int, processes: bool = False,
+        split_command: Callable[[str], tuple[str, str] | None] | None = None
+    ) -> None:
+        self._filters = tuple(filters)
+        self._messages_queue = messages_queue
+        self._split_command = split_command
+        self._workers = workers
+        self._processes = processes
+        if processes:
+            self._apply = _apply_process_filters
+        else:
+            self._apply = functools.partial(apply_filters, self._filters)
+        self._pool = self._create_pool() if self._filters else None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self._pending: dict[ClientData, collections.deque[Message]] = {}
+        self._lock = threading.Condition()
+
+    def _create_pool(self) -> ThreadPoolExecutor | ProcessPoolExecutor:
+        if not self._processes:
+            return ThreadPoolExecutor(self._workers, thread_name_prefix='filter')
+        # Forked processes would inherit sockets of server and clients, so pool processes are spawned
+        return ProcessPoolExecutor(
+            self._workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_install_filters, initargs=(self._filters,)
+            )
+
+    def put(self, message: Message) -> None:
+        """Filter message after all previous messages of its sender, then put it to messages queue"""
+        if self._pool is None:
+            self._messages_queue.put(message)
+            return
+        sender = message.get_sender
+        with self._lock:
+            if (waiting:=self._pending.get(sender)) is not None:
+                waiting.append(message)
+                return
+            self._pending[sender] = collections.deque()
+        self._submit(message)
+
+    def join(self, timeout: float) -> bool:
+        """Wait until all received messages leave pipeline. Return 'False' if timeout expired before"""
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._pending, timeout)
+
+    def close(self) -> None:
+        with self._pool_lock:
+            self._closed = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self) -> int:
+        """Count of messages in pipeline"""
+        with self._lock:
+            return sum(len(waiting) + 1 for waiting in self._pending.values())
+
+    def _submit(self, message: Message | None) -> None:
+        """Send message to pool. Commands without filtered argument go to messages queue at once, 
+           when all previous messages left pipeline. Message which pool did not take is finished here too,
+           so next messages of sender are never stuck behind it
+        """
+        while message is not None:
+            beginning, text = self._split(message)
+            if text is None:
+                message = self._finish(message.get_sender, message)
+                continue
+            if not (future:=self._run(text)).done():
+                future.add_done_callback(functools.partial(self._filtered, message, beginning))
+                return
+            message = self._result(message, beginning, future)
+
+    def _run(self, text: str) -> Future:
+        """Submit filters of text to pool. Broken pool is replaced once, 
+           if it does not help (or pipeline was closed) returned future has the error
+        """
+        for _ in range(2):
+            pool = self._pool
+            try:
+                return pool.submit(self._apply, text)
+            except BrokenExecutor as error:
+                failure = error
+                with self._pool_lock:
+                    if self._pool is pool and not self._closed:
+                        self._pool = self._create_pool()
+                        pool.shutdown(wait=False, cancel_futures=True)
+            except RuntimeError as error:
+                # Pool was shut down
+                failure = error
+                break
+        future = Future()
+        future.set_exception(failure)
+        return future
+
+    def _split(self, message: Message) -> tuple[str, str | None]:
+        """Return beginning of message which is not filtered and the rest which is ('None' if nothing is)"""
+        if not message.is_command:
+            return '', message.text
+        if self._split_command is None or (parts:=self._split_command(message.text)) is None:
+            return message.text, None
+        return parts
+
+    def _filtered(self, message: Message, beginning: str, future: Future) -> None:
+        """Called in pool thread when filters of message finished"""
+        self._submit(self._result(message, beginning, future))
+
+    def _result(self, message: Message, beginning: str, future: Future) -> Message | None:
+        """Record timings of stages and pass result on. Failed or broken pool drops message.
+           Return next message of sender
+        """
+        try:
+            text, timings, failed = future.result()
+        except Exception:
+            # Pool was shut down or its process died
+            text, timings, failed = None, [], True
+        for stage, seconds in zip(self._filters, timings):
+            FILTER_MESSAGES.inc(label_value=stage.name)
+            FILTER_SECONDS.inc(seconds, label_value=stage.name)
+        if text is None:
+            stage_name = self._filters[len(timings) - 1].name if timings else 'pool'
+            (FILTER_ERRORS if failed else FILTER_DROPPED).inc(label_value=stage_name)
+            message.get_sender.send_message(f'Your message was blocked by {stage_name} filter')
+        elif beginning + text != message.text:
+            message = message.with_text(beginning + text)
+        return self._finish(message.get_sender, message if text is not None else None)
+
+    def _finish(self, sender: ClientData, message: Message | None) -> Message | None:
+        """Put filtered message to messages queue and return next message of sender, 'None' if there is no one"""
+        if message is not None:
+            self._messages_queue.put(message)
+        with self._lock:
+            if waiting:=self._pending[sender]:
+                return waiting.popleft()
+            del self._pending[sender]
+            if not self._pending:
+                self._lock.notify_all()
@@ -0,0 +1,153 @@
+import collections
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+from common.protocol import FrameType, encode_frame
+from settings import DEFAULT_ROOM, HISTORY_ROOMS_LIMIT
+
+
+class MessageHistory:
+    """Class to keep chat history.
+       Last messages of every room are kept in memory as encoded frames, so they can be replayed to a new 
+       room subscriber with one write. All messages are appended to sqlite log by a separate thread in batches.
+
+    Arguments:
+        size -- count of last messages of every room which are kept in memory and replayed to new subscribers
+        path (default 'None') -- path to sqlite log file. History is kept only in memory if 'None'
+        flush_interval (default 0.5) -- max time in seconds messages wait before they are written to the log
+        readonly (default 'False') -- only load last messages from the log, do not write to it. 
+                Used when another process writes the same log
+        max_rooms (default HISTORY_ROOMS_LIMIT) -- count of rooms whose last messages are kept in memory.
+                History of room which got a message longest ago is dropped from memory (not from the log).
+                History of DEFAULT_ROOM is never dropped
+
+    Attributes:
+        rooms -- collections.OrderedDict of ring buffers, room name (key) corresponds to collections.deque 
+                of last messages (value). Rooms which got a message lately are at the end.
+                Every message is a pair of its sequence number and encoded frame. 
+                Messages loaded from the log have sequence number 0, they are not replayed on resume
+        pending -- queue.Queue of messages waiting to be written to the log. 'None' stops writer thread
+    """
+    def __init__(
+        self, size: int, path: str | None = None, flush_interval: float = 0.5, readonly: bool = False,
+        max_rooms: int = HISTORY_ROOMS_LIMIT
+    ) -> None:
+        self._size = size
+        self._path = path
+        self._flush_interval = flush_interval
+        self._readonly = readonly
+        self._max_rooms = max_rooms
+        self._rooms: collections.OrderedDict[str, collections.deque[tuple[int, bytes]]] = collections.OrderedDict()
+        self._pending: queue.Queue[tuple[float, str, str] | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer_thread: threading.Thread | None = None
+        if self._path is not None:
+            self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS messages '
+            '(id INTEGER PRIMARY KEY, created REAL NOT NULL, room TEXT NOT NULL, text TEXT NOT NULL)'
+            )
+        return connection
+
+    def _load(self) -> None:
+        """Fill ring buffers with last messages of rooms which got messages lately (and DEFAULT_ROOM) from the log"""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT room, text FROM ('
+                'SELECT id, room, text, ROW_NUMBER() OVER (PARTITION BY room ORDER BY id DESC) AS position '
+                'FROM messages WHERE room = ? OR room IN '
+                '(SELECT room FROM messages GROUP BY room ORDER BY MAX(id) DESC LIMIT ?)'
+                ') WHERE position <= ? ORDER BY id', (DEFAULT_ROOM, self._max_rooms, self._size)
+                ).fetchall()
+        finally:
+            connection.close()
+        for room, text in rows:
+            self._room_frames(room).append((0, encode_frame(FrameType.MESSAGE, text)))
+
+    def _room_frames(self, room: str) -> collections.deque[tuple[int, bytes]]:
+        """Return ring buffer of room which gets a message, create it (dropping the oldest one) if needed"""
+        if (frames:=self._rooms.get(room)) is not None:
+            self._rooms.move_to_end(room)
+            return frames
+        if len(self._rooms) >= self._max_rooms:
+            oldest = next(iter(self._rooms))
+            if oldest == DEFAULT_ROOM:
+                self._rooms.move_to_end(DEFAULT_ROOM)
+                oldest = next(iter(self._rooms))
+            if oldest != DEFAULT_ROOM:
+                del self._rooms[oldest]
+        frames = self._rooms[room] = collections.deque(maxlen=self._size)
+        return frames
+
+    def append(self, room: str, text: str, frame: bytes, sequence: int) -> None:
+        """Add message to room history. Frame is the already encoded message which was sent to clients"""
+        with self._lock:
+            self._room_frames(room).append((sequence, frame))
+        if self._path is not None and not self._readonly:
+            self._pending.put((time.time(), room, text))
+
+    def replay(self, room: str, after: int | None = None) -> bytes:
+        """Return last messages of room joined in one chunk ready to be sent.
+           If 'after' is given, return only messages with greater sequence number
+        """
+        with self._lock:
+            if after is None:
+                return b''.join(frame for _, frame in self._rooms.get(room, ()))
+            return b''.join(frame for sequence, frame in self._rooms.get(room, ()) if sequence > after)
+
+    def replay_tail(self, room: str, max_bytes: int) -> tuple[bytes, int]:
+        """Return the newest messages of room which fit in max_bytes joined in one chunk 
+           and count of older messages which did not fit
+        """
+        with self._lock:
+            frames = self._rooms.get(room, ())
+            kept, size = 0, 0
+            for _, frame in reversed(frames):
+                if size + len(frame) > max_bytes:
+                    break
+                kept += 1
+                size += len(frame)
+            skipped = len(frames) - kept
+            return b''.join(frame for _, frame in itertools.islice(frames, skipped, None)), skipped
+
+    def start(self) -> None:
+        """Start log writer in new thread"""
+        if self._path is None or self._readonly:
+            return
+        self._writer_thread = threading.Thread(target=self._writer_handler, daemon=True)
+        self._writer_thread.start()
+
+    def close(self) -> None:
+        """Write all pending messages and stop log writer"""
+        if self._writer_thread is None:
+            return
+        self._pending.put(None)
+        self._writer_thread.join()
+
+    def _writer_handler(self) -> None:
+        """Collect messages for flush_interval and write them to the log in one transaction"""
+        connection = self._connect()
+        stop = False
+        while not stop:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while (timeout:=deadline - time.monotonic()) > 0 and batch[-1] is not None:
+                try:
+                    batch.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stop = True
+                batch.pop()
+            if batch:
+                with connection:
+                    connection.executemany('INSERT INTO messages (created, room, text) VALUES (?, ?, ?)', batch)
+        connection.close()
@@ -1,6 +1,22 @@
 import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from server import Server
+from settings import (
+    CLIENT_RATE_BURST, CLIENT_RATE_LIMIT, FILTER_WORKERS, FLOOD_KICK_THRESHOLD, GLOBAL_RATE_BURST, GLOBAL_RATE_LIMIT,
+    HANDSHAKE_TIMEOUT, HANDSHAKE_WORKERS, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HISTORY_SIZE, LISTEN_BACKLOG,
+    OUTBOUND_HIGH_WATER_MARK, OUTBOUND_MAX_BYTES, SHUTDOWN_TIMEOUT
+    )
+from asyncserver import AsyncServer
+from filters import LengthFilter, LinkFilter, MessageFilter, WordFilter
+from workers import AsyncWorkerServer, WorkerPool, WorkerServer
+
+
+ENGINES = {'threading': Server, 'asyncio': AsyncServer}
+WORKER_ENGINES = {'threading': WorkerServer, 'asyncio': AsyncWorkerServer}
 
 
 parser = argparse.ArgumentParser(description="Server settings")
@@ -24,6 +40,202 @@ parser.add_argument(
     dest='max_users',
     help='Max users to be able to connect to the server (8 by default)'
 )
+parser.add_argument(
+    "-hw", "--highWaterMark",
+    type=int,
+    required=False,
+    dest='high_water_mark',
+    help='Max count of messages waiting to be sent to one client (1024 by default)'
+)
+parser.add_argument(
+    "-mb", "--maxBufferBytes",
+    type=int,
+    required=False,
+    dest='max_buffer_bytes',
+    help='Max size in bytes of messages waiting to be sent to one client (1 MiB by default)'
+)
+parser.add_argument(
+    "-ds", "--disconnectSlow",
+    action='store_true',
+    dest='disconnect_slow',
+    help='Disconnect clients which reached outbound limits instead of dropping their messages'
+)
+parser.add_argument(
+    "-hs", "--historySize",
+    type=int,
+    required=False,
+    dest='history_size',
+    help='Count of last messages which are sent to a new client (100 by default)'
+)
+parser.add_argument(
+    "-hf", "--historyFile",
+    type=str,
+    required=False,
+    dest='history_file',
+    help='Path to sqlite file where all messages are logged (history is kept only in memory by default)'
+)
+parser.add_argument(
+    "-e", "--engine",
+    type=str,
+    required=False,
+    choices=ENGINES,
+    default='threading',
+    dest='engine',
+    help="Connections handling engine: thread per client or single asyncio event loop ('threading' by default)"
+)
+parser.add_argument(
+    "-w", "--workers",
+    type=int,
+    required=False,
+    default=1,
+    dest='workers',
+    help='Count of server processes sharing the port, requires SO_REUSEPORT (1 by default)'
+)
+parser.add_argument(
+    "-nc", "--noCompression",
+    action='store_true',
+    dest='no_compression',
+    help='Do not compress large messages even for clients which support it'
+)
+parser.add_argument(
+    "-rl", "--rateLimit",
+    type=float,
+    required=False,
+    dest='rate_limit',
+    help=f'Messages per second which one client may send, 0 disables the limit ({CLIENT_RATE_LIMIT} by default)'
+)
+parser.add_argument(
+    "-rb", "--rateBurst",
+    type=float,
+    required=False,
+    dest='rate_burst',
+    help=f'Messages which one client may send at once ({CLIENT_RATE_BURST} by default)'
+)
+parser.add_argument(
+    "-gl", "--globalRateLimit",
+    type=float,
+    required=False,
+    dest='global_rate_limit',
+    help=f'Messages per second which all clients of one server process may send, 0 disables the limit '
+         f'({GLOBAL_RATE_LIMIT} by default)'
+)
+parser.add_argument(
+    "-gb", "--globalRateBurst",
+    type=float,
+    required=False,
+    dest='global_rate_burst',
+    help=f'Messages which all clients of one server process may send at once ({GLOBAL_RATE_BURST} by default)'
+)
+parser.add_argument(
+    "-fk", "--floodKick",
+    type=int,
+    required=False,
+    dest='flood_kick',
+    help=f'Count of messages dropped during 10 seconds after which client is kicked, 0 disables kicking '
+         f'({FLOOD_KICK_THRESHOLD} by default)'
+)
+parser.add_argument(
+    "-hi", "--heartbeatInterval",
+    type=float,
+    required=False,
+    dest='heartbeat_interval',
+    help=f'Seconds of client\'s silence after which server pings it ({HEARTBEAT_INTERVAL} by default)'
+)
+parser.add_argument(
+    "-ht", "--heartbeatTimeout",
+    type=float,
+    required=False,
+    dest='heartbeat_timeout',
+    help=f'Seconds of client\'s silence after which it is disconnected, 0 disables disconnecting '
+         f'({HEARTBEAT_TIMEOUT} by default)'
+)
+parser.add_argument(
+    "-st", "--shutdownTimeout",
+    type=float,
+    required=False,
+    dest='shutdown_timeout',
+    help=f'Seconds which server waits on SIGTERM or /shutdown for queued messages to be sent to clients '
+         f'({SHUTDOWN_TIMEOUT} by default)'
+)
+parser.add_argument(
+    "-bl", "--backlog",
+    type=int,
+    required=False,
+    dest='backlog',
+    help=f'Max count of connections which wait to be accepted ({LISTEN_BACKLOG} by default)'
+)
+parser.add_argument(
+    "-hst", "--handshakeTimeout",
+    type=float,
+    required=False,
+    dest='handshake_timeout',
+    help=f'Seconds which new client has to send nickname ({HANDSHAKE_TIMEOUT} by default)'
+)
+parser.add_argument(
+    "-hsw", "--handshakeWorkers",
+    type=int,
+    required=False,
+    dest='handshake_workers',
+    help=f'Count of threads which receive nicknames of new clients, threading engine only '
+         f'({HANDSHAKE_WORKERS} by default)'
+)
+parser.add_argument(
+    "-ml", "--maxLength",
+    type=int,
+    required=False,
+    dest='max_length',
+    help='Drop messages which are longer than this count of characters (not limited by default)'
+)
+parser.add_argument(
+    "-bw", "--bannedWords",
+    type=str,
+    required=False,
+    dest='banned_words',
+    help='Path to text file with banned words, one per line. They are replaced with asterisks in messages'
+)
+parser.add_argument(
+    "-nl", "--noLinks",
+    type=str,
+    required=False,
+    choices=('replace', 'drop'),
+    dest='no_links',
+    help="Replace links in messages with placeholder or drop messages with links (links are allowed by default)"
+)
+parser.add_argument(
+    "-fw", "--filterWorkers",
+    type=int,
+    required=False,
+    dest='filter_workers',
+    help=f'Count of threads (or processes) which run message filters ({FILTER_WORKERS} by default)'
+)
+parser.add_argument(
+    "-fp", "--filterProcesses",
+    action='store_true',
+    dest='filter_processes',
+    help='Run message filters in processes instead of threads, ignored with several workers'
+)
+parser.add_argument(
+    "-cf", "--certFile",
+    type=str,
+    required=False,
+    dest='cert_file',
+    help='Path to PEM file with server certificate chain, clients connect over TLS if it is given '
+         '(plain TCP by default)'
+)
+parser.add_argument(
+    "-kf", "--keyFile",
+    type=str,
+    required=False,
+    dest='key_file',
+    help='Path to PEM file with private key of server certificate, if the key is not in certificate file'
+)
+parser.add_argument(
+    "-mp", "--metricsPort",
+    type=int,
+    required=False,
+    dest='metrics_port',
+    help='Port of local HTTP endpoint with metrics in Prometheus format, worker N uses port + N (disabled by default)'
+)
 
 
 def main(parser: argparse.ArgumentParser) -> None:
@@ -32,8 +244,46 @@ def main(parser: argparse.ArgumentParser) -> None:
     SERVER_IP = args.server_ip if args.server_ip else '127.0.0.1'
     SERVER_PORT = args.server_port if args.server_port else 8080
     MAX_USERS = args.max_users if args.max_users else 8
+    HIGH_WATER_MARK = args.high_water_mark if args.high_water_mark else OUTBOUND_HIGH_WATER_MARK
+    MAX_BUFFER_BYTES = args.max_buffer_bytes if args.max_buffer_bytes else OUTBOUND_MAX_BYTES
+    REPLAY_SIZE = args.history_size if args.history_size is not None else HISTORY_SIZE
+    RATE_LIMIT = args.rate_limit if args.rate_limit is not None else CLIENT_RATE_LIMIT
+    RATE_BURST = args.rate_burst if args.rate_burst else max(CLIENT_RATE_BURST, RATE_LIMIT)
+    GLOBAL_RATE = args.global_rate_limit if args.global_rate_limit is not None else GLOBAL_RATE_LIMIT
+    GLOBAL_BURST = args.global_rate_burst if args.global_rate_burst else max(GLOBAL_RATE_BURST, GLOBAL_RATE)
+    FLOOD_KICK = args.flood_kick if args.flood_kick is not None else FLOOD_KICK_THRESHOLD
+    HEARTBEAT = args.heartbeat_interval if args.heartbeat_interval else HEARTBEAT_INTERVAL
+    IDLE_TIMEOUT = args.heartbeat_timeout if args.heartbeat_timeout is not None else HEARTBEAT_TIMEOUT
+    DRAIN_TIMEOUT = args.shutdown_timeout if args.shutdown_timeout is not None else SHUTDOWN_TIMEOUT
+    BACKLOG = args.backlog if args.backlog else LISTEN_BACKLOG
+    NICKNAME_TIMEOUT = args.handshake_timeout if args.handshake_timeout else HANDSHAKE_TIMEOUT
+    NICKNAME_WORKERS = args.handshake_workers if args.handshake_workers else HANDSHAKE_WORKERS
+
+    filters: list[MessageFilter] = []
+    if args.max_length:
+        filters.append(LengthFilter(args.max_length))
+    if args.banned_words:
+        with open(args.banned_words, encoding='utf-8') as file:
+            filters.append(WordFilter(line.strip() for line in file))
+    if args.no_links:
+        filters.append(LinkFilter(drop=args.no_links == 'drop'))
 
-    server = Server(SERVER_IP, SERVER_PORT, max_connected_users=MAX_USERS)
+    server_kwargs = dict(
+        max_connected_users=MAX_USERS, max_connections_queue=BACKLOG,
+        outbound_high_water_mark=HIGH_WATER_MARK, outbound_max_bytes=MAX_BUFFER_BYTES,
+        disconnect_slow_clients=args.disconnect_slow, history_size=REPLAY_SIZE, history_path=args.history_file,
+        metrics_port=args.metrics_port, compression=not args.no_compression,
+        rate_limit=RATE_LIMIT, rate_burst=RATE_BURST, global_rate_limit=GLOBAL_RATE, global_rate_burst=GLOBAL_BURST,
+        flood_kick_threshold=FLOOD_KICK,
+        heartbeat_interval=HEARTBEAT, heartbeat_timeout=IDLE_TIMEOUT, shutdown_timeout=DRAIN_TIMEOUT,
+        handshake_timeout=NICKNAME_TIMEOUT, handshake_workers=NICKNAME_WORKERS, filters=filters,
+        filter_workers=args.filter_workers if args.filter_workers else FILTER_WORKERS,
+        filter_processes=args.filter_processes, certfile=args.cert_file, keyfile=args.key_file
+        )
+    if args.workers > 1:
+        server = WorkerPool(args.workers, WORKER_ENGINES[args.engine], SERVER_IP, SERVER_PORT, **server_kwargs)
+    else:
+        server = ENGINES[args.engine](SERVER_IP, SERVER_PORT, **server_kwargs)
     server.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape backslash, double quote and line feed as Prometheus text format requires"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """Class to count events. Value only grows.
+
+    Arguments:
+        name -- metric name in Prometheus format
+        description -- help text of metric
+        label (default 'None') -- name of label, if metric is split by some value (e.g. command name)
+    """
+    def __init__(self, name: str, description: str, label: str | None = None) -> None:
+        self.name = name
+        self.description = description
+        self._label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, label_value: str = '') -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def samples(self) -> list[tuple[str, float]]:
+        with self._lock:
+            values = dict(self._values) or {'': 0}
+        if self._label is None:
+            return [(self.name, values.get('', 0))]
+        return [
+            (f'{self.name}{{{self._label}="{_escape_label_value(value)}"}}', amount)
+            for value, amount in values.items() if value
+            ]
+
+    def render(self) -> list[str]:
+        return [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} counter',
+            *(f'{name} {value:g}' for name, value in self.samples())
+            ]
+
+
+class Gauge:
+    """Class to show current value which is computed on every read.
+
+    Arguments:
+        name -- metric name in Prometheus format
+        description -- help text of metric
+        function -- function which returns current value
+    """
+    def __init__(self, name: str, description: str, function: Callable[[], float]) -> None:
+        self.name = name
+        self.description = description
+        self.function = function
+
+    def samples(self) -> list[tuple[str, float]]:
+        return [(self.name, self.function())]
+
+    def render(self) -> list[str]:
+        return [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} gauge',
+            *(f'{name} {value:g}' for name, value in self.samples())
+            ]
+
+
+class Histogram:
+    """Class to collect distribution of values (e.g. latencies) in fixed buckets.
+
+    Arguments:
+        name -- metric name in Prometheus format
+        description -- help text of metric
+        buckets -- sorted upper bounds of buckets
+    """
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.description = description
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Return upper bound of bucket where fraction of observations lie"""
+        with self._lock:
+            counts = list(self._counts)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        position, cumulative = fraction * total, 0
+        for bound, count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += count
+            if cumulative >= position:
+                return bound
+        return float('inf')
+
+    def samples(self) -> list[tuple[str, float]]:
+        with self._lock:
+            counts, total_sum = list(self._counts), self._sum
+        samples, cumulative = [], 0
+        for bound, count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += count
+            samples.append((f'{self.name}_bucket{{le="{"+Inf" if bound == float("inf") else f"{bound:g}"}"}}', cumulative))
+        samples.append((f'{self.name}_sum', total_sum))
+        samples.append((f'{self.name}_count', cumulative))
+        return samples
+
+    def render(self) -> list[str]:
+        return [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} histogram',
+            *(f'{name} {value:g}' for name, value in self.samples())
+            ]
+
+
+class MetricsRegistry:
+    """Class to keep all metrics of server process.
+
+    Attributes:
+        metrics -- dict of metrics, metric name (key) corresponds to metric instance (value)
+    """
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def counter(self, name: str, description: str, label: str | None = None) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, description, label))
+
+    def gauge(self, name: str, description: str, function: Callable[[], float]) -> Gauge:
+        """Create gauge or replace function of existing one"""
+        if (gauge:=self._metrics.get(name)) is not None:
+            gauge.function = function
+            return gauge
+        return self._metrics.setdefault(name, Gauge(name, description, function))
+
+    def histogram(self, name: str, description: str, buckets: tuple[float, ...]) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, description, buckets))
+
+    def render_prometheus(self) -> str:
+        """Return all metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def render_text(self) -> str:
+        """Return all metrics in short human readable form"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Histogram):
+                lines.append(
+                    f'{metric.name}: p50 <= {metric.quantile(0.5):g}  p99 <= {metric.quantile(0.99):g}  '
+                    f'count {metric.samples()[-1][1]:g}'
+                    )
+                continue
+            lines.extend(f'{name}: {value:g}' for name, value in metric.samples())
+        return '\n'.join(lines)
+
+    def serve(self, ip: str, port: int) -> ThreadingHTTPServer:
+        """Start HTTP endpoint with metrics in Prometheus format in new thread"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        http_server = ThreadingHTTPServer((ip, port), MetricsHandler)
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        return http_server
+
+
+registry = MetricsRegistry()
+
+CONNECTIONS = registry.counter('chat_connections_total', 'Clients which were accepted')
+DECLINED_CONNECTIONS = registry.counter('chat_declined_connections_total', 'Connections which were declined')
+HANDSHAKE_TIMEOUTS = registry.counter('chat_handshake_timeouts_total', 'Clients which did not send nickname in time')
+TLS_HANDSHAKES = registry.counter(
+    'chat_tls_handshakes_total', 'Completed TLS handshakes, full or resumed from session ticket', label='kind'
+    )
+MESSAGES_IN = registry.counter('chat_messages_in_total', 'Messages received from clients')
+MESSAGES_OUT = registry.counter('chat_messages_out_total', 'Messages queued for clients')
+BYTES_IN = registry.counter('chat_bytes_in_total', 'Bytes received from clients')
+BYTES_OUT = registry.counter('chat_bytes_out_total', 'Bytes queued for clients')
+DROPPED_MESSAGES = registry.counter('chat_dropped_messages_total', 'Messages dropped because client was too slow')
+RATE_LIMITED_MESSAGES = registry.counter('chat_rate_limited_messages_total', 'Messages dropped by rate limits')
+FLOOD_KICKS = registry.counter('chat_flood_kicks_total', 'Clients kicked for flooding')
+COMMANDS = registry.counter('chat_commands_total', 'Executed commands', label='command')
+COMMAND_SECONDS = registry.counter('chat_command_seconds_total', 'Time spent executing commands', label='command')
+FILTER_MESSAGES = registry.counter('chat_filter_messages_total', 'Messages passed to filter stage', label='stage')
+FILTER_SECONDS = registry.counter('chat_filter_seconds_total', 'Time spent in filter stage', label='stage')
+FILTER_DROPPED = registry.counter('chat_filter_dropped_total', 'Messages dropped by filter stage', label='stage')
+FILTER_ERRORS = registry.counter(
+    'chat_filter_errors_total', 'Messages dropped because filter stage failed', label='stage'
+    )
+DISPATCH_ERRORS = registry.counter('chat_dispatch_errors_total', 'Messages dropped because processing failed')
+DIRECT_MESSAGES = registry.counter('chat_direct_messages_total', 'Direct messages sent with /msg')
+IDLE_EVICTIONS = registry.counter('chat_idle_evictions_total', 'Clients disconnected for not answering pings')
+# Failed sends of every client are shown by /buffers, label per nickname would grow with every client
+SEND_ERRORS = registry.counter('chat_send_errors_total', 'Failed sends to all clients')
+COMPRESSION_SAVED_BYTES = registry.counter(
+    'chat_compression_saved_bytes_total', 'Bytes which were not sent to clients thanks to compression'
+    )
+COMPRESSION_SECONDS = registry.counter('chat_compression_seconds_total', 'Time spent compressing frames')
+DISPATCH_LATENCY = registry.histogram(
+    'chat_dispatch_latency_seconds', 'Time from message receiving to the end of its dispatching',
+    (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+    )
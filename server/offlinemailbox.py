@@ -0,0 +1,73 @@
+import collections
+import threading
+
+
+class OfflineMailbox:
+    """Class to keep direct messages for clients which are offline until their next login.
+       All methods are thread-safe.
+
+    Arguments:
+        max_messages -- count of messages kept for one client, older messages are dropped
+        max_recipients -- count of clients which messages are kept for, mailbox which was filled first is dropped
+        max_bytes -- size in bytes of messages kept for one client, older messages are dropped.
+                Must not be greater than max_total_bytes
+        max_total_bytes -- size in bytes of messages kept for all clients, mailbox which was filled first is dropped
+
+    Attributes:
+        mailboxes -- dict of mailboxes, nickname (key) corresponds to collections.deque of messages 
+                with their sizes in bytes (value). Keeps mailboxes in order of creation
+        sizes -- dict of mailbox sizes in bytes, nickname (key) corresponds to size (value)
+        total_bytes -- size in bytes of all kept messages
+        lock -- threading.Lock which guards mailboxes dict
+    """
+    def __init__(self, max_messages: int, max_recipients: int, max_bytes: int, max_total_bytes: int) -> None:
+        self._max_messages = max_messages
+        self._max_recipients = max_recipients
+        self._max_bytes = max_bytes
+        self._max_total_bytes = max_total_bytes
+        self._mailboxes: dict[str, collections.deque[tuple[str, int]]] = {}
+        self._sizes: dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def store(self, nickname: str, text: str) -> None:
+        """Keep message for client until it logs in. Message larger than max_bytes is dropped"""
+        if (size:=len(text.encode())) > self._max_bytes:
+            return
+        with self._lock:
+            if (mailbox:=self._mailboxes.get(nickname)) is None:
+                if len(self._mailboxes) >= self._max_recipients:
+                    self._drop_mailbox(next(iter(self._mailboxes)))
+                mailbox = self._mailboxes[nickname] = collections.deque()
+                self._sizes[nickname] = 0
+            mailbox.append((text, size))
+            self._sizes[nickname] += size
+            self._total_bytes += size
+            while len(mailbox) > self._max_messages or self._sizes[nickname] > self._max_bytes:
+                _, dropped = mailbox.popleft()
+                self._sizes[nickname] -= dropped
+                self._total_bytes -= dropped
+            while self._total_bytes > self._max_total_bytes:
+                # Mailbox of this client is never the first to go, it fits in max_bytes itself
+                self._drop_mailbox(next(name for name in self._mailboxes if name != nickname))
+
+    def _drop_mailbox(self, nickname: str) -> list[str]:
+        """Remove mailbox of client and return its messages"""
+        self._total_bytes -= self._sizes.pop(nickname)
+        return [text for text, _ in self._mailboxes.pop(nickname)]
+
+    def take(self, nickname: str) -> list[str]:
+        """Remove and return all messages kept for client"""
+        with self._lock:
+            if nickname not in self._mailboxes:
+                return []
+            return self._drop_mailbox(nickname)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(mailbox) for mailbox in self._mailboxes.values())
@@ -0,0 +1,231 @@
+import collections
+import selectors
+import socket
+import threading
+import time
+from typing import NamedTuple
+
+
+class OutboundStats(NamedTuple):
+    """Snapshot of OutboundQueue counters.
+
+    Attributes:
+        queued_messages -- count of frames waiting to be sent
+        queued_bytes -- size of frames waiting to be sent
+        dropped_messages -- count of frames dropped because queue was full
+        dropped_bytes -- size of frames dropped because queue was full
+        flushed_messages -- count of frames which waited in queue and were sent
+        avg_flush_latency -- average time (seconds) frame waited in queue before it was sent
+        max_flush_latency -- max time (seconds) frame waited in queue before it was sent
+        send_errors -- count of sends to client which failed with connection error
+    """
+    queued_messages: int = 0
+    queued_bytes: int = 0
+    dropped_messages: int = 0
+    dropped_bytes: int = 0
+    flushed_messages: int = 0
+    avg_flush_latency: float = 0.0
+    max_flush_latency: float = 0.0
+    send_errors: int = 0
+
+    def __add__(self, other: 'OutboundStats') -> 'OutboundStats':
+        flushed = self.flushed_messages + other.flushed_messages
+        avg_latency = (
+            self.avg_flush_latency * self.flushed_messages + other.avg_flush_latency * other.flushed_messages
+            ) / flushed if flushed else 0.0
+        return OutboundStats(
+            self.queued_messages + other.queued_messages,
+            self.queued_bytes + other.queued_bytes,
+            self.dropped_messages + other.dropped_messages,
+            self.dropped_bytes + other.dropped_bytes,
+            flushed,
+            avg_latency,
+            max(self.max_flush_latency, other.max_flush_latency),
+            self.send_errors + other.send_errors
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"queued {self.queued_messages} msgs / {self.queued_bytes} B, "
+            f"dropped {self.dropped_messages} msgs / {self.dropped_bytes} B, "
+            f"flush latency avg {self.avg_flush_latency * 1000:.2f} ms max {self.max_flush_latency * 1000:.2f} ms, "
+            f"send errors {self.send_errors}"
+            )
+
+
+class OutboundQueue:
+    """Class to keep encoded frames which are waiting to be sent to one client.
+       Not thread-safe, owner is responsible for locking.
+
+    Arguments:
+        high_water_mark -- max count of frames which may wait to be sent
+        max_bytes -- max size of frames which may wait to be sent
+
+    Attributes:
+        frames -- collections.deque of encoded frames (bytes) shared between clients. 
+                Rest of frame which was partly sent is kept as memoryview
+        queued_at -- collections.deque of time.monotonic() values, when each frame was queued
+        size -- size of queued frames in bytes
+        closed -- 'True' if queue was closed and will not accept new frames
+    """
+    def __init__(self, high_water_mark: int, max_bytes: int) -> None:
+        self._high_water_mark = high_water_mark
+        self._max_bytes = max_bytes
+        self._frames: collections.deque[bytes | memoryview] = collections.deque()
+        self._queued_at: collections.deque[float] = collections.deque()
+        self.size = 0
+        self.closed = False
+
+        self._dropped_messages = 0
+        self._dropped_bytes = 0
+        self._flushed_messages = 0
+        self._flush_latency_total = 0.0
+        self._max_flush_latency = 0.0
+        self._send_errors = 0
+
+    def put(self, frame: bytes | memoryview, force: bool = False) -> bool:
+        """Add frame to the queue. Return 'False' if queue is full or closed.
+           Forced frame is queued over the limits, e.g. rest of frame whose beginning was sent already
+        """
+        if self.closed:
+            return False
+        if not force and (len(self._frames) >= self._high_water_mark or self.size + len(frame) > self._max_bytes):
+            self._dropped_messages += 1
+            self._dropped_bytes += len(frame)
+            return False
+        self._frames.append(frame)
+        self._queued_at.append(time.monotonic())
+        self.size += len(frame)
+        return True
+
+    def peek(self, max_size: int = 64 * 1024) -> bytes:
+        """Return first frames joined in one chunk of at most max_size bytes (but at least one frame)"""
+        if len(self._frames) == 1 or len(self._frames[0]) >= max_size:
+            return self._frames[0]
+        chunk, size = [], 0
+        for frame in self._frames:
+            if chunk and size + len(frame) > max_size:
+                break
+            chunk.append(frame)
+            size += len(frame)
+        return b''.join(chunk)
+
+    def partial_frame(self) -> bytes:
+        """Return rest of the first frame if its beginning was sent already, otherwise empty bytes"""
+        if self._frames and isinstance(self._frames[0], memoryview):
+            return bytes(self._frames[0])
+        return b''
+
+    def consume(self, size: int) -> None:
+        """Remove size bytes which were sent from the beginning of the queue"""
+        self.size -= size
+        while size:
+            frame = self._frames[0]
+            if len(frame) > size:
+                self._frames[0] = memoryview(frame)[size:]
+                return
+            size -= len(frame)
+            self._frames.popleft()
+            self._frame_flushed(self._queued_at.popleft())
+
+    def _frame_flushed(self, queued_at: float) -> None:
+        latency = time.monotonic() - queued_at
+        self._flushed_messages += 1
+        self._flush_latency_total += latency
+        if latency > self._max_flush_latency:
+            self._max_flush_latency = latency
+
+    def stats(self) -> OutboundStats:
+        """Return snapshot of queue counters"""
+        return OutboundStats(
+            len(self._frames),
+            self.size,
+            self._dropped_messages,
+            self._dropped_bytes,
+            self._flushed_messages,
+            self._flush_latency_total / self._flushed_messages if self._flushed_messages else 0.0,
+            self._max_flush_latency,
+            self._send_errors
+            )
+
+    def send_failed(self) -> None:
+        """Count failed send to client"""
+        self._send_errors += 1
+
+    def close(self) -> None:
+        """Stop accepting new frames and drop queued ones"""
+        self.closed = True
+        self._frames.clear()
+        self._queued_at.clear()
+        self.size = 0
+
+    @property
+    def free_bytes(self) -> int:
+        """Size of frame which queue would accept now"""
+        if self.closed or len(self._frames) >= self._high_water_mark:
+            return 0
+        return max(self._max_bytes - self.size, 0)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class OutboundFlusher:
+    """Class to send queued frames of all clients from one thread when their sockets become writable.
+       Clients try to send frames directly and ask flusher to watch them only if socket buffer is full.
+
+    Attributes:
+        selector -- selectors.DefaultSelector which waits for writable client sockets
+        pending -- clients which should be watched, added from other threads
+        wakeup_reader, wakeup_writer -- socket pair to wake up flusher when new client is pending
+    """
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._pending = collections.deque()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+
+    def watch(self, client) -> None:
+        """Flush client's outbound queue as soon as its socket is writable"""
+        self._pending.append(client)
+        try:
+            self._wakeup_writer.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def start(self) -> None:
+        """Start flusher in new thread"""
+        thread = threading.Thread(target=self._flusher_handler, daemon=True)
+        thread.start()
+
+    def _register_pending(self) -> None:
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._pending:
+            client = self._pending.popleft()
+            # Socket may be watched already or its descriptor may be reused after disconnect
+            self._unregister(client)
+            try:
+                self._selector.register(client.connection, selectors.EVENT_WRITE, client)
+            except (ValueError, OSError):
+                continue
+
+    def _unregister(self, client) -> None:
+        try:
+            self._selector.unregister(client.connection)
+        except (KeyError, ValueError, OSError):
+            pass
+
+    def _flusher_handler(self) -> None:
+        """Wait for writable sockets and flush their clients"""
+        while True:
+            for key, _ in self._selector.select():
+                if key.fileobj is self._wakeup_reader:
+                    self._register_pending()
+                elif key.data.flush():
+                    self._unregister(key.data)
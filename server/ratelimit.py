@@ -0,0 +1,111 @@
+import threading
+import time
+
+from settings import (
+    CLIENT_RATE_BURST, CLIENT_RATE_LIMIT, FLOOD_KICK_THRESHOLD, FLOOD_WINDOW, GLOBAL_RATE_BURST, GLOBAL_RATE_LIMIT
+    )
+
+
+class TokenBucket:
+    """Class to limit rate of events. Not thread-safe, owner is responsible for locking.
+       Bucket is refilled with 'rate' tokens per second up to 'burst' tokens, every event takes one token.
+
+    Arguments:
+        rate -- tokens added per second
+        burst -- max count of tokens in bucket
+    """
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def consume(self, amount: float = 1) -> bool:
+        """Take tokens from bucket. Return 'False' if there are not enough tokens"""
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < amount:
+            return False
+        self._tokens -= amount
+        return True
+
+
+class RateLimiter:
+    """Class to keep rate limits of server. Creates limit for every client and keeps global budget shared by them.
+
+    Arguments:
+        rate (default CLIENT_RATE_LIMIT) -- messages per second of one client, 0 disables the limit
+        burst (default CLIENT_RATE_BURST) -- messages which one client may send at once
+        global_rate (default GLOBAL_RATE_LIMIT) -- messages per second of all clients, 0 disables the limit
+        global_burst (default GLOBAL_RATE_BURST) -- messages which all clients may send at once
+        kick_threshold (default FLOOD_KICK_THRESHOLD) -- dropped messages during flood_window 
+                after which client is considered flooding, 0 disables it
+        flood_window (default FLOOD_WINDOW) -- seconds during which dropped messages are counted
+
+    Attributes:
+        global_bucket -- TokenBucket shared by all clients, 'None' if global limit is disabled
+        global_lock -- threading.Lock which guards global_bucket
+    """
+    def __init__(
+        self, rate: float = CLIENT_RATE_LIMIT, burst: float = CLIENT_RATE_BURST,
+        global_rate: float = GLOBAL_RATE_LIMIT, global_burst: float = GLOBAL_RATE_BURST,
+        kick_threshold: int = FLOOD_KICK_THRESHOLD, flood_window: float = FLOOD_WINDOW
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.kick_threshold = kick_threshold
+        self.flood_window = flood_window
+        self._global_bucket = TokenBucket(global_rate, global_burst) if global_rate else None
+        self._global_lock = threading.Lock()
+
+    def client_limit(self) -> 'ClientRateLimit | None':
+        """Create limit for a new client. Return 'None' if there are no limits at all"""
+        if not self.rate and self._global_bucket is None:
+            return
+        return ClientRateLimit(self)
+
+    def consume_global(self) -> bool:
+        if self._global_bucket is None:
+            return True
+        with self._global_lock:
+            return self._global_bucket.consume()
+
+
+class ClientRateLimit:
+    """Class to limit messages of one client. Used only by thread (or task) which receives client's messages.
+
+    Arguments:
+        limiter -- RateLimiter of server
+
+    Attributes:
+        bucket -- TokenBucket of client, 'None' if per-client limit is disabled
+        dropped -- count of messages dropped during current flood window
+        window_started -- time.monotonic() value when current flood window started
+        limited -- 'True' if the last message was dropped. Client is notified only when it becomes limited
+    """
+    def __init__(self, limiter: RateLimiter) -> None:
+        self._limiter = limiter
+        self._bucket = TokenBucket(limiter.rate, limiter.burst) if limiter.rate else None
+        self._dropped = 0
+        self._window_started = time.monotonic()
+        self.limited = False
+
+    def allow(self) -> bool:
+        """Take tokens for one message. Return 'False' if message must be dropped.
+           Only messages dropped by client's own limit are counted, exhausted global budget is not client's fault
+        """
+        if self._bucket is not None and not self._bucket.consume():
+            now = time.monotonic()
+            if now - self._window_started > self._limiter.flood_window:
+                self._window_started, self._dropped = now, 0
+            self._dropped += 1
+            self.limited = True
+            return False
+        self.limited = not self._limiter.consume_global()
+        return not self.limited
+
+    @property
+    def flooding(self) -> bool:
+        """'True' if client reached kick threshold during current flood window"""
+        return bool(self._limiter.kick_threshold) and self._dropped >= self._limiter.kick_threshold
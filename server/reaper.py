@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from clientdata import ClientData
+
+
+T = TypeVar('T')
+
+
+class TimerWheel(Generic[T]):
+    """Class to schedule many timers with O(1) cost of scheduling and expiring. Not thread-safe.
+       Time is split into ticks, every slot of the wheel keeps items which expire when wheel passes it.
+       Items scheduled further than one wheel turn wait for the required count of turns.
+
+    Arguments:
+        tick -- seconds between slots
+        slots -- count of slots in the wheel
+
+    Attributes:
+        slots -- list of slots, every slot is a list of pairs of remaining turns and item
+        current -- index of slot which was passed last
+        time -- time.monotonic() value when current slot was passed
+    """
+    def __init__(self, tick: float, slots: int) -> None:
+        self._tick = tick
+        self._slots: list[list[tuple[int, T]]] = [[] for _ in range(slots)]
+        self._current = 0
+        self._time = time.monotonic()
+
+    def schedule(self, item: T, delay: float) -> None:
+        """Add item which expires after delay (rounded up to ticks)"""
+        ticks = max(1, math.ceil(delay / self._tick))
+        turns = (ticks - 1) // len(self._slots)
+        self._slots[(self._current + ticks) % len(self._slots)].append((turns, item))
+
+    def advance(self, now: float) -> list[T]:
+        """Pass all slots up to now. Return expired items"""
+        expired = []
+        while self._time + self._tick <= now:
+            self._time += self._tick
+            self._current = (self._current + 1) % len(self._slots)
+            waiting = []
+            for turns, item in self._slots[self._current]:
+                if turns:
+                    waiting.append((turns - 1, item))
+                else:
+                    expired.append(item)
+            self._slots[self._current] = waiting
+        return expired
+
+
+class IdleReaper:
+    """Class to detect dead clients. Client which sent nothing for 'interval' seconds is pinged,
+       client which sent nothing (not even pong) for 'timeout' seconds is evicted.
+       Clients are checked only when their timer expires, so receiving data costs one timestamp update.
+
+    Arguments:
+        interval -- seconds of client's silence after which it is pinged
+        timeout -- seconds of client's silence after which it is evicted, 0 disables reaper
+        on_idle -- function which is called with ClientData instance which must be evicted
+        tick (default 1.0) -- precision of timers in seconds
+
+    Attributes:
+        wheel -- TimerWheel of watched clients
+        lock -- threading.Lock which guards wheel
+        stopped -- threading.Event which stops reaper thread
+    """
+    def __init__(
+        self, interval: float, timeout: float, on_idle: Callable[[ClientData], None], tick: float = 1.0
+    ) -> None:
+        self._interval = interval
+        self._timeout = timeout
+        self._on_idle = on_idle
+        self._tick = tick
+        self._wheel: TimerWheel[ClientData] = TimerWheel(tick, max(1, math.ceil(timeout / tick)))
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def watch(self, client: ClientData) -> None:
+        """Start watching accepted client"""
+        if not self._timeout:
+            return
+        with self._lock:
+            self._wheel.schedule(client, self._interval)
+
+    def start(self) -> None:
+        """Start reaper in new thread"""
+        if not self._timeout:
+            return
+        thread = threading.Thread(target=self._reaper_handler, daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        """Stop reaper thread"""
+        self._stopped.set()
+
+    def _reaper_handler(self) -> None:
+        """Every tick check clients whose timers expired"""
+        while not self._stopped.wait(self._tick):
+            now = time.monotonic()
+            with self._lock:
+                expired = self._wheel.advance(now)
+            for client in expired:
+                self._check(client, now)
+
+    def _check(self, client: ClientData, now: float) -> None:
+        """Evict, ping or reschedule client whose timer expired"""
+        if client.closed:
+            return
+        silence = now - client.last_activity
+        if silence >= self._timeout:
+            self._on_idle(client)
+            return
+        if silence >= self._interval:
+            client.ping()
+            delay = self._timeout - silence
+        else:
+            delay = self._interval - silence
+        with self._lock:
+            self._wheel.schedule(client, delay)
@@ -0,0 +1,70 @@
+import threading
+
+from clientdata import ClientData
+
+
+class RoomRegistry:
+    """Class to keep chat rooms and clients subscribed to them.
+       All methods are thread-safe.
+
+    Attributes:
+        rooms -- dict of rooms, room name (key) corresponds to set of subscribed ClientData instances (value)
+        memberships -- dict of subscriptions, ClientData instance (key) corresponds to set of room names (value)
+        snapshots -- cached tuples of subscribers for delivery, rebuilt only after room was changed
+        lock -- threading.Lock which guards rooms dict
+    """
+    def __init__(self) -> None:
+        self._rooms: dict[str, set[ClientData]] = {}
+        self._memberships: dict[ClientData, set[str]] = {}
+        self._snapshots: dict[str, tuple[ClientData, ...]] = {}
+        self._lock = threading.Lock()
+
+    def join(self, room: str, client: ClientData) -> bool:
+        """Subscribe client to room. Return 'False' if client is subscribed already"""
+        with self._lock:
+            subscribers = self._rooms.setdefault(room, set())
+            if client in subscribers:
+                return False
+            subscribers.add(client)
+            self._memberships.setdefault(client, set()).add(room)
+            self._snapshots.pop(room, None)
+            return True
+
+    def leave(self, room: str, client: ClientData) -> bool:
+        """Unsubscribe client from room. Return 'False' if client was not subscribed"""
+        with self._lock:
+            if room not in self._memberships.get(client, ()):
+                return False
+            self._memberships[client].remove(room)
+            if not self._memberships[client]:
+                del self._memberships[client]
+            self._remove_subscriber(room, client)
+            return True
+
+    def leave_all(self, client: ClientData) -> None:
+        """Unsubscribe client from every room"""
+        with self._lock:
+            for room in self._memberships.pop(client, ()):
+                self._remove_subscriber(room, client)
+
+    def _remove_subscriber(self, room: str, client: ClientData) -> None:
+        subscribers = self._rooms[room]
+        subscribers.remove(client)
+        if not subscribers:
+            del self._rooms[room]
+        self._snapshots.pop(room, None)
+
+    def subscribers(self, room: str) -> tuple[ClientData, ...]:
+        """Return tuple of room subscribers which is safe to iterate while room changes.
+           Snapshot is cached only for existing room, so names of deleted rooms are not kept
+        """
+        if (snapshot:=self._snapshots.get(room)) is None:
+            with self._lock:
+                if (subscribers:=self._rooms.get(room)) is None:
+                    return ()
+                snapshot = self._snapshots[room] = tuple(subscribers)
+        return snapshot
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._rooms)
@@ -1,8 +1,37 @@
+import itertools
+import queue
+import selectors
+import signal
 import socket
+import ssl
+import sys
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
 
-from clientdata import ClientData, Message
-from admintools import AdminTools, ServerAdminTools
+from clientdata import ClientData, Message, valid_nickname
+from common.protocol import COMPRESSION_THRESHOLD, FrameType, disable_nagle, encode_frame, encode_sequenced_frame
+from admintools import DirectMessageTools, RoomTools, ServerAdminTools
+from clientregistry import ClientRegistry
+from commands import AdminCommandResult, CommandRegistry, Permission, command
+from filters import FilterPipeline, MessageFilter
+from history import MessageHistory
+from offlinemailbox import OfflineMailbox
+from metrics import (
+    BYTES_OUT, COMPRESSION_SAVED_BYTES, CONNECTIONS, DECLINED_CONNECTIONS, DIRECT_MESSAGES, DISPATCH_ERRORS,
+    DISPATCH_LATENCY, FLOOD_KICKS, HANDSHAKE_TIMEOUTS, IDLE_EVICTIONS, MESSAGES_OUT, TLS_HANDSHAKES, registry
+    )
+from outbound import OutboundFlusher, OutboundStats
+from ratelimit import RateLimiter
+from reaper import IdleReaper
+from rooms import RoomRegistry
+from settings import (
+    CLIENT_RATE_BURST, CLIENT_RATE_LIMIT, DEFAULT_ROOM, FILTER_WORKERS, FLOOD_KICK_THRESHOLD, GLOBAL_RATE_BURST,
+    GLOBAL_RATE_LIMIT, HANDSHAKE_TIMEOUT, HANDSHAKE_WORKERS, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HISTORY_SIZE,
+    LISTEN_BACKLOG, OFFLINE_MAILBOX_MAX_BYTES, OFFLINE_MAX_BYTES, OFFLINE_MESSAGES_LIMIT, OFFLINE_RECIPIENTS_LIMIT,
+    OUTBOUND_HIGH_WATER_MARK, OUTBOUND_MAX_BYTES, SHUTDOWN_QUIET_PERIOD, SHUTDOWN_TIMEOUT
+    )
 
 
 class Server:
@@ -12,43 +41,188 @@ class Server:
         ip -- Internet Protocol address for connecting clients
         port -- port for receiving data from clients
         max_connected_users (default 8) -- max clients which server will handle
-        max_connections_queue (default 1) -- specifies the number of unaccepted connections 
+        max_connections_queue (default LISTEN_BACKLOG) -- specifies the number of unaccepted connections 
                 that the system will allow before refusing new connections
+        outbound_high_water_mark (default OUTBOUND_HIGH_WATER_MARK) -- max count of messages 
+                waiting to be sent to one client
+        outbound_max_bytes (default OUTBOUND_MAX_BYTES) -- max size of messages 
+                waiting to be sent to one client
+        disconnect_slow_clients (default 'False') -- disconnect clients which reached outbound limits,
+                otherwise new messages for them are dropped
+        history_size (default HISTORY_SIZE) -- count of last messages which are replayed to a new client
+        history_path (default 'None') -- path to sqlite file where all messages are logged. 
+                History is kept only in memory if 'None'
+        history_readonly (default 'False') -- only load last messages from history_path, 
+                another process writes the log
+        metrics_port (default 'None') -- port of local HTTP endpoint with metrics in Prometheus format.
+                Endpoint is not started if 'None'
+        compression (default 'True') -- compress large messages for clients which support it
+        rate_limit (default CLIENT_RATE_LIMIT) -- messages per second which one client may send, 0 disables the limit
+        rate_burst (default CLIENT_RATE_BURST) -- messages which one client may send at once
+        global_rate_limit (default GLOBAL_RATE_LIMIT) -- messages per second which all clients may send,
+                0 disables the limit
+        global_rate_burst (default GLOBAL_RATE_BURST) -- messages which all clients may send at once
+        flood_kick_threshold (default FLOOD_KICK_THRESHOLD) -- count of messages dropped during FLOOD_WINDOW
+                after which client is kicked, 0 disables kicking
+        heartbeat_interval (default HEARTBEAT_INTERVAL) -- seconds of client's silence after which it is pinged
+        heartbeat_timeout (default HEARTBEAT_TIMEOUT) -- seconds of client's silence after which it is disconnected,
+                0 disables disconnecting
+        shutdown_timeout (default SHUTDOWN_TIMEOUT) -- seconds which server waits on shutdown 
+                for queued messages to be sent to clients
+        handshake_timeout (default HANDSHAKE_TIMEOUT) -- seconds which new client has to send nickname
+        handshake_workers (default HANDSHAKE_WORKERS) -- count of threads which receive nicknames of new clients,
+                so accepting connections never waits for a slow client
+        filters (default 'None') -- ordered list of MessageFilter stages which every message passes before dispatching
+        filter_workers (default FILTER_WORKERS) -- count of threads (or processes) which run filters
+        filter_processes (default 'False') -- run filters in process pool instead of threads
+        certfile (default 'None') -- path to PEM file with server certificate chain. Clients connect over TLS if given
+        keyfile (default 'None') -- path to PEM file with private key, if it is not in certfile
 
     Attributes:
         server_socket -- socket.socket instance with socket.AF_INET, socket.SOCK_STREAM init arguments.
                 AF_INET - Internet Protocol version 4 (IPv4)
                 SOCK_STREAM - Transmission Control Protocol (TCP)
-        clients -- list of active connected clients to server
+        clients -- ClientRegistry of active connected clients to server
+        rooms -- RoomRegistry of chat rooms. Every message is delivered only to subscribers of its room
+        sequence -- counter of room messages. Starts from server start time in microseconds, 
+                so sequence numbers keep growing after restart and clients can resume from them.
+                In workers mode messages are numbered by WorkerPool instead
+        delivery_lock -- threading.Lock which is held while room message is sent and saved to history
+                and while client joins room and gets its history, so joining client gets every message once
+        messages_queue -- queue.Queue of Message instances shared by all clients.
+                Dispatcher thread blocks on it and wakes up only when new message arrives
+        ssl_context -- ssl.SSLContext of server, 'None' if TLS is disabled
+        pipeline -- FilterPipeline instance. Clients put their messages to it, 
+                it puts them to messages_queue after filters
+        flusher -- OutboundFlusher instance. Sends messages to clients whose sockets were not writable
+        history -- MessageHistory instance. Keeps last messages for new clients and logs all messages
+        rate_limiter -- RateLimiter instance. Creates rate limit for every new client
+        reaper -- IdleReaper instance. Pings silent clients and disconnects dead ones
         max_connected_users -- max clients which server can handle
-        admintools -- AdminTools instance with 'clients' init argument.
-                Execute client's commands (if client is admin)
+        commands -- CommandRegistry of all commands of clients and terminal: 
+                admin commands, room commands, direct messages and terminal-only commands
+        admintools -- ServerAdminTools instance. Its commands are registered in commands
+        mailbox -- OfflineMailbox of direct messages for clients which are offline
         terminal -- Terminal instance with 'clients' init argument.
                 Create interactive terminal which handle commands/messages from server side
+        metrics_port -- port of local HTTP endpoint with metrics
+        stopping -- threading.Event which is set when server was asked to shut down
+        handshakes -- ThreadPoolExecutor which receives nicknames and verifies new clients
+        messages_checker -- dispatcher thread. Server waits for it to process all received messages on shutdown
 
     """
     def __init__(
-        self, ip: str, port: int, max_connected_users: int=8, max_connections_queue: int = 1
+        self, ip: str, port: int, max_connected_users: int=8, max_connections_queue: int = LISTEN_BACKLOG,
+        outbound_high_water_mark: int = OUTBOUND_HIGH_WATER_MARK, outbound_max_bytes: int = OUTBOUND_MAX_BYTES,
+        disconnect_slow_clients: bool = False, history_size: int = HISTORY_SIZE, history_path: str | None = None,
+        history_readonly: bool = False, metrics_port: int | None = None, compression: bool = True,
+        rate_limit: float = CLIENT_RATE_LIMIT, rate_burst: float = CLIENT_RATE_BURST,
+        global_rate_limit: float = GLOBAL_RATE_LIMIT, global_rate_burst: float = GLOBAL_RATE_BURST,
+        flood_kick_threshold: int = FLOOD_KICK_THRESHOLD,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL, heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        shutdown_timeout: float = SHUTDOWN_TIMEOUT, handshake_timeout: float = HANDSHAKE_TIMEOUT,
+        handshake_workers: int = HANDSHAKE_WORKERS, filters: list[MessageFilter] | None = None,
+        filter_workers: int = FILTER_WORKERS, filter_processes: bool = False,
+        certfile: str | None = None, keyfile: str | None = None
     ) -> None:
         
-        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._server_socket.bind((ip, port))
-        self._server_socket.listen(max_connections_queue)
+        self._server_socket = self._create_server_socket(ip, port, max_connections_queue)
+        self._ssl_context = self._create_ssl_context(certfile, keyfile)
+        self._listen_backlog = max_connections_queue
 
-        self._clients: list[ClientData] = []
+        self._clients = ClientRegistry()
+        self._rooms = RoomRegistry()
+        self._sequence = itertools.count(time.time_ns() // 1000)
+        self._delivery_lock = threading.Lock()
+        self._messages_queue: queue.Queue[Message] = queue.Queue()
+        self._flusher = OutboundFlusher()
+        self._history = MessageHistory(history_size, history_path, readonly=history_readonly)
         self._max_connected_users = max_connected_users
-        self._admintools = AdminTools(self._clients)
-        self._terminal = Terminal(self._clients)
+        self._outbound_high_water_mark = outbound_high_water_mark
+        self._outbound_max_bytes = outbound_max_bytes
+        self._disconnect_slow_clients = disconnect_slow_clients
+        self._compression = compression
+        self._rate_limiter = RateLimiter(
+            rate_limit, rate_burst, global_rate_limit, global_rate_burst, flood_kick_threshold
+            )
+        self._reaper = IdleReaper(heartbeat_interval, heartbeat_timeout, on_idle=self._evict_idle_client)
+        self._commands = CommandRegistry(self._clients)
+        self._admintools = ServerAdminTools(remove=self._remove_client)
+        self._commands.register(self._admintools)
+        self._commands.register(RoomTools(self._rooms, join=self._join_room))
+        self._commands.register(DirectMessageTools(send=self._send_direct_message))
+        self._pipeline = FilterPipeline(
+            filters or [], self._messages_queue, filter_workers, filter_processes,
+            split_command=self._commands.split_filtered
+            )
+        self._mailbox = OfflineMailbox(
+            OFFLINE_MESSAGES_LIMIT, OFFLINE_RECIPIENTS_LIMIT, OFFLINE_MAILBOX_MAX_BYTES, OFFLINE_MAX_BYTES
+            )
+        self._terminal = Terminal(self._clients, self._commands, on_shutdown=self.shutdown)
+        self._metrics_port = metrics_port
+        self._shutdown_timeout = shutdown_timeout
+        self._stopping = threading.Event()
+        self._messages_checker: threading.Thread | None = None
+        self._handshake_timeout = handshake_timeout
+        self._handshakes = ThreadPoolExecutor(handshake_workers, thread_name_prefix='handshake')
+        self._register_gauges()
     
+    def _create_server_socket(self, ip: str, port: int, max_connections_queue: int) -> socket.socket:
+        """Create socket which listens for new connections"""
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.bind((ip, port))
+        server_socket.listen(max_connections_queue)
+        return server_socket
+
+    def _create_ssl_context(self, certfile: str | None, keyfile: str | None) -> ssl.SSLContext | None:
+        """Create TLS context of server if certificate is given. Server issues session tickets, 
+           so reconnecting client resumes its session and skips full handshake
+        """
+        if certfile is None:
+            return
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.load_cert_chain(certfile, keyfile)
+        # On shutdown server stops receiving, but keeps sending over TLS. Without this option
+        # end of stream without close_notify would be fatal error of connection
+        context.options |= ssl.OP_IGNORE_UNEXPECTED_EOF
+        return context
+
     # ----------------------------- # 
     #  Client's connection methods  #
     # ----------------------------- #
-    def _create_new_client(self, connection: socket.socket) -> None:
+    def _handshake(self, connection: socket.socket, deadline: float) -> None:
+        """Receive nickname and verify new client in handshake worker thread"""
+        try:
+            if self._ssl_context is not None:
+                connection = self._accept_tls(connection, deadline)
+            self._create_new_client(connection, deadline)
+        except OSError:
+            connection.close()
+
+    def _accept_tls(self, connection: socket.socket, deadline: float) -> ssl.SSLSocket:
+        """Do TLS handshake with new client. It has to fit in handshake deadline together with nickname"""
+        disable_nagle(connection)
+        connection.settimeout(max(deadline - time.monotonic(), 0.001))
+        try:
+            connection = self._ssl_context.wrap_socket(connection, server_side=True)
+        except TimeoutError:
+            HANDSHAKE_TIMEOUTS.inc()
+            raise
+        TLS_HANDSHAKES.inc(label_value='resumed' if connection.session_reused else 'full')
+        return connection
+
+    def _create_new_client(self, connection: socket.socket, deadline: float) -> None:
         """Create new ClientData instance if server is not full"""
         if self._max_clients_count_riched(connection):
             return
 
-        client = ClientData(connection)
+        client = ClientData(
+            connection, self._pipeline, self._flusher,
+            self._outbound_high_water_mark, self._outbound_max_bytes, self._disconnect_slow_clients,
+            on_disconnect=self._remove_client, allow_compression=self._compression,
+            rate_limit=self._rate_limiter.client_limit(), on_flood=self._kick_flooder, handshake_deadline=deadline
+            )
         self._verify_client(client)
 
     def _max_clients_count_riched(self, connection: socket.socket) -> bool:
@@ -56,123 +230,426 @@ class Server:
            Broke connection if server is full and return 'True', otherwise return 'False'
         """
         if len(self._clients) >= self._max_connected_users:
-            connection.sendall(b'Max users count reached')
+            DECLINED_CONNECTIONS.inc()
+            connection.sendall(encode_frame(FrameType.DECLINE, 'Max users count reached'))
             connection.close()
             return True
         return False
         
     def _verify_client(self, client: ClientData) -> None:
-        """Close connection with user if nickname was reserved for another user 
-           or leght of nickname is invalid, otherwise adding user to clients list"""
+        """Close connection with user if leght of nickname is invalid 
+           or nickname was reserved for another user, otherwise adding user to clients registry"""
 
-        if not self._nickname_is_unique(client):
-            client.decline('Client with this name already exist')
+        if client.nickname is None:
+            DECLINED_CONNECTIONS.inc()
+            client.connection.close()
             return
-        if not 3 < len(client.nickname) <= 16:
+        if not valid_nickname(client.nickname):
+            DECLINED_CONNECTIONS.inc()
             client.decline('Invalid nickname lenght')
             return
+        if self._stopping.is_set():
+            # Clients which are drained on shutdown were taken already, this one would never be disconnected
+            DECLINED_CONNECTIONS.inc()
+            client.decline('Server is shutting down')
+            return
+        if len(self._clients) >= self._max_connected_users:
+            # Other clients could be verified while this one was sending nickname
+            DECLINED_CONNECTIONS.inc()
+            client.decline('Max users count reached')
+            return
+        if not self._add_new_client_to_list(client):
+            DECLINED_CONNECTIONS.inc()
+            client.decline('Client with this name already exist')
+            return
 
-        self._add_new_client_to_list(client)
-        client.accept()
+        # Messages delivered after join are queued until accept, history has only messages delivered before it
+        with self._delivery_lock:
+            self._rooms.join(DEFAULT_ROOM, client)
+            history = self._history.replay(DEFAULT_ROOM, after=client.resume_from)
+        try:
+            client.accept(history + self._offline_messages(client.nickname))
+        except OSError:
+            # Client did not read accept frame and history until handshake deadline or closed connection.
+            # Connection handler was not started, so client is removed here, otherwise its nickname stays taken
+            client.disconnect()
+            self._remove_client(client)
+            return
+        CONNECTIONS.inc()
+        self._reaper.watch(client)
 
-    def _nickname_is_unique(self, client: ClientData) -> bool:
-        """Check if new user set nickname that already have some connected user"""
-        for cl in self._clients:
-            if cl.nickname == client.nickname:
-                return False
-        return True
+    def _add_new_client_to_list(self, client: ClientData) -> bool:
+        """Add client to clients registry after verifying. 
+           Return 'False' if nickname is already used by another connected user
+        """
+        return self._clients.register(client)
 
-    def _add_new_client_to_list(self, client: ClientData) -> str:
-        """Add client to clients list after verifying"""
-        self._clients.append(client)
-        return f'{client.nickname} connected'
+    def _remove_client(self, client: ClientData) -> bool:
+        """Remove disconnected client from clients registry and from all rooms. 
+           Return 'False' if client was removed already, e.g. it was evicted before its connection handler stopped
+        """
+        self._rooms.leave_all(client)
+        return self._clients.unregister(client)
+
+    def _kick_flooder(self, client: ClientData) -> None:
+        """Kick client which keeps sending messages over rate limit. Admins are never kicked"""
+        if client.admin:
+            return
+        if self._admintools.kick(client, 'You were kicked for flooding'):
+            FLOOD_KICKS.inc()
+
+    def _evict_idle_client(self, client: ClientData) -> None:
+        """Disconnect client which did not answer pings and free its slot at once"""
+        IDLE_EVICTIONS.inc()
+        client.disconnect()
+        self._remove_client(client)
 
     # ------------------- #
     #   Messages methods  #
     # ------------------- #
-    def _send_message_to_all(self, message: str) -> str:
-        """Send message to users from clients list"""
-        for client in self._clients:
-            if client.connection:
-                try:
-                    client.send_message(message)
-                except OSError:
-                    client.connection.close()
-                    break
+    def _send_message_to_room(self, room: str, message: str, sequence: int) -> bytes:
+        """Encode message once and queue it for every subscriber of room. Return encoded message.
+           Large message is compressed once too, for all subscribers which negotiated compression
+        """
+        frame = encode_sequenced_frame(FrameType.ROOM_MESSAGE, sequence, message)
+        subscribers = self._rooms.subscribers(room)
+        if len(frame) < COMPRESSION_THRESHOLD:
+            for client in subscribers:
+                client.send_frame(frame)
+            MESSAGES_OUT.inc(len(subscribers))
+            BYTES_OUT.inc(len(subscribers) * len(frame))
+            return frame
+
+        compressed, compressed_count = None, 0
+        for client in subscribers:
+            if not client.compression:
+                client.send_frame(frame)
+                continue
+            if compressed is None:
+                compressed = client.compress(frame)
+            client.send_frame(compressed)
+            compressed_count += 1
+        if compressed_count > 1:
+            COMPRESSION_SAVED_BYTES.inc((compressed_count - 1) * (len(frame) - len(compressed)))
+        MESSAGES_OUT.inc(len(subscribers))
+        BYTES_OUT.inc((len(subscribers) - compressed_count) * len(frame) + compressed_count * len(compressed or b''))
+        return frame
+
+    def _deliver_direct_message(self, nickname: str, message: str) -> bool:
+        """Send message to one client found by nickname. Return 'False' if client is not connected to this server"""
+        if (client:=self._clients.get(nickname)) is None:
+            return False
+        client.send_message(message)
+        return True
+
+    def _send_direct_message(self, nickname: str, message: str) -> bool:
+        """Send direct message to client. 
+           If client is offline, keep message until its next login and return 'False'
+        """
+        DIRECT_MESSAGES.inc()
+        if self._deliver_direct_message(nickname, message):
+            return True
+        self._mailbox.store(nickname, message)
+        return False
+
+    def _offline_messages(self, nickname: str) -> bytes:
+        """Encode direct messages which were sent to client while it was offline"""
+        return b''.join(encode_frame(FrameType.MESSAGE, message) for message in self._mailbox.take(nickname))
+
+    def _join_room(self, client: ClientData, room: str) -> bool:
+        """Subscribe client to room and send last messages of room to it. Only the newest messages which fit
+           in client's outbound buffer are sent, client is told how many older ones were left out.
+           Return 'False' if client is subscribed already
+        """
+        with self._delivery_lock:
+            if not self._rooms.join(room, client):
+                return False
+            history, skipped = self._history.replay_tail(room, client.outbound_space)
+            if history and not client.send_frame(client.compress(history)):
+                client.send_message(f'History of {room} was not sent, your connection is too slow')
+            elif skipped:
+                client.send_message(f'{skipped} older messages of {room} did not fit in your buffer')
+        return True
 
     def _clients_messages_checker(self) -> None:
-        """Check new messages from all users"""
-        while self._server_socket:
-            for client in self._clients:
-                if not client.messages_queue:
-                    continue
-                message = client.messages_queue.pop(0)
-                self._process_message(message)    
+        """Wait for new messages from all users and process them.
+           Stops when 'None' is put to messages queue
+        """
+        while (message:=self._messages_queue.get()) is not None:
+            try:
+                self._process_message(message)
+            except Exception:
+                # One message which can not be processed must not stop delivery of all others
+                DISPATCH_ERRORS.inc()
+            DISPATCH_LATENCY.observe(time.monotonic() - message.received_at)
 
     def _process_message(self, message: Message) -> None:
         """Check message type.
-           If message is command, it will be executed in admintools (if client which sent message is admin),
-           otherwise message will be sent to all users
+           Message without command prefix is sent to subscribers of its room and saved to history, 
+           it is never parsed. Room is taken from sender now, so /join or /leave sent before message applies to it.
+           Command is executed by command registry (if client is allowed to use it) 
+           and result is sent only to sender, commands are never broadcast
         """
-        if message.is_command and message.get_sender.admin:
-            return self._admintools.execute(message)
-        self._send_message_to_all(message.edited)
+        if not message.is_command:
+            self._publish_message(message.room, message.edited)
+            return
+        result = self._commands.execute(message.text, message.get_sender)
+        for line in result.text.splitlines():
+            message.get_sender.send_message(line)
+
+    def _publish_message(self, room: str, message: str) -> None:
+        """Deliver message from one of clients to its room"""
+        self._deliver_to_room(room, message)
+
+    def _deliver_to_room(self, room: str, message: str, sequence: int | None = None) -> None:
+        """Number message (unless it was numbered already), send it to subscribers of room 
+           and save it to room history
+        """
+        with self._delivery_lock:
+            if sequence is None:
+                sequence = next(self._sequence)
+            self._history.append(room, message, self._send_message_to_room(room, message, sequence), sequence)
 
     def _start_messages_checker(self) -> None:
         """Create thread which checks new messages"""
-        thread = threading.Thread(target=self._clients_messages_checker)
-        thread.start()
+        self._messages_checker = threading.Thread(target=self._clients_messages_checker)
+        self._messages_checker.start()
 
     # ---------------- #
     #   Other methods  #
     # ---------------- #
     def _receive_connections(self) -> None:
-        """Wait for new connection.
-           Call create_new_client method if new connection was detected
+        """Accept new connections and pass them to handshake workers only when they become readable, 
+           so workers never wait for clients which send nothing and silent connections can not take all of them.
+           Handshake deadline starts when connection is accepted, connection which stays silent until it passes
+           is closed here. Stops when server is shutting down
         """
-        while self._server_socket:
-            try:
-                connection, _ = self._server_socket.accept()
-                self._create_new_client(connection)
-            except (KeyboardInterrupt, OSError):
-                self._stop_server()
+        selector = selectors.DefaultSelector()
+        selector.register(self._server_socket, selectors.EVENT_READ)
+        # Deadlines grow in order of accepting, so the first waiting connection always expires first
+        waiting: dict[socket.socket, float] = {}
+        try:
+            while not self._stopping.is_set():
+                timeout = max(next(iter(waiting.values())) - time.monotonic(), 0) if waiting else None
+                for key, _ in selector.select(timeout):
+                    if key.fileobj is not self._server_socket:
+                        selector.unregister(key.fileobj)
+                        self._handshakes.submit(self._handshake, key.fileobj, waiting.pop(key.fileobj))
+                    elif not self._accept_connection(selector, waiting):
+                        return
+                self._close_expired_connections(selector, waiting)
+        finally:
+            for connection in waiting:
+                connection.close()
+            selector.close()
 
-    def run(self) -> None:
-        """Start server"""
+    def _accept_connection(self, selector: selectors.BaseSelector, waiting: dict[socket.socket, float]) -> bool:
+        """Accept new connection and wait until it becomes readable. Return 'False' if server is shutting down"""
+        try:
+            connection, _ = self._server_socket.accept()
+        except OSError:
+            return False
+        if self._stopping.is_set():
+            connection.close()
+            return False
+        waiting[connection] = time.monotonic() + self._handshake_timeout
+        selector.register(connection, selectors.EVENT_READ)
+        return True
+
+    def _close_expired_connections(
+        self, selector: selectors.BaseSelector, waiting: dict[socket.socket, float]
+    ) -> None:
+        """Close connections which did not send anything until handshake deadline"""
+        now = time.monotonic()
+        while waiting:
+            connection, deadline = next(iter(waiting.items()))
+            if deadline > now:
+                break
+            del waiting[connection]
+            selector.unregister(connection)
+            connection.close()
+            HANDSHAKE_TIMEOUTS.inc()
+
+    def shutdown(self) -> None:
+        """Ask server to stop accepting connections and drain. Safe to call from any thread and signal handler"""
+        self._stopping.set()
+        try:
+            # Unlike close, shutdown wakes up accept which is blocked in main thread
+            self._server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _stop_server(self) -> None:
+        """Drain server, so no message is lost: wait until messages which are on their way from clients arrive, 
+           stop receiving, process all received messages, notify clients and give them the rest of
+           shutdown_timeout to receive queued messages, then disconnect them and write pending history
+        """
+        deadline = time.monotonic() + self._shutdown_timeout
+        self._stopping.set()
+        self._server_socket.close()
+        # Handshakes in progress are finished first, so every client which was accepted is drained below
+        self._handshakes.shutdown(wait=True, cancel_futures=True)
+        self._reaper.stop()
+        self._terminal.stop()
+        clients = self._clients.snapshot()
+        while (now:=time.monotonic()) < deadline and any(
+            now - client.last_activity < SHUTDOWN_QUIET_PERIOD for client in clients
+        ):
+            time.sleep(SHUTDOWN_QUIET_PERIOD / 4)
+        for client in clients:
+            client.stop_receiving()
+        for client in clients:
+            client.wait_receiving_stopped(max(deadline - time.monotonic(), 0))
+        self._pipeline.join(max(deadline - time.monotonic(), 0))
+        self._messages_queue.put(None)
+        if self._messages_checker is not None:
+            self._messages_checker.join(max(deadline - time.monotonic(), 0))
+
+        for client in clients:
+            client.send_message('Server is shutting down')
+        while time.monotonic() < deadline and any(
+            client.outbound_stats.queued_messages and not client.closed for client in clients
+        ):
+            time.sleep(0.05)
+        for client in clients:
+            client.disconnect()
+        self._pipeline.close()
+        self._history.close()
+
+    def _handle_stop_signal(self, signum: int, frame) -> None:
+        self.shutdown()
+
+    def _register_gauges(self) -> None:
+        """Register metrics which are computed from server state when they are read"""
+        registry.gauge('chat_connected_clients', 'Clients connected to server', lambda: len(self._clients))
+        registry.gauge('chat_dispatch_queue_depth', 'Messages waiting for dispatcher', self._messages_queue.qsize)
+        registry.gauge('chat_filter_queue_depth', 'Messages waiting for filters', lambda: len(self._pipeline))
+        registry.gauge(
+            'chat_outbound_queued_messages', 'Messages waiting to be sent to clients',
+            lambda: sum(client.outbound_stats.queued_messages for client in self._clients)
+            )
+        registry.gauge(
+            'chat_outbound_queued_bytes', 'Bytes waiting to be sent to clients',
+            lambda: sum(client.outbound_stats.queued_bytes for client in self._clients)
+            )
+
+    def _start_background_threads(self) -> None:
+        """Start threads which work alongside of connections receiving"""
+        if self._metrics_port is not None:
+            registry.serve('127.0.0.1', self._metrics_port)
+        self._history.start()
+        self._flusher.start()
+        self._reaper.start()
         self._start_messages_checker()
         self._terminal.start()
+
+    def run(self) -> None:
+        """Start server. SIGTERM and SIGINT shut it down gracefully"""
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        self._start_background_threads()
         self._receive_connections()
+        self._stop_server()
 
 
 class Terminal:
     """Class to create server interactive terminal.
     
     Arguments:
-        clients -- link to list of connected to server users
+        clients -- link to ClientRegistry of connected to server users
+        commands -- link to CommandRegistry of server. Terminal-only commands are registered in it
+        on_shutdown (default 'None') -- function which is called by /shutdown command
 
     Attributes:
-        admintools -- instance with 'clients' init argument. Execute commands from server side 
+        clients -- link to ClientRegistry of connected to server users
+        commands -- link to CommandRegistry of server. Executes commands from server side
+        stopped -- threading.Event which stops terminal thread
     """
-    def __init__(self, clients: list[ClientData]) -> None:
-        self._admintools = ServerAdminTools(clients)
+    def __init__(
+        self, clients: ClientRegistry, commands: CommandRegistry, on_shutdown: Callable[[], None] | None = None
+    ) -> None:
+        self._clients = clients
+        self._commands = commands
+        self._on_shutdown = on_shutdown
+        self._stopped = threading.Event()
+        self._commands.register(self)
     
     def start(self):
         """Start terminal in new thread"""
         thread = threading.Thread(target=self._server_terminal_handler)
         thread.start()
 
+    def stop(self) -> None:
+        """Stop terminal thread"""
+        self._stopped.set()
+
     def _server_terminal_handler(self) -> None:
         """Wait for message/command input"""
-        while True:
-            try:
-                message = input('~ ')
-                self._process_terminal_message(Message(message))
-            except EOFError:
-                return
+        for message in read_terminal_lines(self._stopped):
+            if (result:=self._process_terminal_message(Message(message))) is not None:
+                print(result.text)
 
-    def _process_terminal_message(self, message: Message) -> None:
+    def _process_terminal_message(self, message: Message) -> AdminCommandResult | None:
         """Check message type. Execute if command
            !ToDo: send messages to users
         """
-        if message.is_command:
-            return self._admintools.execute(message)
\ No newline at end of file
+        if not message.is_command:
+            return
+        return self._commands.execute(message.text)
+
+    @command('/buffers', permission=Permission.TERMINAL, help='Show outbound buffers of clients')
+    def _buffers(self, sender: None) -> AdminCommandResult:
+        """Show outbound buffer counters (including failed sends) of every client and total for server"""
+        lines, total = [], OutboundStats()
+        for client in self._clients:
+            stats = client.outbound_stats
+            total += stats
+            lines.append(f'{client.nickname}: {stats}')
+        lines.append(f'total: {total}')
+        return AdminCommandResult(True, '\n'.join(lines))
+
+    @command('/stats', permission=Permission.TERMINAL, help='Show server metrics')
+    def _stats(self, sender: None) -> AdminCommandResult:
+        """Show server metrics: connections, messages and bytes counters, queue depths and dispatch latency"""
+        return AdminCommandResult(True, registry.render_text())
+
+    @command('/shutdown', permission=Permission.TERMINAL, help='Deliver queued messages and stop server')
+    def _shutdown(self, sender: None) -> AdminCommandResult:
+        """Stop accepting connections, deliver queued messages to clients and stop server"""
+        if self._on_shutdown is None:
+            return AdminCommandResult(False, 'Shutdown is not supported')
+        self._on_shutdown()
+        return AdminCommandResult(True, 'Shutting down')
+
+
+def read_terminal_lines(stopped: threading.Event, prompt: str = '~ ') -> Iterator[str]:
+    """Yield lines of standard input until it is closed or stopped is set.
+       Lines are read by a daemon thread, so unlike input() in terminal thread waiting can be stopped 
+       and terminal thread does not keep stopped server alive. Blocking read works on every platform,
+       select.select does not accept standard input on Windows
+    """
+    lines: queue.Queue[str | None] = queue.Queue()
+    reader = threading.Thread(target=_read_standard_input, args=(lines,), daemon=True)
+    reader.start()
+    print(prompt, end='', flush=True)
+    while not stopped.is_set():
+        try:
+            line = lines.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if line is None:
+            return
+        yield line
+        print(prompt, end='', flush=True)
+
+
+def _read_standard_input(lines: queue.Queue) -> None:
+    """Put lines of standard input to queue, then 'None' when it is closed.
+       Unbuffered stream is read, because interpreter can not shut down while daemon thread holds buffer lock
+    """
+    stream, pending = sys.stdin.buffer.raw, b''
+    while data:=stream.read(4096):
+        *complete, pending = (pending + data).split(b'\n')
+        for line in complete:
+            lines.put(line.rstrip(b'\r').decode(errors='replace'))
+    lines.put(None)
@@ -1,2 +1,51 @@
 #Prefix for server commands
-COMMAND_PREFIX = "/"
\ No newline at end of file
+COMMAND_PREFIX = "/"
+#Min and max length of client's nickname
+NICKNAME_MIN_LENGTH = 4
+NICKNAME_MAX_LENGTH = 16
+#Max count of connections which wait to be accepted by server
+LISTEN_BACKLOG = 128
+#Seconds which new client has to send nickname
+HANDSHAKE_TIMEOUT = 5
+#Count of threads which receive nicknames of new clients (threading engine)
+HANDSHAKE_WORKERS = 16
+#Max count of messages which may wait to be sent to one client
+OUTBOUND_HIGH_WATER_MARK = 1024
+#Max size in bytes of messages which may wait to be sent to one client
+OUTBOUND_MAX_BYTES = 1024 * 1024
+#Count of last messages which are replayed to a new client
+HISTORY_SIZE = 100
+#Count of rooms whose last messages are kept in memory, history of room which was silent for longest is dropped
+HISTORY_ROOMS_LIMIT = 256
+#Room which every client joins after connecting
+DEFAULT_ROOM = "general"
+#Count of threads (or processes) which run message filters
+FILTER_WORKERS = 4
+#Max count of direct messages kept for one offline client, older messages are dropped
+OFFLINE_MESSAGES_LIMIT = 50
+#Max count of offline clients which direct messages are kept for
+OFFLINE_RECIPIENTS_LIMIT = 1000
+#Max size in bytes of direct messages kept for one offline client, older messages are dropped
+OFFLINE_MAILBOX_MAX_BYTES = 256 * 1024
+#Max size in bytes of direct messages kept for all offline clients, mailbox which was filled first is dropped
+OFFLINE_MAX_BYTES = 16 * 1024 * 1024
+#Messages per second which one client may send, 0 disables the limit
+CLIENT_RATE_LIMIT = 10
+#Messages which one client may send at once after being silent
+CLIENT_RATE_BURST = 20
+#Messages per second which all clients together may send, 0 disables the limit
+GLOBAL_RATE_LIMIT = 1000
+#Messages which all clients together may send at once
+GLOBAL_RATE_BURST = 2000
+#Count of dropped messages during FLOOD_WINDOW after which client is kicked, 0 disables kicking
+FLOOD_KICK_THRESHOLD = 100
+#Seconds during which dropped messages of client are counted
+FLOOD_WINDOW = 10
+#Seconds of client's silence after which server pings it
+HEARTBEAT_INTERVAL = 15
+#Seconds of client's silence after which it is disconnected, 0 disables disconnecting
+HEARTBEAT_TIMEOUT = 45
+#Seconds which server waits on shutdown for messages to be sent to clients
+SHUTDOWN_TIMEOUT = 10
+#Seconds without data from any client after which server stops receiving on shutdown
+SHUTDOWN_QUIET_PERIOD = 0.2
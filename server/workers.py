@@ -0,0 +1,367 @@
+import itertools
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+
+from asyncserver import AsyncServer
+from clientdata import ClientData, Message
+from common.protocol import FrameType, encode_frame
+from metrics import DIRECT_MESSAGES
+from offlinemailbox import OfflineMailbox
+from server import Server, Terminal, read_terminal_lines
+from settings import (
+    OFFLINE_MAILBOX_MAX_BYTES, OFFLINE_MAX_BYTES, OFFLINE_MESSAGES_LIMIT, OFFLINE_RECIPIENTS_LIMIT, SHUTDOWN_TIMEOUT
+    )
+
+
+class BusClient:
+    """Class to connect worker process to the bus of WorkerPool.
+
+    Arguments:
+        address -- path of the Unix domain socket of the bus
+        authkey -- key which workers use to authenticate on the bus
+
+    Attributes:
+        events -- connection for chat messages, direct messages and terminal commands in both directions
+        requests -- connection for requests to the global nickname registry and offline mailbox
+        events_lock, requests_lock -- locks which make connections safe to use from several threads
+    """
+    def __init__(self, address: str, authkey: bytes) -> None:
+        self._events = Client(address, family='AF_UNIX', authkey=authkey)
+        self._events.send(('events',))
+        self._requests = Client(address, family='AF_UNIX', authkey=authkey)
+        self._requests.send(('requests',))
+        self._events_lock = threading.Lock()
+        self._requests_lock = threading.Lock()
+
+    def publish(self, room: str, message: str) -> None:
+        """Send message to WorkerPool, which numbers it and sends it to all workers, this one included"""
+        with self._events_lock:
+            self._events.send(('message', room, message))
+
+    def request_flush(self) -> None:
+        """Ask WorkerPool to answer with 'flushed' event after all messages which this worker published"""
+        with self._events_lock:
+            self._events.send(('flush',))
+
+    def receive(self) -> tuple:
+        """Wait for the next event from other workers or from the terminal"""
+        return self._events.recv()
+
+    def reserve(self, nickname: str) -> bool:
+        """Reserve nickname for client of this worker. Return 'False' if it is used on any worker"""
+        with self._requests_lock:
+            self._requests.send(('reserve', nickname))
+            return self._requests.recv()
+
+    def release(self, nickname: str) -> None:
+        """Make nickname available for all workers again"""
+        with self._requests_lock:
+            self._requests.send(('release', nickname))
+
+    def send_direct(self, nickname: str, message: str) -> bool:
+        """Send direct message to client of any worker. 
+           Return 'False' if client is offline and message was kept in mailbox of WorkerPool
+        """
+        with self._requests_lock:
+            self._requests.send(('direct', nickname, message))
+            return self._requests.recv()
+
+    def take_offline(self, nickname: str) -> list[str]:
+        """Remove and return direct messages which were sent to client while it was offline"""
+        with self._requests_lock:
+            self._requests.send(('take', nickname))
+            return self._requests.recv()
+
+
+class WorkerTerminal(Terminal):
+    """Class to execute terminal commands inside of worker process.
+       Commands are read by WorkerPool and come through the bus, so terminal doesn't read input itself
+    """
+    def start(self) -> None:
+        pass
+
+
+class WorkerMixin:
+    """Mixin which turns server into one of WorkerPool processes.
+       All workers listen on the same port (SO_REUSEPORT) and share messages and nicknames through the bus.
+
+    Arguments:
+        bus_address -- path of the Unix domain socket of the bus
+        bus_authkey -- key which workers use to authenticate on the bus
+        the rest are the same as for server class
+
+    Attributes:
+        bus -- BusClient instance connected to WorkerPool
+        bus_flushed -- threading.Event which is set when WorkerPool sent back all messages of this worker
+    """
+    def __init__(self, *args, bus_address: str, bus_authkey: bytes, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._bus = BusClient(bus_address, bus_authkey)
+        self._bus_flushed = threading.Event()
+        self._terminal = WorkerTerminal(self._clients, self._commands, on_shutdown=self.shutdown)
+
+    def _create_server_socket(self, ip: str, port: int, max_connections_queue: int) -> socket.socket:
+        """Create socket which listens for new connections on the port shared with other workers"""
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server_socket.bind((ip, port))
+        server_socket.listen(max_connections_queue)
+        return server_socket
+
+    def _add_new_client_to_list(self, client: ClientData) -> bool:
+        """Reserve nickname on all workers, then add client to clients registry of this worker"""
+        if not self._bus.reserve(client.nickname):
+            return False
+        if super()._add_new_client_to_list(client):
+            return True
+        self._bus.release(client.nickname)
+        return False
+
+    def _remove_client(self, client: ClientData) -> bool:
+        """Remove client and make its nickname available on all workers. 
+           Nickname is released only once, so reservation of the next client with this nickname stays
+        """
+        if not super()._remove_client(client):
+            return False
+        self._bus.release(client.nickname)
+        return True
+
+    def _send_direct_message(self, nickname: str, message: str) -> bool:
+        """Send direct message to client of this worker, otherwise through the bus to client of another worker"""
+        DIRECT_MESSAGES.inc()
+        if self._deliver_direct_message(nickname, message):
+            return True
+        return self._bus.send_direct(nickname, message)
+
+    def _offline_messages(self, nickname: str) -> bytes:
+        """Encode direct messages which were kept by WorkerPool while client was offline"""
+        return b''.join(encode_frame(FrameType.MESSAGE, message) for message in self._bus.take_offline(nickname))
+
+    def _publish_message(self, room: str, message: str) -> None:
+        """Send message through the bus. WorkerPool gives it sequence number and sends it to every worker,
+           so all workers deliver messages in the same order with the same numbers. 
+           Client which reconnects to another worker resumes from the right message then
+        """
+        self._bus.publish(room, message)
+
+    def _clients_messages_checker(self) -> None:
+        """Process messages like server does. After the last one wait until WorkerPool sends back 
+           all messages of this worker, so they reach clients of this worker before shutdown
+        """
+        super()._clients_messages_checker()
+        self._bus.request_flush()
+        self._bus_flushed.wait(self._shutdown_timeout)
+
+    def _bus_handler(self) -> None:
+        """Wait for events from the bus. Stop worker process if WorkerPool is gone"""
+        while True:
+            try:
+                event, *arguments = self._bus.receive()
+            except (EOFError, OSError):
+                os._exit(1)
+            if event == 'message':
+                self._deliver_to_room(*arguments)
+            elif event == 'flushed':
+                self._bus_flushed.set()
+            elif event == 'direct':
+                self._deliver_direct_message(*arguments)
+            elif event == 'command':
+                result = self._terminal._process_terminal_message(Message(*arguments))
+                if result is not None and result.completed:
+                    print(f'[worker {os.getpid()}] {result.text}')
+
+    def _start_background_threads(self) -> None:
+        super()._start_background_threads()
+        thread = threading.Thread(target=self._bus_handler, daemon=True)
+        thread.start()
+
+
+class WorkerServer(WorkerMixin, Server):
+    """Server which works as WorkerPool process"""
+
+
+class AsyncWorkerServer(WorkerMixin, AsyncServer):
+    """AsyncServer which works as WorkerPool process"""
+
+
+def _run_worker(server_class: type[Server], args: tuple, kwargs: dict) -> None:
+    server = server_class(*args, **kwargs)
+    server.run()
+
+
+class WorkerPool:
+    """Class to run several server processes on the same port.
+       Pool owns the bus, which forwards chat messages between workers, keeps global nickname registry
+       and sends terminal commands to all workers.
+
+    Arguments:
+        workers -- count of worker processes
+        server_class -- WorkerServer or AsyncWorkerServer
+        args, kwargs -- arguments of server_class
+
+    Attributes:
+        events -- dict of events connections with workers, connection (key) corresponds to its lock (value)
+        sequence -- counter of room messages of all workers. Starts from pool start time in microseconds, 
+                like counter of single server
+        sequence_lock -- threading.Lock which is held while message is numbered and sent to all workers,
+                so every worker gets messages in order of their numbers
+        nicknames -- dict of nicknames used on all workers, nickname (key) corresponds to 
+                requests connection of worker which reserved it (value)
+        mailbox -- OfflineMailbox of direct messages for clients which are offline on all workers
+        lock -- threading.Lock which guards events and nicknames
+        processes -- list of worker processes
+        stopping -- threading.Event which is set by SIGTERM, SIGINT or /shutdown command
+    """
+    def __init__(self, workers: int, server_class: type[Server], *args, **kwargs) -> None:
+        self._workers = workers
+        self._server_class = server_class
+        self._args = args
+        self._kwargs = kwargs
+        self._events: dict[Connection, threading.Lock] = {}
+        self._sequence = itertools.count(time.time_ns() // 1000)
+        self._sequence_lock = threading.Lock()
+        self._nicknames: dict[str, Connection] = {}
+        self._mailbox = OfflineMailbox(
+            OFFLINE_MESSAGES_LIMIT, OFFLINE_RECIPIENTS_LIMIT, OFFLINE_MAILBOX_MAX_BYTES, OFFLINE_MAX_BYTES
+            )
+        self._lock = threading.Lock()
+        self._processes: list[multiprocessing.Process] = []
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        """Start bus and worker processes, then handle terminal input until pool is stopped"""
+        address = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+        authkey = os.urandom(16)
+        listener = Listener(address, family='AF_UNIX', authkey=authkey)
+
+        for worker_id in range(self._workers):
+            kwargs = dict(self._kwargs, bus_address=address, bus_authkey=authkey)
+            # Workers are daemonic processes which may not have children, so they run filters in threads
+            kwargs['filter_processes'] = False
+            if worker_id:
+                # Every worker gets all messages, so only one of them writes history log. 
+                # The rest load last messages from it too, so clients get the same history on every worker
+                kwargs['history_readonly'] = True
+            if kwargs.get('metrics_port') is not None:
+                # Every worker is a separate process with its own metrics, so each one gets its own port
+                kwargs['metrics_port'] += worker_id
+            process = multiprocessing.Process(
+                target=_run_worker, args=(self._server_class, self._args, kwargs), daemon=True
+                )
+            process.start()
+            self._processes.append(process)
+
+        thread = threading.Thread(target=self._accept_workers, args=(listener,), daemon=True)
+        thread.start()
+        thread = threading.Thread(target=self._terminal_handler)
+        thread.start()
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        self._stopping.wait()
+        self._stop_workers()
+
+    def _handle_stop_signal(self, signum: int, frame) -> None:
+        self._stopping.set()
+
+    def _stop_workers(self) -> None:
+        """Send SIGTERM to workers, so each of them drains its clients, and wait for them to exit"""
+        for process in self._processes:
+            process.terminate()
+        timeout = self._kwargs.get('shutdown_timeout', SHUTDOWN_TIMEOUT) + 5
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+
+    def _accept_workers(self, listener: Listener) -> None:
+        """Accept bus connections of workers and handle each of them in new thread"""
+        handlers = {'events': self._events_handler, 'requests': self._requests_handler}
+        while True:
+            connection = listener.accept()
+            kind, = connection.recv()
+            thread = threading.Thread(target=handlers[kind], args=(connection,), daemon=True)
+            thread.start()
+
+    def _send_event(self, event: tuple, exclude: Connection | None = None) -> None:
+        """Send event to all workers except one"""
+        with self._lock:
+            connections = list(self._events.items())
+        for connection, lock in connections:
+            if connection is exclude:
+                continue
+            try:
+                with lock:
+                    connection.send(event)
+            except OSError:
+                continue
+
+    def _events_handler(self, connection: Connection) -> None:
+        """Number chat messages of one worker and send them to all workers, forward other events 
+           to all other workers. Answer flush request after all previous events of worker were sent
+        """
+        with self._lock:
+            lock = self._events[connection] = threading.Lock()
+        while True:
+            try:
+                event = connection.recv()
+            except (EOFError, OSError):
+                break
+            if event[0] == 'message':
+                with self._sequence_lock:
+                    self._send_event((*event, next(self._sequence)))
+            elif event[0] == 'flush':
+                try:
+                    with lock:
+                        connection.send(('flushed',))
+                except OSError:
+                    break
+            else:
+                self._send_event(event, exclude=connection)
+        with self._lock:
+            del self._events[connection]
+
+    def _requests_handler(self, connection: Connection) -> None:
+        """Serve nickname registry and offline mailbox requests of one worker. 
+           Direct message to online client is sent to all workers, only the one which has the client delivers it
+        """
+        while True:
+            try:
+                request, nickname, *arguments = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                if request == 'reserve':
+                    reply = nickname not in self._nicknames
+                    if reply:
+                        self._nicknames[nickname] = connection
+                elif request == 'release':
+                    if self._nicknames.get(nickname) is connection:
+                        del self._nicknames[nickname]
+                elif request == 'direct':
+                    reply = nickname in self._nicknames
+                    if not reply:
+                        self._mailbox.store(nickname, *arguments)
+                elif request == 'take':
+                    reply = self._mailbox.take(nickname)
+            if request == 'direct' and reply:
+                self._send_event(('direct', nickname, *arguments))
+            if request != 'release':
+                connection.send(reply)
+        with self._lock:
+            for nickname in [name for name, owner in self._nicknames.items() if owner is connection]:
+                del self._nicknames[nickname]
+
+    def _terminal_handler(self) -> None:
+        """Wait for command input and send it to all workers. /shutdown stops the pool"""
+        for message in read_terminal_lines(self._stopping):
+            if message.strip() == '/shutdown':
+                break
+            if Message(message).is_command:
+                self._send_event(('command', message))
+        self._stopping.set()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Server modules import each other by plain name, like server/main.py runs them
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'server'))
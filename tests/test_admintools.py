@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+
+from admintools import DirectMessageTools
+from clientregistry import ClientRegistry
+from commands import CommandRegistry
+
+
+def test_direct_message_to_invalid_nickname_is_not_kept():
+    sent = []
+    commands = CommandRegistry(ClientRegistry())
+    commands.register(DirectMessageTools(send=lambda nickname, text: sent.append(nickname)))
+    sender = SimpleNamespace(nickname='tester', admin=False)
+    for nickname in ('abc', 'x' * 17):
+        result = commands.execute(f'/msg {nickname} hello', sender)
+        assert not result.completed
+    assert sent == []
@@ -0,0 +1,50 @@
+import queue
+import socket
+from types import SimpleNamespace
+
+from clientdata import ClientData, Message
+from common.protocol import MAX_MESSAGE_SIZE, RECV_BUFFER_SIZE, FrameDecoder, FrameType, encode_frame
+from outbound import OutboundFlusher
+from settings import DEFAULT_ROOM
+
+
+def test_message_room_is_taken_when_message_is_dispatched():
+    sender = SimpleNamespace(nickname='tester', room=DEFAULT_ROOM)
+    message = Message('hello', sender=sender)
+    sender.room = 'secret'
+    assert message.room == 'secret'
+    assert message.edited == '[secret] tester: hello'
+
+
+def test_filtered_message_room_is_taken_when_message_is_dispatched():
+    sender = SimpleNamespace(nickname='tester', room='secret')
+    message = Message('hello', sender=sender).with_text('hi')
+    sender.room = DEFAULT_ROOM
+    assert message.room == DEFAULT_ROOM
+    assert message.edited == 'tester: hi'
+
+
+
+def test_rest_of_partly_sent_frame_is_queued_over_outbound_limit():
+    server_side, client_side = socket.socketpair()
+    # Small socket buffer makes socket accept only the beginning of the frame
+    server_side.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    client_side.sendall(encode_frame(FrameType.NICKNAME, 'tester'))
+    client = ClientData(server_side, queue.Queue(), OutboundFlusher(), max_bytes=1024)
+    try:
+        client.accept()
+        frame = encode_frame(FrameType.MESSAGE, b'x' * MAX_MESSAGE_SIZE)
+        assert client.send_frame(frame)
+        assert client.outbound_stats.dropped_messages == 0
+
+        decoder, frames = FrameDecoder(), []
+        client_side.settimeout(5)
+        while len(frames) < 2:
+            client.flush()
+            decoder.feed(client_side.recv(RECV_BUFFER_SIZE))
+            frames.extend(decoder)
+        assert frames[0].type is FrameType.ACCEPT
+        assert frames[1].payload == b'x' * MAX_MESSAGE_SIZE
+    finally:
+        client.disconnect()
+        client_side.close()
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from clientdata import ClientData
+from clientregistry import ClientRegistry
+from commands import AdminCommandResult, Argument, CommandRegistry, Permission, command
+
+
+class Tools:
+    """Commands of every kind which tests execute"""
+    @command('/repeat', Argument('times', int), Argument('text', rest=True), help='Repeat text')
+    def _repeat(self, sender, times: int, text: str) -> AdminCommandResult:
+        return AdminCommandResult(True, ' '.join([text] * times))
+
+    @command('/scale', Argument('factor', float))
+    def _scale(self, sender, factor: float) -> AdminCommandResult:
+        return AdminCommandResult(True, str(factor * 2))
+
+    @command('/poke', Argument('client', ClientData), permission=Permission.ADMIN, help='Poke client')
+    def _poke(self, sender, client) -> AdminCommandResult:
+        return AdminCommandResult(True, f'poked {client.nickname}')
+
+    @command('/halt', permission=Permission.TERMINAL, help='Stop everything')
+    def _halt(self, sender) -> AdminCommandResult:
+        return AdminCommandResult(True, 'halted')
+
+    @command('/say', Argument('nickname'), Argument('text', rest=True, filtered=True), client_only=True)
+    def _say(self, sender, nickname: str, text: str) -> AdminCommandResult:
+        return AdminCommandResult(True, f'{nickname}: {text}')
+
+
+@pytest.fixture
+def clients():
+    clients = ClientRegistry()
+    clients.register(SimpleNamespace(nickname='target'))
+    return clients
+
+
+@pytest.fixture
+def commands(clients):
+    commands = CommandRegistry(clients)
+    commands.register(Tools())
+    return commands
+
+
+def user(admin: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(nickname='tester', admin=admin)
+
+
+def test_arguments_are_converted_to_their_types(commands):
+    assert commands.execute('/repeat 2 hello  world', user()) == AdminCommandResult(True, 'hello  world hello  world')
+    assert commands.execute('/scale 1.5', user()).text == '3.0'
+
+
+@pytest.mark.parametrize('text, error', [
+    ('/repeat two hello', 'times must be int'),
+    ('/scale big', 'factor must be float'),
+    ('/repeat 2', 'Usage: /repeat <times> <text>'),
+    ('/scale 1 2', 'Usage: /scale <factor>'),
+    ])
+def test_invalid_arguments_are_reported_with_usage(commands, text, error):
+    assert commands.execute(text, user()) == AdminCommandResult(False, error)
+
+
+def test_client_argument_must_be_connected(commands):
+    admin = user(admin=True)
+    assert commands.execute('/poke target', admin) == AdminCommandResult(True, 'poked target')
+    assert commands.execute('/poke nobody', admin) == AdminCommandResult(False, 'nobody is not connected')
+
+
+def test_commands_over_permission_of_caller_look_unknown(commands):
+    unknown = AdminCommandResult(False, 'Unknown command /poke, use /help')
+    assert commands.execute('/poke target', user()) == unknown
+    assert not commands.execute('/halt', user(admin=True)).completed
+    assert commands.execute('/halt') == AdminCommandResult(True, 'halted')
+
+
+def test_client_only_commands_are_not_available_in_terminal(commands):
+    assert not commands.execute('/say target hi').completed
+    assert commands.execute('/say target hi', user()).completed
+
+
+def test_help_lists_only_allowed_commands(commands):
+    lines = commands.execute('/help', user()).text.splitlines()
+    assert '/repeat <times> <text> -- Repeat text' in lines
+    assert '/scale <factor>' in lines
+    assert not any(line.startswith(('/poke', '/halt')) for line in lines)
+    admin_lines = commands.execute('/help', user(admin=True)).text.splitlines()
+    assert '/poke <client> -- Poke client' in admin_lines
+
+
+def test_split_filtered_returns_only_filtered_argument(commands):
+    assert commands.split_filtered('/say target hello  there') == ('/say target ', 'hello  there')
+    assert commands.split_filtered('/say target') is None
+    assert commands.split_filtered('/repeat 2 hello') is None
+    assert commands.split_filtered('/unknown text') is None
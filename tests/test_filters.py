@@ -0,0 +1,94 @@
+import os
+import queue
+import random
+import time
+from clientdata import Message
+from filters import FilterPipeline, MessageFilter
+
+
+class SlowFilter(MessageFilter):
+    """Sleep for random time, so messages finish filtering out of order"""
+    name = 'slow'
+
+    def __call__(self, text: str) -> str | None:
+        time.sleep(random.uniform(0, 0.005))
+        return None if text == 'blocked' else text.upper()
+
+
+class FakeSender:
+    def __init__(self, nickname: str) -> None:
+        self.nickname = nickname
+        self.room = 'general'
+        self.notices = []
+
+    def send_message(self, text: str) -> None:
+        self.notices.append(text)
+
+
+def test_messages_of_one_sender_leave_pipeline_in_order():
+    messages_queue = queue.Queue()
+    pipeline = FilterPipeline([SlowFilter()], messages_queue, workers=4)
+    senders = [FakeSender(f'user{index}') for index in range(4)]
+    for number in range(25):
+        for sender in senders:
+            pipeline.put(Message(f'message {number}', sender=sender))
+    assert pipeline.join(timeout=10)
+    pipeline.close()
+
+    received = {sender.nickname: [] for sender in senders}
+    while not messages_queue.empty():
+        message = messages_queue.get()
+        received[message.get_sender.nickname].append(message.text)
+    for texts in received.values():
+        assert texts == [f'MESSAGE {number}' for number in range(25)]
+
+
+def test_command_keeps_its_place_among_messages_of_sender():
+    messages_queue = queue.Queue()
+    pipeline = FilterPipeline([SlowFilter()], messages_queue, workers=4)
+    sender = FakeSender('tester')
+    for text in ('first', '/join secret', 'blocked', 'second'):
+        pipeline.put(Message(text, sender=sender))
+    assert pipeline.join(timeout=10)
+    pipeline.close()
+
+    assert [messages_queue.get().text for _ in range(3)] == ['FIRST', '/join secret', 'SECOND']
+    assert messages_queue.empty()
+    assert sender.notices == ['Your message was blocked by slow filter']
+
+
+class KillingFilter(MessageFilter):
+    """Kill pool process which filters 'kill' message"""
+    name = 'killing'
+
+    def __call__(self, text: str) -> str | None:
+        if text == 'kill':
+            os._exit(1)
+        return text
+
+
+def test_pipeline_keeps_delivering_after_pool_process_was_killed():
+    messages_queue = queue.Queue()
+    pipeline = FilterPipeline([KillingFilter()], messages_queue, workers=1, processes=True)
+    sender, other = FakeSender('tester'), FakeSender('other')
+    try:
+        for text in ('kill', 'after'):
+            pipeline.put(Message(text, sender=sender))
+        assert pipeline.join(timeout=30)
+        pipeline.put(Message('later', sender=other))
+        assert pipeline.join(timeout=30)
+    finally:
+        pipeline.close()
+
+    assert sender.notices == ['Your message was blocked by pool filter']
+    assert [messages_queue.get().text for _ in range(2)] == ['after', 'later']
+
+
+def test_closed_pipeline_drops_messages_without_raising():
+    messages_queue = queue.Queue()
+    pipeline = FilterPipeline([SlowFilter()], messages_queue, workers=1)
+    pipeline.close()
+    sender = FakeSender('tester')
+    pipeline.put(Message('hello', sender=sender))
+    assert pipeline.join(timeout=1)
+    assert messages_queue.empty()
@@ -0,0 +1,104 @@
+import sqlite3
+
+from common.protocol import FrameType, encode_frame
+from history import MessageHistory
+from settings import DEFAULT_ROOM
+
+
+def add_messages(history: MessageHistory, room: str, texts: list[str], first_sequence: int = 1) -> None:
+    for sequence, text in enumerate(texts, first_sequence):
+        history.append(room, text, encode_frame(FrameType.MESSAGE, text), sequence)
+
+
+def test_replay_tail_returns_newest_messages_which_fit():
+    history = MessageHistory(size=10)
+    add_messages(history, 'general', ['aaaa', 'bbbb', 'cccc'])
+    frame_size = len(encode_frame(FrameType.MESSAGE, 'aaaa'))
+    chunk, skipped = history.replay_tail('general', 2 * frame_size + 1)
+    assert chunk == encode_frame(FrameType.MESSAGE, 'bbbb') + encode_frame(FrameType.MESSAGE, 'cccc')
+    assert skipped == 1
+    assert history.replay_tail('general', 0) == (b'', 3)
+    assert history.replay_tail('unknown', 100) == (b'', 0)
+
+
+def test_history_of_room_which_was_silent_for_longest_is_dropped():
+    history = MessageHistory(size=10, max_rooms=3)
+    for room in (DEFAULT_ROOM, 'first', 'second'):
+        add_messages(history, room, [room])
+    add_messages(history, 'first', ['again'], first_sequence=2)
+    add_messages(history, 'third', ['third'])
+    assert history.replay('second') == b''
+    assert history.replay('first') != b''
+    add_messages(history, 'fourth', ['fourth'])
+    add_messages(history, 'fifth', ['fifth'])
+    assert history.replay(DEFAULT_ROOM) == encode_frame(FrameType.MESSAGE, DEFAULT_ROOM)
+    assert history.replay('first') == history.replay('third') == b''
+
+
+def test_only_rooms_which_got_messages_lately_are_loaded_from_log(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history = MessageHistory(size=10, path=path, flush_interval=0.01)
+    history.start()
+    for room in (DEFAULT_ROOM, 'first', 'second', 'third'):
+        add_messages(history, room, [room])
+    history.close()
+
+    loaded = MessageHistory(size=10, path=path, max_rooms=2)
+    assert loaded.replay(DEFAULT_ROOM) == encode_frame(FrameType.MESSAGE, DEFAULT_ROOM)
+    assert loaded.replay('first') == loaded.replay('second') == b''
+    assert loaded.replay('third') == encode_frame(FrameType.MESSAGE, 'third')
+
+
+def test_ring_buffer_keeps_last_history_size_messages():
+    history = MessageHistory(size=2)
+    add_messages(history, DEFAULT_ROOM, ['one', 'two', 'three'])
+    assert history.replay(DEFAULT_ROOM) == (
+        encode_frame(FrameType.MESSAGE, 'two') + encode_frame(FrameType.MESSAGE, 'three')
+        )
+
+
+def test_replay_after_sequence_returns_only_newer_messages():
+    history = MessageHistory(size=10)
+    add_messages(history, DEFAULT_ROOM, ['one', 'two', 'three'])
+    assert history.replay(DEFAULT_ROOM, after=2) == encode_frame(FrameType.MESSAGE, 'three')
+    assert history.replay(DEFAULT_ROOM, after=3) == b''
+
+
+def test_history_is_reloaded_from_log_per_room(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history = MessageHistory(size=2, path=path, flush_interval=0.01)
+    history.start()
+    add_messages(history, DEFAULT_ROOM, ['one', 'two', 'three'])
+    add_messages(history, 'secret', ['hidden'], first_sequence=4)
+    history.close()
+
+    loaded = MessageHistory(size=2, path=path)
+    assert loaded.replay(DEFAULT_ROOM) == (
+        encode_frame(FrameType.MESSAGE, 'two') + encode_frame(FrameType.MESSAGE, 'three')
+        )
+    assert loaded.replay('secret') == encode_frame(FrameType.MESSAGE, 'hidden')
+    # Loaded messages have no sequence number, so they are never replayed on resume
+    assert loaded.replay(DEFAULT_ROOM, after=0) == b''
+
+
+def test_close_writes_messages_which_wait_for_batch(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history = MessageHistory(size=10, path=path, flush_interval=60)
+    history.start()
+    add_messages(history, DEFAULT_ROOM, ['one', 'two'])
+    history.close()
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute('SELECT room, text FROM messages ORDER BY id').fetchall()
+    finally:
+        connection.close()
+    assert rows == [(DEFAULT_ROOM, 'one'), (DEFAULT_ROOM, 'two')]
+
+
+def test_readonly_history_does_not_write_to_log(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history = MessageHistory(size=10, path=path, readonly=True)
+    history.start()
+    add_messages(history, DEFAULT_ROOM, ['one'])
+    history.close()
+    assert MessageHistory(size=10, path=path).replay(DEFAULT_ROOM) == b''
@@ -0,0 +1,45 @@
+from offlinemailbox import OfflineMailbox
+
+
+def test_mailbox_drops_oldest_messages_over_byte_limit():
+    mailbox = OfflineMailbox(max_messages=50, max_recipients=10, max_bytes=10, max_total_bytes=100)
+    for text in ('aaaa', 'bbbb', 'cccc'):
+        mailbox.store('tester', text)
+    assert mailbox.total_bytes == 8
+    assert mailbox.take('tester') == ['bbbb', 'cccc']
+    assert mailbox.total_bytes == 0
+
+
+def test_mailbox_drops_message_larger_than_byte_limit():
+    mailbox = OfflineMailbox(max_messages=50, max_recipients=10, max_bytes=10, max_total_bytes=100)
+    mailbox.store('tester', 'x' * 11)
+    assert mailbox.take('tester') == []
+
+
+def test_mailbox_counts_bytes_of_encoded_text():
+    mailbox = OfflineMailbox(max_messages=50, max_recipients=10, max_bytes=10, max_total_bytes=100)
+    mailbox.store('tester', 'ж' * 6)
+    assert mailbox.take('tester') == []
+
+
+def test_mailbox_drops_first_filled_mailboxes_over_total_byte_limit():
+    mailbox = OfflineMailbox(max_messages=50, max_recipients=10, max_bytes=10, max_total_bytes=20)
+    mailbox.store('first', 'a' * 10)
+    mailbox.store('second', 'b' * 10)
+    mailbox.store('third', 'c' * 5)
+    assert mailbox.total_bytes == 15
+    assert mailbox.take('first') == []
+    assert mailbox.take('second') == ['b' * 10]
+    assert mailbox.take('third') == ['c' * 5]
+
+
+def test_mailbox_keeps_limited_count_of_messages_and_recipients():
+    mailbox = OfflineMailbox(max_messages=2, max_recipients=2, max_bytes=100, max_total_bytes=1000)
+    for text in ('one', 'two', 'three'):
+        mailbox.store('first', text)
+    mailbox.store('second', 'text')
+    mailbox.store('third', 'text')
+    assert len(mailbox) == 2
+    assert mailbox.take('first') == []
+    assert mailbox.take('second') == ['text']
+    assert mailbox.total_bytes == 4
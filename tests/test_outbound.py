@@ -0,0 +1,73 @@
+from outbound import OutboundQueue, OutboundStats
+
+
+def test_send_errors_are_counted_per_queue_and_summed():
+    first, second = OutboundQueue(10, 100), OutboundQueue(10, 100)
+    first.send_failed()
+    first.send_failed()
+    second.send_failed()
+    assert first.stats().send_errors == 2
+    assert (OutboundStats() + first.stats() + second.stats()).send_errors == 3
+
+
+def test_queue_drops_frames_over_high_water_mark():
+    queue = OutboundQueue(high_water_mark=2, max_bytes=100)
+    assert queue.put(b'one') and queue.put(b'two')
+    assert not queue.put(b'three')
+    stats = queue.stats()
+    assert (stats.queued_messages, stats.queued_bytes) == (2, 6)
+    assert (stats.dropped_messages, stats.dropped_bytes) == (1, 5)
+
+
+def test_queue_drops_frames_over_max_bytes():
+    queue = OutboundQueue(high_water_mark=10, max_bytes=8)
+    assert queue.put(b'12345')
+    assert not queue.put(b'6789')
+    assert queue.put(b'678')
+    assert queue.size == 8
+
+
+def test_partly_sent_frame_is_kept_until_consumed():
+    queue = OutboundQueue(high_water_mark=10, max_bytes=100)
+    queue.put(b'abcd')
+    queue.put(b'ef')
+    assert queue.peek() == b'abcdef'
+    queue.consume(2)
+    assert queue.partial_frame() == b'cd'
+    assert bytes(queue.peek()) == b'cdef'
+    queue.consume(4)
+    assert not queue and queue.size == 0
+    assert queue.stats().flushed_messages == 2
+
+
+def test_peek_joins_frames_up_to_max_size_but_returns_at_least_one():
+    queue = OutboundQueue(high_water_mark=10, max_bytes=100)
+    for frame in (b'aaaa', b'bbbb', b'cccc'):
+        queue.put(frame)
+    assert queue.peek(max_size=8) == b'aaaabbbb'
+    assert queue.peek(max_size=2) == b'aaaa'
+
+
+def test_closed_queue_drops_frames_and_accepts_nothing():
+    queue = OutboundQueue(high_water_mark=10, max_bytes=100)
+    queue.put(b'frame')
+    queue.close()
+    assert queue.closed and not queue and queue.size == 0
+    assert not queue.put(b'frame')
+
+
+def test_forced_frame_is_queued_over_limits():
+    queue = OutboundQueue(high_water_mark=1, max_bytes=4)
+    assert queue.put(b'1234')
+    assert queue.put(b'56789', force=True)
+    assert queue.size == 9 and queue.stats().dropped_messages == 0
+
+
+def test_free_bytes_respects_both_limits():
+    queue = OutboundQueue(high_water_mark=2, max_bytes=10)
+    queue.put(b'1234')
+    assert queue.free_bytes == 6
+    queue.put(b'56')
+    assert queue.free_bytes == 0
+    queue.close()
+    assert queue.free_bytes == 0
@@ -0,0 +1,112 @@
+import zlib
+
+import pytest
+
+from common.protocol import (
+    HEADER, MAX_DECOMPRESSED_SIZE, MAX_PAYLOAD_SIZE, FrameDecoder, FrameType, ProtocolError, compress_frames,
+    decompress_frames, encode_frame, encode_sequenced_frame
+    )
+
+
+def compressed_frame(frames: bytes) -> bytes:
+    """Pack frames into COMPRESSED frame without checks of compress_frames"""
+    compressed = zlib.compress(frames)
+    return HEADER.pack(len(compressed), FrameType.COMPRESSED) + compressed
+
+
+def test_frame_split_across_chunks_is_decoded_once_complete():
+    data = encode_frame(FrameType.MESSAGE, 'hello')
+    decoder = FrameDecoder()
+    for byte in data[:-1]:
+        decoder.feed(bytes([byte]))
+        assert decoder.next_frame() is None
+    decoder.feed(data[-1:])
+    frame = decoder.next_frame()
+    assert frame.type is FrameType.MESSAGE and frame.text == 'hello'
+    assert decoder.next_frame() is None
+
+
+def test_frames_merged_in_one_chunk_are_decoded_in_order():
+    decoder = FrameDecoder()
+    decoder.feed(
+        encode_frame(FrameType.NICKNAME, 'tester') + encode_sequenced_frame(FrameType.ROOM_MESSAGE, 42, 'hi')
+        + encode_frame(FrameType.PING)[:2]
+        )
+    frames = list(decoder)
+    assert [frame.type for frame in frames] == [FrameType.NICKNAME, FrameType.ROOM_MESSAGE]
+    assert frames[1].sequence == 42 and frames[1].text == 'hi'
+    decoder.feed(encode_frame(FrameType.PING)[2:])
+    assert decoder.next_frame().type is FrameType.PING
+
+
+def test_oversize_length_is_rejected_before_payload_arrives():
+    decoder = FrameDecoder()
+    decoder.feed(HEADER.pack(MAX_PAYLOAD_SIZE + 1, FrameType.MESSAGE))
+    with pytest.raises(ProtocolError):
+        decoder.next_frame()
+
+
+def test_oversize_payload_can_not_be_encoded():
+    with pytest.raises(ProtocolError):
+        encode_frame(FrameType.MESSAGE, b'x' * (MAX_PAYLOAD_SIZE + 1))
+
+
+def test_unknown_frame_type_is_rejected():
+    decoder = FrameDecoder()
+    decoder.feed(HEADER.pack(0, 255))
+    with pytest.raises(ProtocolError):
+        decoder.next_frame()
+
+
+def test_compressed_frame_is_unpacked_transparently():
+    frames = encode_frame(FrameType.MESSAGE, 'a' * 1000) + encode_frame(FrameType.MESSAGE, 'b' * 1000)
+    compressed = compress_frames(frames)
+    assert HEADER.unpack_from(compressed)[1] == FrameType.COMPRESSED and len(compressed) < len(frames)
+    decoder = FrameDecoder()
+    decoder.feed(compressed + encode_frame(FrameType.PONG))
+    assert [frame.text for frame in decoder] == ['a' * 1000, 'b' * 1000, '']
+
+
+def test_small_frames_are_not_compressed():
+    frame = encode_frame(FrameType.MESSAGE, 'hello')
+    assert compress_frames(frame) == frame
+
+
+def test_nested_compressed_frame_is_rejected():
+    with pytest.raises(ProtocolError):
+        decompress_frames(zlib.compress(compressed_frame(encode_frame(FrameType.MESSAGE, 'hello'))))
+
+
+@pytest.mark.parametrize('frames', [
+    encode_frame(FrameType.MESSAGE, 'hello')[:-1],
+    encode_frame(FrameType.MESSAGE, 'hello') + encode_frame(FrameType.PING)[:3],
+    ])
+def test_compressed_frame_with_truncated_frame_is_rejected(frames):
+    with pytest.raises(ProtocolError):
+        decompress_frames(zlib.compress(frames))
+
+
+def test_truncated_compressed_stream_is_rejected():
+    with pytest.raises(ProtocolError):
+        decompress_frames(zlib.compress(encode_frame(FrameType.MESSAGE, 'hello'))[:-4])
+
+
+def test_invalid_compressed_stream_is_rejected():
+    with pytest.raises(ProtocolError):
+        decompress_frames(b'not zlib data')
+
+
+def test_compressed_frame_which_unpacks_over_limit_is_rejected():
+    frame = encode_frame(FrameType.MESSAGE, b'\0' * MAX_PAYLOAD_SIZE)
+    frames = frame * (MAX_DECOMPRESSED_SIZE // len(frame) + 1)
+    with pytest.raises(ProtocolError):
+        decompress_frames(zlib.compress(frames))
+
+
+def test_compressed_frame_is_rejected_unless_allowed():
+    decoder = FrameDecoder(allow_compressed=False)
+    decoder.feed(compressed_frame(encode_frame(FrameType.MESSAGE, 'hello')))
+    with pytest.raises(ProtocolError):
+        decoder.next_frame()
+    decoder.allow_compressed = True
+    assert decoder.next_frame().text == 'hello'
@@ -0,0 +1,62 @@
+import pytest
+
+import ratelimit
+from ratelimit import ClientRateLimit, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.5
+    assert bucket.consume()
+    assert not bucket.consume()
+
+
+def test_bucket_never_holds_more_than_burst(clock):
+    bucket = TokenBucket(rate=10, burst=2)
+    clock.now += 60
+    assert [bucket.consume() for _ in range(3)] == [True, True, False]
+
+
+def test_client_becomes_flooding_after_kick_threshold(clock):
+    limit = ClientRateLimit(RateLimiter(rate=1, burst=1, global_rate=0, kick_threshold=3, flood_window=10))
+    assert limit.allow() and not limit.limited
+    assert [limit.allow() for _ in range(3)] == [False, False, False]
+    assert limit.limited and limit.flooding
+
+
+def test_dropped_messages_are_counted_per_flood_window(clock):
+    limit = ClientRateLimit(RateLimiter(rate=0.01, burst=1, global_rate=0, kick_threshold=3, flood_window=10))
+    limit.allow()
+    limit.allow()
+    limit.allow()
+    clock.now += 11
+    limit.allow()
+    assert not limit.flooding
+
+
+def test_exhausted_global_budget_does_not_count_as_flooding(clock):
+    limiter = RateLimiter(rate=100, burst=100, global_rate=1, global_burst=1, kick_threshold=1)
+    first, second = ClientRateLimit(limiter), ClientRateLimit(limiter)
+    assert first.allow()
+    assert not second.allow()
+    assert second.limited and not second.flooding
+
+
+def test_no_limit_is_created_when_limits_are_disabled():
+    assert RateLimiter(rate=0, global_rate=0).client_limit() is None
@@ -0,0 +1,58 @@
+import pytest
+
+import reaper
+from reaper import TimerWheel
+
+
+@pytest.fixture
+def wheel(monkeypatch):
+    monkeypatch.setattr(reaper.time, 'monotonic', lambda: 0.0)
+    return TimerWheel(tick=1.0, slots=4)
+
+
+def test_item_expires_after_delay_rounded_up_to_ticks(wheel):
+    wheel.schedule('client', 1.5)
+    assert wheel.advance(1.0) == []
+    assert wheel.advance(2.0) == ['client']
+    assert wheel.advance(10.0) == []
+
+
+def test_item_scheduled_further_than_one_turn_waits_for_its_turn(wheel):
+    wheel.schedule('late', 9)
+    wheel.schedule('early', 1)
+    assert wheel.advance(8.0) == ['early']
+    assert wheel.advance(9.0) == ['late']
+
+
+def test_zero_delay_expires_on_next_tick(wheel):
+    wheel.schedule('client', 0)
+    assert wheel.advance(0.5) == []
+    assert wheel.advance(1.0) == ['client']
+
+
+def test_items_of_one_slot_expire_together(wheel):
+    for item in ('first', 'second'):
+        wheel.schedule(item, 4)
+    assert wheel.advance(4.0) == ['first', 'second']
+
+
+class FakeClient:
+    def __init__(self, last_activity: float) -> None:
+        self.last_activity = last_activity
+        self.closed = False
+        self.pings = 0
+
+    def ping(self) -> None:
+        self.pings += 1
+
+
+def test_silent_client_is_pinged_then_evicted(wheel):
+    evicted = []
+    idle_reaper = reaper.IdleReaper(interval=2, timeout=5, on_idle=evicted.append)
+    client = FakeClient(last_activity=0.0)
+    idle_reaper._check(client, now=1.0)
+    assert client.pings == 0 and evicted == []
+    idle_reaper._check(client, now=2.0)
+    assert client.pings == 1 and evicted == []
+    idle_reaper._check(client, now=5.0)
+    assert evicted == [client]
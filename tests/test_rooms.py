@@ -0,0 +1,21 @@
+from rooms import RoomRegistry
+
+
+def test_deleted_room_leaves_no_snapshot():
+    rooms, client = RoomRegistry(), object()
+    rooms.join('secret', client)
+    assert rooms.subscribers('secret') == (client,)
+    rooms.leave('secret', client)
+    assert rooms.subscribers('secret') == ()
+    assert rooms.names() == []
+    assert rooms._snapshots == {}
+
+
+def test_snapshot_is_rebuilt_after_room_changes():
+    rooms, first, second = RoomRegistry(), object(), object()
+    rooms.join('general', first)
+    assert rooms.subscribers('general') == (first,)
+    rooms.join('general', second)
+    assert set(rooms.subscribers('general')) == {first, second}
+    rooms.leave_all(first)
+    assert rooms.subscribers('general') == (second,)
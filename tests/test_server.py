@@ -0,0 +1,90 @@
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from clientdata import Message
+from common.protocol import FrameDecoder, FrameType, encode_frame, receive_frame
+from server import Server
+from settings import DEFAULT_ROOM, HANDSHAKE_WORKERS
+
+
+@pytest.fixture
+def server():
+    server = Server('127.0.0.1', 0, max_connected_users=4, handshake_timeout=2, shutdown_timeout=1)
+    receiver = threading.Thread(target=server._receive_connections)
+    receiver.start()
+    yield server
+    server.shutdown()
+    receiver.join()
+    server._stop_server()
+
+
+def connect(server: Server) -> socket.socket:
+    return socket.create_connection(server._server_socket.getsockname(), timeout=5)
+
+
+def test_silent_connections_do_not_block_login(server):
+    silent = [connect(server) for _ in range(HANDSHAKE_WORKERS)]
+    try:
+        client = connect(server)
+        client.sendall(encode_frame(FrameType.NICKNAME, 'tester'))
+        frame = receive_frame(client, FrameDecoder())
+        client.close()
+    finally:
+        for connection in silent:
+            connection.close()
+    assert frame is not None and frame.type is FrameType.ACCEPT
+
+
+def test_silent_connection_is_closed_after_handshake_deadline(server):
+    server._handshake_timeout = 0.2
+    connection = connect(server)
+    try:
+        assert connection.recv(1) == b''
+    finally:
+        connection.close()
+
+
+class FakeClient:
+    def __init__(self, outbound_space: int, accepts: bool = True) -> None:
+        self.outbound_space = outbound_space
+        self._accepts = accepts
+        self.frames = []
+        self.messages = []
+
+    def compress(self, frames: bytes) -> bytes:
+        return frames
+
+    def send_frame(self, frame: bytes) -> bool:
+        if self._accepts:
+            self.frames.append(frame)
+        return self._accepts
+
+    def send_message(self, text: str) -> None:
+        self.messages.append(text)
+
+
+def test_joining_client_gets_history_which_fits_in_its_buffer(server):
+    for sequence in range(1, 4):
+        server._history.append('secret', 'x' * 100, encode_frame(FrameType.MESSAGE, 'x' * 100), sequence)
+    client = FakeClient(outbound_space=250)
+    assert server._join_room(client, 'secret')
+    assert client.frames == [encode_frame(FrameType.MESSAGE, 'x' * 100) * 2]
+    assert client.messages == ['1 older messages of secret did not fit in your buffer']
+
+    slow = FakeClient(outbound_space=250, accepts=False)
+    assert server._join_room(slow, 'secret')
+    assert slow.messages == ['History of secret was not sent, your connection is too slow']
+    server._rooms.leave_all(client)
+    server._rooms.leave_all(slow)
+
+
+def test_plain_message_is_published_without_command_parsing(server, monkeypatch):
+    def fail(*args):
+        raise AssertionError('plain message was parsed as command')
+    monkeypatch.setattr(server._commands, 'execute', fail)
+    sender = SimpleNamespace(nickname='tester', room=DEFAULT_ROOM)
+    server._process_message(Message('hello /kick target', sender=sender))
+    assert server._history.replay(DEFAULT_ROOM).endswith(b'tester: hello /kick target')